@@ -0,0 +1,248 @@
+"""Module with multiplayer arenas and their delta-compressed snapshots"""
+import random
+import struct
+from constants import CELL_NUMBER
+from grid import World
+from replay import encode_varint, decode_varint
+from simulation import SnakeBody, FoodItem, ObstacleCells, DIRECTIONS, RIGHT
+
+MAX_PLAYERS = 4
+ARENA_OBSTACLES = 10
+RESPAWN_TICKS = 20
+SPAWN_LENGTH = 3
+SPAWN_ATTEMPTS = 50
+
+KEYFRAME = ord('K')
+DELTA = ord('D')
+FRAME_HEADER = struct.Struct('<BIHB')
+
+EMPTY_CELL = 0
+OBSTACLE_CELL = 1
+FOOD_CELL = 2
+SNAKE_CELL = 3
+
+
+class Arena:
+    """Several snakes sharing one board, stepped by the server
+
+    Every slot holds at most one snake. Snakes move at the same time; a
+    head that leaves the board, hits an obstacle or lands on any body,
+    including a head of another snake, dies. A dead snake is removed and
+    respawns after RESPAWN_TICKS with its score reset. There is one food
+    per snake on the board. The World collects the cells that changed, so
+    a tick's delta costs as much as the cells that moved, not the board.
+    """
+    def __init__(self, cell_number=CELL_NUMBER, max_players=MAX_PLAYERS, obstacle_count=ARENA_OBSTACLES, seed=None):
+        """Initialize an empty arena"""
+        self.cell_number = cell_number
+        self.rng = random.Random(seed)
+        self.world = World(cell_number)
+        self.world.dirty = set()
+        self.ticks = 0
+        self.players = [False] * max_players
+        self.snakes = [None] * max_players
+        self.scores = [0] * max_players
+        self.respawn_at = [0] * max_players
+        self.foods = {}
+        self.obstacles = []
+        for _ in range(obstacle_count):
+            self.place_obstacle()
+
+    def place_obstacle(self):
+        """Add a random 2 or 3 cell bar on free cells, return False if none fit"""
+        for _ in range(SPAWN_ATTEMPTS):
+            start = self.world.free_cells.sample(self.rng)
+            if start is None:
+                return False
+            x, y = self.world.cell_at(start)
+            step = self.rng.choice([RIGHT, (0, 1)])
+            cells = [(x + step[0] * index, y + step[1] * index) for index in range(self.rng.choice([2, 3]))]
+            if all(self.world.in_bounds(cell) and self.world.cell_id(cell) in self.world.free_cells
+                   for cell in cells):
+                obstacle = ObstacleCells()
+                obstacle.cells = cells
+                obstacle.attach(self.world)
+                self.obstacles.append(obstacle)
+                return True
+        return False
+
+    def join(self):
+        """Take a free slot, return its index or None when the arena is full"""
+        if False not in self.players:
+            return None
+        slot = self.players.index(False)
+        self.players[slot] = True
+        self.scores[slot] = 0
+        self.respawn_at[slot] = self.ticks
+        return slot
+
+    def leave(self, slot):
+        """Free a slot and remove its snake"""
+        self.players[slot] = False
+        self.kill(slot)
+
+    def turn(self, slot, direction_index):
+        """Queue a turn of a player's snake"""
+        snake = self.snakes[slot]
+        if snake is not None and 0 <= direction_index < len(DIRECTIONS):
+            snake.turn(DIRECTIONS[direction_index])
+
+    def spawn(self, slot):
+        """Put a new snake of SPAWN_LENGTH cells heading right on free cells"""
+        world = self.world
+        for _ in range(SPAWN_ATTEMPTS):
+            cell_id = world.free_cells.sample(self.rng)
+            if cell_id is None:
+                return False
+            x, y = world.cell_at(cell_id)
+            cells = [(x - offset, y) for offset in range(SPAWN_LENGTH)]
+            ahead = (x + 1, y)
+            if all(world.in_bounds(cell) and world.cell_id(cell) in world.free_cells for cell in cells + [ahead]):
+                snake = SnakeBody(self.cell_number, cells)
+                snake.attach(world)
+                self.snakes[slot] = snake
+                return True
+        return False
+
+    def kill(self, slot):
+        """Remove a snake from the board"""
+        snake = self.snakes[slot]
+        if snake is not None:
+            snake.detach()
+            self.snakes[slot] = None
+            self.scores[slot] = 0
+            self.respawn_at[slot] = self.ticks + RESPAWN_TICKS
+
+    def spawn_food(self):
+        """Keep one food per snake on the board"""
+        wanted = max(1, sum(snake is not None for snake in self.snakes))
+        while len(self.foods) < wanted:
+            cell_id = self.world.free_cells.sample(self.rng)
+            if cell_id is None:
+                return
+            food = FoodItem(self.world.cell_at(cell_id))
+            food.attach(self.world)
+            self.foods[cell_id] = food
+
+    def step(self):
+        """Advance every snake by one tick"""
+        self.ticks += 1
+        world = self.world
+        for slot, joined in enumerate(self.players):
+            if joined and self.snakes[slot] is None and self.ticks >= self.respawn_at[slot]:
+                self.spawn(slot)
+        alive = [(slot, snake) for slot, snake in enumerate(self.snakes) if snake is not None]
+        for _, snake in alive:
+            snake.direction = snake.next_direction
+            snake.move()
+        dead = []
+        for slot, snake in alive:
+            head = snake.ring[snake.head_index]
+            if not world.board[head] or world.obstacles[head] or world.snakes[head] > 1:
+                dead.append(slot)
+            elif head in self.foods:
+                self.foods.pop(head).detach()
+                snake.grow = True
+                self.scores[slot] += 1
+        for slot in dead:
+            self.kill(slot)
+        self.spawn_food()
+
+    def occupant(self, cell_id):
+        """Code of what a client should draw on a cell"""
+        world = self.world
+        if world.obstacles[cell_id]:
+            return OBSTACLE_CELL
+        if world.snakes[cell_id]:
+            for slot, snake in enumerate(self.snakes):
+                if snake is not None and snake.occupancy[cell_id]:
+                    return SNAKE_CELL + slot
+        if world.food[cell_id]:
+            return FOOD_CELL
+        return EMPTY_CELL
+
+    def header(self, kind):
+        """Frame header followed by the scores"""
+        out = bytearray(FRAME_HEADER.pack(kind, self.ticks, self.cell_number, len(self.players)))
+        for score in self.scores:
+            encode_varint(score, out)
+        return out
+
+    def keyframe(self):
+        """Encode the whole board as runs of equal cells"""
+        out = self.header(KEYFRAME)
+        world = self.world
+        run, previous = 0, None
+        for y in range(self.cell_number):
+            start = world.cell_id((0, y))
+            for cell_id in range(start, start + self.cell_number):
+                code = self.occupant(cell_id)
+                if code != previous and run:
+                    encode_varint(run, out)
+                    out.append(previous)
+                    run = 0
+                previous = code
+                run += 1
+        encode_varint(run, out)
+        out.append(previous)
+        return bytes(out)
+
+    def delta(self):
+        """Encode the cells that changed since the last delta"""
+        out = self.header(DELTA)
+        world = self.world
+        stride = world.stride
+        changed = []
+        for cell_id in world.dirty:
+            if world.board[cell_id]:
+                y, x = divmod(cell_id, stride)
+                changed.append(((y - 1) * self.cell_number + x - 1, self.occupant(cell_id)))
+        world.dirty.clear()
+        changed.sort()
+        encode_varint(len(changed), out)
+        previous = 0
+        for index, code in changed:
+            encode_varint(index - previous, out)
+            out.append(code)
+            previous = index
+        return bytes(out)
+
+
+class ArenaView:
+    """Client-side copy of an arena rebuilt from keyframes and deltas"""
+    def __init__(self):
+        """Initialize an empty view"""
+        self.cell_number = 0
+        self.cells = bytearray()
+        self.scores = []
+        self.ticks = 0
+
+    def apply(self, frame):
+        """Update the view from a frame, return the indexes of the cells that changed"""
+        kind, self.ticks, cell_number, players = FRAME_HEADER.unpack_from(frame)
+        offset = FRAME_HEADER.size
+        self.scores = []
+        for _ in range(players):
+            score, offset = decode_varint(frame, offset)
+            self.scores.append(score)
+        if kind == KEYFRAME:
+            self.cell_number = cell_number
+            cells = bytearray()
+            while offset < len(frame):
+                run, offset = decode_varint(frame, offset)
+                cells += bytes((frame[offset],)) * run
+                offset += 1
+            changed = [index for index in range(len(cells))
+                       if index >= len(self.cells) or cells[index] != self.cells[index]]
+            self.cells = cells
+            return changed
+        count, offset = decode_varint(frame, offset)
+        changed = []
+        index = 0
+        for _ in range(count):
+            gap, offset = decode_varint(frame, offset)
+            index += gap
+            self.cells[index] = frame[offset]
+            offset += 1
+            changed.append(index)
+        return changed
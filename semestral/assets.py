@@ -0,0 +1,140 @@
+"""Module with the shared image and sound registry"""
+import threading
+import time
+import pygame
+
+
+class AssetManager:
+    """Load each image and sound once and hand out shared references
+
+    Images are cached per path and pixel format of the display they were
+    converted for, and sounds per path and mixer format, so a new display
+    mode or mixer setup gets fresh copies. ``prefetch`` decodes assets on a
+    worker thread; a lookup of an asset that is still being prefetched waits
+    for it instead of decoding it twice.
+    """
+    def __init__(self):
+        """Initialize an empty registry"""
+        self.images = {}
+        self.sounds = {}
+        self.stats = {}
+        self.decoded = {}
+        self.pending = {}
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def image(self, path, alpha=True):
+        """Return the converted image at ``path``"""
+        display = pygame.display.get_surface()
+        pixel_format = (display.get_bitsize(), display.get_masks()) if display is not None else None
+        key = (path, alpha, pixel_format)
+        if key not in self.images:
+            start = time.perf_counter()
+            image = self.decode(path)
+            if pixel_format is not None:
+                image = image.convert_alpha() if alpha else image.convert()
+            self.images[key] = image
+            self.record(path, start, image.get_pitch() * image.get_height())
+        return self.images[key]
+
+    def decode(self, path):
+        """Return the unconverted image at ``path``, taking a prefetched one if there is one"""
+        self.wait_for(path)
+        with self.lock:
+            image = self.decoded.pop(path, None)
+        return image if image is not None else pygame.image.load(path)
+
+    def sound(self, path):
+        """Return the decoded sound at ``path``"""
+        self.wait_for(path)
+        mixer_format = pygame.mixer.get_init()
+        key = (path, mixer_format)
+        if key not in self.sounds:
+            self.load_sound(path, key)
+        return self.sounds[key]
+
+    def load_sound(self, path, key):
+        """Decode a sound into the registry"""
+        start = time.perf_counter()
+        sound = pygame.mixer.Sound(path)
+        frequency, sample_format, channels = key[1]
+        size = int(sound.get_length() * frequency) * channels * abs(sample_format) // 8
+        with self.lock:
+            self.sounds[key] = sound
+            self.record(path, start, size)
+
+    def prefetch(self, images=(), sounds=()):
+        """Start decoding assets on a worker thread, skipping ones already loaded or loading"""
+        mixer_format = pygame.mixer.get_init()
+        with self.lock:
+            loaded = {key[0] for key in self.images} | set(self.decoded) | set(self.pending)
+            images = [path for path in images if path not in loaded]
+            sounds = [path for path in sounds if path not in self.pending and (path, mixer_format) not in self.sounds]
+            for path in images + sounds:
+                self.pending[path] = threading.Event()
+        if not images and not sounds:
+            return
+        worker = threading.Thread(target=self.load_in_background, args=(images, sounds, mixer_format), daemon=True)
+        self.workers.append(worker)
+        worker.start()
+
+    def load_in_background(self, images, sounds, mixer_format):
+        """Decode prefetched assets (runs on a worker thread)"""
+        for path in images:
+            start = time.perf_counter()
+            try:
+                image = pygame.image.load(path)
+            except pygame.error:
+                image = None
+            with self.lock:
+                if image is not None:
+                    self.decoded[path] = image
+                    self.record(path, start, image.get_pitch() * image.get_height())
+                self.pending.pop(path).set()
+        for path in sounds:
+            try:
+                self.load_sound(path, (path, mixer_format))
+            except pygame.error:
+                pass
+            with self.lock:
+                self.pending.pop(path).set()
+
+    def wait_for(self, path):
+        """Block until a prefetch of ``path`` has finished"""
+        event = self.pending.get(path)
+        if event is not None:
+            event.wait()
+
+    def wait(self):
+        """Block until every prefetch has finished"""
+        while self.workers:
+            self.workers.pop().join()
+
+    def preload(self, images=(), sounds=()):
+        """Load assets ahead of time so later lookups never touch the disk"""
+        for path in images:
+            self.image(path)
+        for path in sounds:
+            self.sound(path)
+
+    def record(self, path, start, size):
+        """Remember how long an asset took to load and how much memory it uses"""
+        self.stats[path] = {'load_ms': (time.perf_counter() - start) * 1000, 'bytes': size}
+
+    def report(self):
+        """Return one line per loaded asset with load time and memory use"""
+        lines = []
+        for path, stats in sorted(self.stats.items()):
+            lines.append(f"{path}: {stats['load_ms']:.1f} ms, {stats['bytes'] / 1024:.0f} KiB")
+        return lines
+
+    def clear(self):
+        """Drop every cached asset"""
+        self.wait()
+        self.decoded.clear()
+        self.images.clear()
+        self.sounds.clear()
+        self.stats.clear()
+
+
+assets = AssetManager()
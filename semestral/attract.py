@@ -0,0 +1,55 @@
+"""Module with the low-power attract mode shown while the start screen is idle"""
+from autopilot import Autopilot
+from entities import Snake
+from simulation import Simulation
+
+ATTRACT_TICK_MS = 150
+
+
+class AttractMode:
+    """Demo round played by the Autopilot on the game's screen
+
+    The round runs on its own Simulation, built with the game's entity
+    factories. While the mode is entered the game shows that simulation
+    instead of the player's, so the game's renderer repaints only the cells
+    the World reports as changed, and the player's round, scores and replay
+    are left alone. When the demo snake dies a new round starts.
+    """
+    def __init__(self, game, tick_ms=ATTRACT_TICK_MS, seed=None):
+        """Initialize the demo round"""
+        self.game = game
+        self.tick_ms = tick_ms
+        player = game.sim
+        self.sim = Simulation(player.cell_number, player.play_with_obstacles, player.obstacle_count,
+                              snake_factory=Snake, food_factory=player.food_factory,
+                              obstacle_factory=player.obstacle_factory, seed=seed,
+                              level=game.levels.choose() if game.levels is not None else None)
+        self.autopilot = Autopilot()
+        self.rounds = 1
+        self.player = None
+
+    def __enter__(self):
+        """Show the demo round instead of the player's"""
+        self.player = self.game.sim
+        self.game.sim = self.sim
+        self.game.renderer.invalidate()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Give the screen back to the player's round"""
+        self.game.sim = self.player
+        self.player = None
+        self.game.renderer.invalidate()
+
+    def draw(self):
+        """Draw what changed since the last frame, return the screen rectangles to update"""
+        return self.game.renderer.draw()
+
+    def step(self):
+        """Play one tick and draw it"""
+        sim = self.sim
+        sim.step(self.autopilot(sim))
+        if sim.game_over:
+            sim.reset()
+            self.rounds += 1
+        return self.draw()
@@ -0,0 +1,102 @@
+"""Module with background music that never blocks the game loop"""
+import logging
+import threading
+import time
+from collections import deque
+import pygame
+from timing import SAMPLE_WINDOW
+
+CROSSFADE_MS = 800
+
+logger = logging.getLogger(__name__)
+
+
+class MusicPlayer:
+    """Music tracks decoded on a worker thread and switched with a crossfade
+
+    ``play(index)`` only records which track is wanted. A track that is not
+    decoded yet is loaded on a worker thread, which starts it as soon as it
+    is ready; a decoded one is crossfaded in at once. Two mixer channels are
+    reserved for music so sound effects never take them.
+    """
+    def __init__(self, tracks, crossfade_ms=CROSSFADE_MS):
+        """Initialize the player with the paths of the tracks"""
+        self.tracks = tracks
+        self.crossfade_ms = crossfade_ms
+        self.sounds = {}
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.wanted = None
+        self.requested_at = 0.0
+        self.current = None
+        self.channel = None
+        self.switches = deque(maxlen=SAMPLE_WINDOW)
+        pygame.mixer.set_reserved(2)
+        self.channels = [pygame.mixer.Channel(0), pygame.mixer.Channel(1)]
+
+    def prepare(self, index):
+        """Start decoding a track in the background unless it is loaded or loading"""
+        if not 0 <= index < len(self.tracks) or not self.tracks[index]:
+            return
+        with self.lock:
+            if index in self.sounds or index in self.loading:
+                return
+            thread = threading.Thread(target=self.load, args=(index,), daemon=True)
+            self.loading[index] = thread
+        thread.start()
+
+    def load(self, index):
+        """Decode a track, then start it if it is the one wanted (runs on a worker thread)"""
+        start = time.perf_counter()
+        try:
+            sound = pygame.mixer.Sound(self.tracks[index])
+        except pygame.error as error:
+            logger.warning("could not load %s: %s", self.tracks[index], error)
+            sound = None
+        logger.debug("decoded %s in %.1f ms", self.tracks[index], (time.perf_counter() - start) * 1000)
+        with self.lock:
+            del self.loading[index]
+            if sound is None:
+                return
+            self.sounds[index] = sound
+            if self.wanted == index and self.current != index:
+                self.switch(index)
+
+    def play(self, index):
+        """Crossfade to a track as soon as it is decoded and preload the next one"""
+        with self.lock:
+            if self.wanted == index:
+                return
+            self.wanted = index
+            self.requested_at = time.perf_counter()
+            if index in self.sounds:
+                self.switch(index)
+        self.prepare(index)
+        self.prepare(index + 1)
+
+    def switch(self, index):
+        """Fade the current track out and the wanted one in, must hold the lock"""
+        old_channel = self.channel
+        self.channel = self.channels[1] if self.channel is self.channels[0] else self.channels[0]
+        self.channel.play(self.sounds[index], loops=-1, fade_ms=self.crossfade_ms)
+        if old_channel is not None:
+            old_channel.fadeout(self.crossfade_ms)
+        self.current = index
+        duration = (time.perf_counter() - self.requested_at) * 1000
+        self.switches.append((index, duration))
+        logger.info("music switched to %s %.1f ms after it was requested", self.tracks[index], duration)
+
+    def stop(self):
+        """Stop the music"""
+        with self.lock:
+            self.wanted = self.current = None
+            for channel in self.channels:
+                channel.stop()
+            self.channel = None
+
+    def wait(self, timeout=None):
+        """Wait for tracks that are still loading, used by tests and tools"""
+        with self.lock:
+            threads = list(self.loading.values())
+        for thread in threads:
+            thread.join(timeout)
@@ -0,0 +1,198 @@
+"""Module with the autopilot that plays the snake"""
+import heapq
+import time
+from collections import deque
+from simulation import DIRECTIONS
+from timing import percentile, SAMPLE_WINDOW
+
+MAX_EXPANSIONS = 4000
+SAFE_AREA = 1500
+
+
+class Autopilot:
+    """Steer a Simulation's snake to the food without trapping it
+
+    Paths are searched with A* on the World's occupancy layers. A body cell
+    counts as free from the tick on which the tail will have left it, which
+    the snake answers in constant time, so no work grows with its length.
+    A path is taken only if the tail is still reachable from its end;
+    otherwise the autopilot moves to the neighbouring cell with the most
+    room. The search stops after ``max_expansions`` cells and then heads
+    for the explored cell closest to the food, and flood fills stop after
+    ``safe_area`` cells, so decisions stay fast on any board. A planned
+    path is reused on later ticks until the food moves or the path runs
+    out, since nothing else can block it.
+    """
+    def __init__(self, max_expansions=MAX_EXPANSIONS, safe_area=SAFE_AREA, window=SAMPLE_WINDOW):
+        """Initialize the autopilot"""
+        self.max_expansions = max_expansions
+        self.safe_area = safe_area
+        self.path = deque()
+        self.target = None
+        self.generation = None
+        self.latencies = deque(maxlen=window)
+        self.decisions = 0
+        self.plans = 0
+
+    def __call__(self, sim):
+        """Return the direction to take on the next tick, usable as a Simulation policy"""
+        start = time.perf_counter()
+        direction = self.decide(sim)
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.decisions += 1
+        return direction
+
+    def decide(self, sim):
+        """Pick the next direction"""
+        world = sim.world
+        snake = sim.snake
+        head = snake.ring[snake.head_index]
+        food = world.cell_id(sim.food.cell)
+        if self.target != food or self.generation != world.generation or not self.path_is_valid(sim, head):
+            self.plan(sim, head, food)
+        if self.path:
+            return self.direction(sim, head, self.path.popleft())
+        return self.escape(sim, head)
+
+    def path_is_valid(self, sim, head):
+        """Check that the planned path still starts next to the head on a free cell"""
+        if not self.path:
+            return False
+        step = self.path[0]
+        return abs(step - head) in (1, sim.world.stride) and self.free_after(sim, step, 1)
+
+    def free_after(self, sim, cell_id, moves):
+        """Check if the head may enter a cell on the given move from now"""
+        world = sim.world
+        if not world.board[cell_id] or world.obstacles[cell_id]:
+            return False
+        if not world.snakes[cell_id]:
+            return True
+        snake = sim.snake
+        return world.snakes[cell_id] == snake.occupancy[cell_id] and snake.moves_until_free(cell_id) <= moves
+
+    def plan(self, sim, head, food):
+        """Search a safe path towards the food and remember it"""
+        self.plans += 1
+        self.target = food
+        self.generation = sim.world.generation
+        self.path = deque()
+        path = self.search(sim, head, food)
+        if path and self.tail_reachable(sim, path):
+            self.path = deque(path)
+
+    def search(self, sim, head, food):
+        """A* from the head, return the cells after the head on the way to the food
+
+        When the food is not reached within the expansion budget, the path
+        leads to the explored cell closest to it.
+        """
+        stride = sim.world.stride
+        snake = sim.snake
+        neck = snake.ring[(snake.head_index - 1) % len(snake.ring)] if snake.length > 1 else None
+        food_x, food_y = food % stride, food // stride
+        offsets = (1, -1, stride, -stride)
+        parents = {head: None}
+        frontier = [(0, 0, head)]
+        best, best_distance = head, None
+        expansions = 0
+        while frontier and expansions < self.max_expansions:
+            _, steps, cell_id = heapq.heappop(frontier)
+            if cell_id == food:
+                best = food
+                break
+            expansions += 1
+            arrival = steps + 1
+            for offset in offsets:
+                neighbour = cell_id + offset
+                if neighbour in parents or not self.free_after(sim, neighbour, arrival):
+                    continue
+                if arrival == 1 and neighbour == neck:
+                    continue
+                parents[neighbour] = cell_id
+                distance = abs(neighbour % stride - food_x) + abs(neighbour // stride - food_y)
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = neighbour, distance
+                heapq.heappush(frontier, (arrival + distance, arrival, neighbour))
+        path = []
+        while best != head:
+            path.append(best)
+            best = parents[best]
+        path.reverse()
+        return path
+
+    def tail_reachable(self, sim, path):
+        """Check that at the end of ``path`` the head can still reach the tail"""
+        snake = sim.snake
+        steps = len(path)
+        length = snake.length + 1
+        if steps >= length:
+            tail = path[-length]
+        else:
+            tail = self.tail_after(sim, steps - snake.grow)
+        return self.flood(sim, path[-1], set(path[-length:]), tail, steps) >= self.safe_area
+
+    def tail_after(self, sim, moves):
+        """Cell the tail will be on after ``moves`` moves without growing"""
+        snake = sim.snake
+        return snake.ring[(snake.head_index - snake.length + 1 + moves) % len(snake.ring)]
+
+    def flood(self, sim, start, occupied, tail, moves):
+        """Count cells reachable from ``start`` after ``moves`` moves, a reached tail counts as unlimited room"""
+        world = sim.world
+        stride = world.stride
+        snake = sim.snake
+        board, obstacles, snakes = world.board, world.obstacles, world.snakes
+        offsets = (1, -1, stride, -stride)
+        seen = {start}
+        queue = deque([start])
+        while queue:
+            cell_id = queue.popleft()
+            for offset in offsets:
+                neighbour = cell_id + offset
+                if neighbour == tail:
+                    return self.safe_area
+                if neighbour in seen or neighbour in occupied or not board[neighbour] or obstacles[neighbour]:
+                    continue
+                if snakes[neighbour] and (snakes[neighbour] != snake.occupancy[neighbour]
+                                          or snake.moves_until_free(neighbour) > moves):
+                    continue
+                seen.add(neighbour)
+                if len(seen) >= self.safe_area:
+                    return self.safe_area
+                queue.append(neighbour)
+        return len(seen)
+
+    def escape(self, sim, head):
+        """Move to the neighbouring cell with the most room, or keep going if there is none"""
+        snake = sim.snake
+        stride = sim.world.stride
+        tail = self.tail_after(sim, 1 - snake.grow)
+        best, best_score = None, None
+        for direction in DIRECTIONS:
+            if direction[0] == -snake.direction[0] and direction[1] == -snake.direction[1]:
+                continue
+            cell_id = head + direction[0] + direction[1] * stride
+            if not self.free_after(sim, cell_id, 1):
+                continue
+            area = self.flood(sim, cell_id, (), tail, 1)
+            # among equally roomy moves, stay far from the tail to leave it room to uncoil
+            distance = abs(cell_id % stride - tail % stride) + abs(cell_id // stride - tail // stride)
+            if best_score is None or (area, distance) > best_score:
+                best, best_score = direction, (area, distance)
+        return best or snake.direction
+
+    def direction(self, sim, head, step):
+        """Direction that moves the head onto an adjacent cell"""
+        offset = step - head
+        return (offset, 0) if abs(offset) == 1 else (0, offset // sim.world.stride)
+
+    def summary(self):
+        """Return decision statistics as a dictionary"""
+        return {
+            'decisions': self.decisions,
+            'plans': self.plans,
+            'decision_ms_p50': percentile(self.latencies, 0.5),
+            'decision_ms_p95': percentile(self.latencies, 0.95),
+            'decision_ms_max': max(self.latencies, default=0.0),
+        }
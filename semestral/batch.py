@@ -0,0 +1,199 @@
+"""Many games stepped together on NumPy arrays"""
+import numpy as np
+from constants import CELL_NUMBER
+from simulation import (Simulation, DIRECTIONS, OBSTACLE_COUNT, BONUS_CHANCE, BONUS_POINTS, BONUS_DURATION,
+                        TIME_LIMIT_WITHOUT_FOOD)
+
+EMPTY = 0
+SNAKE = 1
+OBSTACLE = 2
+
+DEATH_CAUSES = (None, 'wall', 'self', 'obstacle', 'starvation', 'win')
+WALL, SELF, HIT_OBSTACLE, STARVATION, WIN = 1, 2, 3, 4, 5
+
+DELTA_X = np.array([d[0] for d in DIRECTIONS], dtype=np.int32)
+DELTA_Y = np.array([d[1] for d in DIRECTIONS], dtype=np.int32)
+SPAWN_ATTEMPTS = 8
+LAYOUT_POOL = 256
+
+
+class BatchSimulation:
+    """N independent games with the rules of simulation.Simulation
+
+    Boards are flat occupancy grids indexed by ``y * cell_number + x``.
+    Snake bodies are ring buffers of cell ids between ``tail`` and ``head``.
+    Directions are indices into simulation.DIRECTIONS, -1 keeps the heading.
+
+    Starting boards are drawn from a pool of ``layouts`` obstacle layouts
+    generated once by Simulation, so a reset is a few array copies for all
+    the games it restarts.
+    """
+    def __init__(self, num_games, cell_number=CELL_NUMBER, play_with_obstacles=True,
+                 obstacle_count=OBSTACLE_COUNT, seed=None, layouts=LAYOUT_POOL):
+        """Initialize all games"""
+        self.num_games = num_games
+        self.cell_number = cell_number
+        self.play_with_obstacles = play_with_obstacles
+        self.obstacle_count = obstacle_count
+        self.rng = np.random.default_rng(seed)
+        cells = cell_number * cell_number
+        self.capacity = cells + 1
+        self.grid = np.zeros((num_games, cells), dtype=np.uint8)
+        self.body = np.zeros((num_games, self.capacity), dtype=np.int32)
+        self.head = np.zeros(num_games, dtype=np.int32)
+        self.tail = np.zeros(num_games, dtype=np.int32)
+        self.direction = np.zeros(num_games, dtype=np.int8)
+        self.grow = np.zeros(num_games, dtype=bool)
+        self.food = np.zeros(num_games, dtype=np.int32)
+        self.food_points = np.ones(num_games, dtype=np.int32)
+        self.food_expires = np.zeros(num_games, dtype=np.int64)
+        self.score = np.zeros(num_games, dtype=np.int32)
+        self.time = np.zeros(num_games, dtype=np.int64)
+        self.last_eaten_time = np.zeros(num_games, dtype=np.int64)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.death_cause = np.zeros(num_games, dtype=np.int8)
+        self.generate_layouts(min(layouts, num_games) if play_with_obstacles else 1)
+        self.reset()
+
+    def cell_id(self, cell):
+        """Flat index of an (x, y) cell"""
+        return cell[1] * self.cell_number + cell[0]
+
+    def board(self, sim, grid):
+        """Fill an occupancy grid with the obstacles and snake of a Simulation, return the snake cells"""
+        grid[:] = EMPTY
+        for obstacle in sim.obstacles:
+            for cell in obstacle.cells:
+                grid[self.cell_id(cell)] = OBSTACLE
+        cells = [self.cell_id(cell) for cell in reversed(sim.snake.cells)]
+        grid[cells] = SNAKE
+        return cells
+
+    def generate_layouts(self, count):
+        """Build the pool of starting boards from freshly reset Simulations"""
+        sim = Simulation(self.cell_number, self.play_with_obstacles, self.obstacle_count,
+                         seed=int(self.rng.integers(2 ** 63)))
+        self.layouts = np.zeros((count, self.grid.shape[1]), dtype=np.uint8)
+        for index in range(count):
+            if index:
+                sim.reset(int(self.rng.integers(2 ** 63)))
+            self.start_body = np.array(self.board(sim, self.layouts[index]), dtype=np.int32)
+        self.start_direction = DIRECTIONS.index(tuple(sim.snake.next_direction))
+
+    def load(self, index, sim):
+        """Copy the state of a Simulation into game ``index``"""
+        cells = self.board(sim, self.grid[index])
+        self.body[index, :len(cells)] = cells
+        self.tail[index] = 0
+        self.head[index] = len(cells) - 1
+        self.direction[index] = DIRECTIONS.index(tuple(sim.snake.next_direction))
+        self.grow[index] = sim.snake.grow
+        self.food[index] = self.cell_id(sim.food.cell)
+        self.food_points[index] = sim.food.points
+        duration = sim.food.duration
+        self.food_expires[index] = -1 if duration is None else sim.food.spawn_time + duration
+        self.score[index] = sim.score
+        self.time[index] = sim.time
+        self.last_eaten_time[index] = sim.last_eaten_time
+        self.done[index] = sim.game_over
+        self.death_cause[index] = DEATH_CAUSES.index(sim.death_cause)
+
+    def reset(self, mask=None):
+        """Start new rounds for the games selected by ``mask`` (all by default)"""
+        games = np.arange(self.num_games) if mask is None else np.flatnonzero(mask)
+        if games.size == 0:
+            return
+        self.grid[games] = self.layouts[self.rng.integers(0, len(self.layouts), games.size)]
+        length = self.start_body.size
+        self.body[games, :length] = self.start_body
+        self.tail[games] = 0
+        self.head[games] = length - 1
+        self.direction[games] = self.start_direction
+        self.grow[games] = False
+        self.score[games] = 0
+        self.time[games] = 0
+        self.done[games] = False
+        self.death_cause[games] = 0
+        self.spawn_food(games)
+
+    def spawn_food(self, games):
+        """Place new food on free cells, ending games whose board is full"""
+        if games.size == 0:
+            return
+        cells = self.cell_number * self.cell_number
+        bonus = self.rng.integers(0, BONUS_CHANCE + 1, games.size) == 0
+        spots = self.rng.integers(0, cells, games.size)
+        pending = np.arange(games.size)
+        for _ in range(SPAWN_ATTEMPTS):
+            taken = self.grid[games[pending], spots[pending]] != EMPTY
+            pending = pending[taken]
+            if pending.size == 0:
+                break
+            spots[pending] = self.rng.integers(0, cells, pending.size)
+        if pending.size:
+            free = self.grid[games[pending]] == EMPTY
+            spots[pending] = np.argmax(self.rng.random(free.shape) * free, axis=1)
+            full = games[pending[~free.any(axis=1)]]
+            self.done[full] = True
+            self.death_cause[full] = WIN
+        self.food[games] = spots
+        self.food_points[games] = np.where(bonus, BONUS_POINTS, 1)
+        self.food_expires[games] = np.where(bonus, self.time[games] + BONUS_DURATION, -1)
+        self.last_eaten_time[games] = self.time[games]
+
+    def step(self, actions=None):
+        """Advance every running game one tick, return the score and done arrays"""
+        games = np.flatnonzero(~self.done)
+        if games.size == 0:
+            return self.score, self.done
+        direction = self.direction[games]
+        if actions is not None:
+            action = np.asarray(actions)[games]
+            turn = (action >= 0) & (action != (direction ^ 1))
+            direction = np.where(turn, action, direction).astype(np.int8)
+            self.direction[games] = direction
+        self.time[games] += np.maximum(100 - 2 * self.score[games], 50)
+
+        head_cell = self.body[games, self.head[games]]
+        x = head_cell % self.cell_number + DELTA_X[direction]
+        y = head_cell // self.cell_number + DELTA_Y[direction]
+        wall = (x < 0) | (x >= self.cell_number) | (y < 0) | (y >= self.cell_number)
+        new_head = np.where(wall, 0, y * self.cell_number + x)
+
+        grow = self.grow[games]
+        shrink = games[~grow]
+        self.grid[shrink, self.body[shrink, self.tail[shrink]]] = EMPTY
+        self.tail[shrink] = (self.tail[shrink] + 1) % self.capacity
+        self.grow[games] = False
+
+        target = self.grid[games, new_head]
+        ate = ~wall & (new_head == self.food[games])
+        hit_self = ~wall & (target == SNAKE)
+        hit_obstacle = ~wall & (target == OBSTACLE) & self.play_with_obstacles
+        alive = ~(wall | hit_self | hit_obstacle)
+
+        moved = games[alive]
+        self.head[moved] = (self.head[moved] + 1) % self.capacity
+        self.body[moved, self.head[moved]] = new_head[alive]
+        self.grid[moved, new_head[alive]] = SNAKE
+
+        eaters = games[ate]
+        self.score[eaters] += self.food_points[eaters]
+        self.grow[eaters] = True
+        self.spawn_food(eaters)
+
+        cause = np.select([wall, hit_self, hit_obstacle], [WALL, SELF, HIT_OBSTACLE], 0)
+        if self.play_with_obstacles:
+            starved = alive & (self.time[games] - self.last_eaten_time[games] > TIME_LIMIT_WITHOUT_FOOD)
+            cause = np.where(starved, STARVATION, cause)
+        dead = (cause > 0) & ~self.done[games]
+        self.death_cause[games[dead]] = cause[dead]
+        self.done[games[dead]] = True
+
+        expires = self.food_expires[games]
+        self.spawn_food(games[(expires >= 0) & (self.time[games] > expires)])
+        return self.score, self.done
+
+    def lengths(self):
+        """Snake length of every game"""
+        return (self.head - self.tail) % self.capacity + 1
@@ -0,0 +1,279 @@
+"""Benchmarks of the simulation, spawning and rendering hot paths
+
+Run ``python benchmark.py`` to measure every board size in ``SIZES``. Each
+size runs in its own process with SDL's dummy video and audio drivers and
+the board constants patched before the game modules are imported. Results
+are written as JSON and, given ``--baseline``, compared against an earlier
+run; the exit status is 1 when a metric regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SIZES = (20, 30, 60)
+SNAKE_FILL = (0.01, 0.1, 0.5, 0.9)
+BOARD_FILL = (0.0, 0.5, 0.9, 0.99)
+THRESHOLD = 0.25
+MIN_DELTA_US = 5.0
+
+
+def summarize(samples):
+    """Return median, 95th percentile and mean of durations in microseconds"""
+    ordered = sorted(samples)
+    return {
+        'p50_us': ordered[len(ordered) // 2] / 1000,
+        'p95_us': ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] / 1000,
+        'mean_us': sum(ordered) / len(ordered) / 1000,
+    }
+
+
+def timed(func, repeat):
+    """Call ``func`` ``repeat`` times and summarize the durations"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def serpentine(cell_number):
+    """Cells of a path that snakes across the whole board row by row"""
+    path = []
+    for y in range(cell_number):
+        xs = range(cell_number) if y % 2 == 0 else range(cell_number - 1, -1, -1)
+        path.extend((x, y) for x in xs)
+    return path
+
+
+def bench_cold_start(repeat):
+    """Time ``Game.__init__`` and the first start screen frame with an empty asset registry"""
+    from assets import assets
+    from game import Game
+
+    import pygame
+    from pygame.locals import KEYDOWN, K_s
+    samples = []
+    first_frames = []
+    for _ in range(repeat):
+        assets.clear()
+        start = time.perf_counter_ns()
+        game = Game()
+        samples.append(time.perf_counter_ns() - start)
+        pygame.event.post(pygame.event.Event(KEYDOWN, key=K_s))
+        game.show_start_screen()
+        first_frames.append(game.time_to_first_frame * 1e6)
+        game.music.wait()
+        assets.wait()
+    return {'game_init': summarize(samples), 'time_to_first_frame': summarize(first_frames)}
+
+
+def bench_update(game, ticks):
+    """Ticks per second of ``Game.update`` under a greedy player"""
+    from policies import greedy
+    game.play_with_obstacles = True
+    game.sim.reset(0)
+    elapsed = 0
+    for _ in range(ticks):
+        if game.game_over:
+            game.sim.reset(game.sim.seed + 1)
+        game.snake.turn(greedy(game.sim) or game.snake.direction)
+        start = time.perf_counter_ns()
+        game.update()
+        elapsed += time.perf_counter_ns() - start
+    return {'update': {'ticks_per_second': ticks / (elapsed / 1e9)}}
+
+
+def bench_snake(game, repeat):
+    """Latency of ``Snake.move_snake`` and ``check_fail`` at several snake lengths"""
+    from entities import Snake
+    cell_number = game.sim.cell_number
+    path = serpentine(cell_number)
+    results = {}
+    for fill in SNAKE_FILL:
+        length = max(3, int(fill * len(path)))
+        move_samples, fail_samples = [], []
+        while len(move_samples) < repeat:
+            game.sim.reset(0)
+            game.obstacles = []
+            snake = Snake(cell_number)
+            snake.cells = path[length - 1::-1]
+            game.snake = snake
+            for index in range(length - 1, min(len(path) - 1, length - 1 + repeat - len(move_samples))):
+                step = (path[index + 1][0] - path[index][0], path[index + 1][1] - path[index][1])
+                snake.direction = step
+                start = time.perf_counter_ns()
+                snake.move_snake()
+                move_samples.append(time.perf_counter_ns() - start)
+                start = time.perf_counter_ns()
+                game.check_fail()
+                fail_samples.append(time.perf_counter_ns() - start)
+        results[f'move_snake[len={length}]'] = summarize(move_samples)
+        results[f'check_fail[len={length}]'] = summarize(fail_samples)
+    return results
+
+
+def bench_spawn(game, repeat):
+    """Spawn latency of ``Simulation.spawn_food`` as the board fills"""
+    from entities import Snake
+    cell_number = game.sim.cell_number
+    path = serpentine(cell_number)
+    results = {}
+    for fill in BOARD_FILL:
+        length = max(3, int(fill * len(path)))
+        game.sim.reset(0)
+        game.obstacles = []
+        snake = Snake(cell_number)
+        snake.cells = path[length - 1::-1]
+        game.snake = snake
+        results[f'spawn_food[fill={fill}]'] = timed(game.sim.spawn_food, repeat)
+    return results
+
+
+def bench_obstacles(game, repeat):
+    """Time to place one obstacle and to generate a full obstacle set"""
+    from entities import Obstacle
+    game.play_with_obstacles = True
+    game.sim.reset(0)
+    obstacle = Obstacle(game)
+    return {
+        'obstacle_randomize': timed(obstacle.randomize, repeat),
+        'generate_obstacles': timed(game.sim.generate_obstacles, repeat),
+    }
+
+
+def bench_draw(game, repeat):
+    """Frame time of the full redraw and of the dirty-rectangle renderer"""
+    from policies import greedy
+    game.play_with_obstacles = True
+    game.sim.reset(0)
+    results = {
+        'draw_palette': timed(game.draw_palette, repeat),
+        'draw_elements': timed(game.draw_elements, repeat),
+    }
+
+    def dirty_frame():
+        game.snake.turn(greedy(game.sim) or game.snake.direction)
+        game.sim.step()
+        if game.game_over:
+            game.sim.reset(game.sim.seed + 1)
+        game.renderer.draw()
+    game.renderer.invalidate()
+    results['dirty_frame'] = timed(dirty_frame, repeat)
+    return results
+
+
+def run_size(cell_number, repeat=200):
+    """Run every benchmark in this process for one board size"""
+    import constants
+    constants.CELL_NUMBER = cell_number
+    constants.SCREEN_WIDTH = constants.SCREEN_HEIGHT = cell_number * constants.CELL_SIZE
+    from game import Game
+    from utilities import ScoreStore
+
+    random.seed(0)
+    results = bench_cold_start(max(repeat // 40, 3))
+    game = Game()
+    for index in range(len(game.tracks)):
+        game.music.prepare(index)
+    game.music.wait()
+    with tempfile.TemporaryDirectory() as directory:
+        game.scores = ScoreStore(os.path.join(directory, 'leaderboard'))
+        results.update(bench_update(game, repeat * 10))
+        results.update(bench_snake(game, repeat))
+        results.update(bench_spawn(game, repeat))
+        results.update(bench_obstacles(game, repeat))
+        results.update(bench_draw(game, repeat))
+    return results
+
+
+def run(sizes=SIZES, repeat=200):
+    """Benchmark each board size in a fresh process and collect the results"""
+    results = {}
+    for cell_number in sizes:
+        output = subprocess.run([sys.executable, __file__, '--worker', str(cell_number), '--repeat', str(repeat)],
+                                check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        results[str(cell_number)] = json.loads(output)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=THRESHOLD, min_delta_us=MIN_DELTA_US):
+    """Return one line per metric that got more than ``threshold`` worse than the baseline
+
+    Durations are compared by their median and must also have grown by at
+    least ``min_delta_us``, so timer noise on microsecond calls is not
+    reported. Rates (``*_per_second``) must not drop.
+    """
+    regressions = []
+    for size, benchmarks in report['results'].items():
+        for name, metrics in benchmarks.items():
+            old_metrics = baseline['results'].get(size, {}).get(name)
+            if old_metrics is None:
+                continue
+            for metric, value in metrics.items():
+                old = old_metrics.get(metric)
+                if not old or not (metric == 'p50_us' or metric.endswith('_per_second')):
+                    continue
+                change = value / old - 1
+                if metric.endswith('_per_second'):
+                    change = -change
+                if metric == 'p50_us' and value - old < min_delta_us:
+                    continue
+                if change > threshold:
+                    regressions.append(f"{size}/{name} {metric}: {old:.2f} -> {value:.2f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='board sizes to measure')
+    parser.add_argument('--repeat', type=int, default=200, help='samples per measurement')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the results')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='allowed slowdown, 0.25 is 25 %%')
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA_US,
+                        help='smallest slowdown in microseconds worth reporting')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.repeat)))
+        return 0
+
+    report = run(args.sizes, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    for size, benchmarks in report['results'].items():
+        print(f"CELL_NUMBER={size}")
+        for name, metrics in benchmarks.items():
+            print(f"  {name}: " + ", ".join(f"{metric} {value:.2f}" for metric, value in metrics.items()))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.threshold, args.min_delta)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""Module with the camera that maps world cells to the window"""
+
+
+class Camera:
+    """Window-sized view of a board that may be much larger than the window
+
+    ``x`` and ``y`` are the world cell shown in the top left corner. The view
+    is kept inside the board, so on a board no larger than the window the
+    camera never moves.
+    """
+    def __init__(self, view_cells, world_cells):
+        """Initialize the camera in the top left corner of the board"""
+        self.view_cells = view_cells
+        self.world_cells = world_cells
+        self.x = 0
+        self.y = 0
+
+    def follow(self, cell):
+        """Center the view on a cell as far as the board edges allow"""
+        limit = max(self.world_cells - self.view_cells, 0)
+        self.x = min(max(cell[0] - self.view_cells // 2, 0), limit)
+        self.y = min(max(cell[1] - self.view_cells // 2, 0), limit)
+
+    def visible(self):
+        """Return the visible cell ranges as (x_start, x_stop, y_start, y_stop)"""
+        return (self.x, min(self.x + self.view_cells, self.world_cells),
+                self.y, min(self.y + self.view_cells, self.world_cells))
+
+    def to_view(self, cell):
+        """Window cell of a world cell"""
+        return cell[0] - self.x, cell[1] - self.y
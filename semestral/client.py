@@ -0,0 +1,152 @@
+"""Thin client that draws an arena streamed by the multiplayer server
+
+Run ``python client.py --host 127.0.0.1`` while ``server.py`` is running
+and steer with the arrow keys. The client keeps no game rules: it applies
+the server's frames to an ArenaView and repaints the cells that changed
+with the game's sprite batch.
+"""
+import argparse
+import asyncio
+import sys
+from arena import ArenaView, OBSTACLE_CELL, FOOD_CELL, SNAKE_CELL
+from server import LENGTH, WELCOME, PORT
+
+FRAME_RATE = 60
+SNAKE_COLORS = [(0, 0, 255), (255, 200, 0), (150, 0, 200), (0, 160, 160)]
+
+
+class ArenaClient:
+    """Connection to the server that keeps an up-to-date ArenaView"""
+    def __init__(self):
+        """Initialize a disconnected client"""
+        self.reader = None
+        self.writer = None
+        self.arena_index = None
+        self.slot = None
+        self.view = ArenaView()
+
+    async def connect(self, host='127.0.0.1', port=PORT):
+        """Join an arena and read the welcome frame"""
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.arena_index, self.slot = WELCOME.unpack(await self.read_frame())
+
+    async def read_frame(self):
+        """Read one length-prefixed frame"""
+        length, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+        return await self.reader.readexactly(length)
+
+    async def receive(self):
+        """Apply the next frame to the view, return the indexes of the cells that changed"""
+        return self.view.apply(await self.read_frame())
+
+    def turn(self, direction_index):
+        """Ask the server to turn our snake"""
+        self.writer.write(bytes((direction_index,)))
+
+    async def close(self):
+        """Leave the arena"""
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+class ArenaRenderer:
+    """Draw an ArenaView with the game's sprite batch, one batched layer per cell kind"""
+    def __init__(self, screen, cell_number):
+        """Render the background and the tiles for a board of ``cell_number`` cells"""
+        import pygame
+        from assets import assets
+        from constants import CELL_SIZE, FOOD_IMAGE
+        from entities import OBSTACLE_COLOR
+        from sprites import SpriteBatch
+
+        self.screen = screen
+        self.cell_number = cell_number
+        self.stride = cell_number + 2
+        self.sprites = SpriteBatch()
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background.fill((170, 215, 70))
+        self.sprites.draw_checkerboard(self.background, (160, 210, 60), cell_number)
+        food_image = pygame.transform.smoothscale(assets.image(FOOD_IMAGE), (CELL_SIZE, CELL_SIZE))
+        self.tiles = {OBSTACLE_CELL: self.sprites.color_tile(OBSTACLE_COLOR),
+                      FOOD_CELL: self.sprites.image_tile(food_image)}
+        self.snake_tiles = [self.sprites.color_tile(color) for color in SNAKE_COLORS]
+
+    def tile(self, code):
+        """Tile drawn on a cell of the view, None for an empty cell"""
+        if code >= SNAKE_CELL:
+            return self.snake_tiles[(code - SNAKE_CELL) % len(self.snake_tiles)]
+        return self.tiles.get(code)
+
+    def draw(self, view, changed):
+        """Repaint the cells at the ``changed`` view indexes, return the screen rectangles to update"""
+        layers = {}
+        for index in changed:
+            y, x = divmod(index, self.cell_number)
+            layers.setdefault(view.cells[index], []).append((y + 1) * self.stride + x + 1)
+        rects = self.sprites.cell_rects(self.stride)
+        dirty = [rects[cell_id] for cell_ids in layers.values() for cell_id in cell_ids]
+        self.screen.blits([(self.background, rect, rect) for rect in dirty], False)
+        for code, cell_ids in layers.items():
+            tile = self.tile(code)
+            if tile is not None:
+                self.sprites.draw_cells(self.screen, tile, cell_ids, self.stride)
+        return dirty
+
+
+async def play(host, port):
+    """Show the arena in a window and send arrow keys until it is closed"""
+    import pygame
+    from pygame.locals import QUIT
+    from constants import CELL_SIZE
+    from game import KEY_DIRECTIONS
+    from simulation import DIRECTIONS
+
+    client = ArenaClient()
+    await client.connect(host, port)
+    await client.receive()
+    cell_number = client.view.cell_number
+    pygame.init()
+    screen = pygame.display.set_mode((cell_number * CELL_SIZE, cell_number * CELL_SIZE))
+    pygame.display.set_caption(f"Snake arena {client.arena_index}")
+    renderer = ArenaRenderer(screen, cell_number)
+    screen.blit(renderer.background, (0, 0))
+    changed = set(range(len(client.view.cells)))
+    frames = asyncio.ensure_future(client.receive())
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key in KEY_DIRECTIONS:
+                client.turn(DIRECTIONS.index(KEY_DIRECTIONS[event.key]))
+        while running and frames.done():
+            if frames.exception() is not None:
+                running = False
+                break
+            changed.update(frames.result())
+            frames = asyncio.ensure_future(client.receive())
+            await asyncio.sleep(0)
+        rects = renderer.draw(client.view, changed)
+        changed.clear()
+        if rects:
+            pygame.display.update(rects)
+            pygame.display.set_caption(f"Snake arena {client.arena_index} - "
+                                       f"score {client.view.scores[client.slot]}")
+        await asyncio.sleep(1 / FRAME_RATE)
+    frames.cancel()
+    await client.close()
+    pygame.quit()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='server address')
+    parser.add_argument('--port', type=int, default=PORT, help='server TCP port')
+    args = parser.parse_args(argv)
+    asyncio.run(play(args.host, args.port))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
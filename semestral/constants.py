@@ -5,3 +5,13 @@ CELL_NUMBER = 30
 SCREEN_WIDTH = CELL_NUMBER * CELL_SIZE
 SCREEN_HEIGHT = CELL_NUMBER * CELL_SIZE
 
+
+# Asset paths
+FOOD_IMAGE = 'Graphics/burger (2).png'
+BONUS_IMAGE = 'Graphics/burger_boost.png'
+BACKGROUND_IMAGES = ['Graphics/background1.png', 'Graphics/background2.jpg', 'Graphics/background3.jpg']
+EAT_SOUND = 'crunch.wav'
+BONUS_SOUND = 'magic.mp3'
+POOF_SOUND = 'poof.mp3'
+GAME_OVER_SOUND = 'screamer.mp3'
+LEVEL_PACK = 'levels.pack'
@@ -1,151 +1,457 @@
 """Module for game logic"""
-import random
+import logging
+import os
+import time
 import pygame
-from pygame import Vector2
-from pygame.locals import QUIT, KEYDOWN, K_0, K_1, K_2, K_3, K_q, K_r, K_LEFT, K_RIGHT, K_UP, K_DOWN, K_c, K_s
-from entities import Snake, Food, Obstacle
-from constants import SCREEN_WIDTH, SCREEN_HEIGHT, CELL_SIZE, CELL_NUMBER
-from utilities import load_high_scores, save_high_scores
-from ui import Button, Label
+from pygame.locals import (QUIT, KEYDOWN, MOUSEBUTTONDOWN, MOUSEMOTION, NOEVENT, VIDEOEXPOSE, WINDOWEXPOSED,
+                           K_0, K_1, K_2, K_3, K_q, K_r, K_LEFT, K_RIGHT, K_UP, K_DOWN, K_c, K_s, K_F3, K_F5)
+from entities import Snake, Food, Obstacle, OBSTACLE_COLOR
+from constants import (SCREEN_WIDTH, SCREEN_HEIGHT, CELL_SIZE, CELL_NUMBER, FOOD_IMAGE, BONUS_IMAGE,
+                       BACKGROUND_IMAGES, EAT_SOUND, BONUS_SOUND, POOF_SOUND, GAME_OVER_SOUND, LEVEL_PACK)
+from assets import assets
+from audio import MusicPlayer
+from utilities import ScoreStore, LEGACY_FILE
+from ui import Button, Label, get_font, render_text, reset_fonts
 from boosts import Point5Apple
+from renderer import DirtyRenderer, ViewportRenderer
+from sprites import SpriteBatch
+from simulation import Simulation, BONUS_POINTS, OBSTACLE_COUNT, UP, DOWN, LEFT, RIGHT
+from timing import LoopStats
+from inputs import InputQueue
+from profiler import FrameProfiler
+from replay import Replay
+from attract import AttractMode
+from levels import LevelPack
+import snapshot
+
+RECORDED_CAUSES = ('wall', 'self', 'obstacle', 'win')
+SCORE_FONT_SIZE = 42
+MAX_CATCH_UP_TICKS = 5
+MAX_FRAME_WAIT = 16
+IDLE_WAIT_MS = 1000
+ATTRACT_AFTER_MS = 30000
+EXPOSE_EVENTS = (VIDEOEXPOSE, WINDOWEXPOSED)
+START, ATTRACT, SETTINGS, PLAY, GAME_OVER = 'start', 'attract', 'settings', 'play', 'game over'
+REPLAY_FILE = 'last_game.replay'
+SAVE_FILE = 'saved_game.snap'
+KEY_DIRECTIONS = {K_UP: UP, K_DOWN: DOWN, K_LEFT: LEFT, K_RIGHT: RIGHT}
+
+logger = logging.getLogger(__name__)
 
 
 class Game:
     """Main game class"""
-    def __init__(self):
-        """Initialize game"""
+    def __init__(self, dirty_rendering=True, trace_file=None, cell_number=CELL_NUMBER):
+        """Initialize game
+
+        ``cell_number`` is the board size; boards larger than the window are
+        seen through a camera that follows the snake. A Chrome trace of every
+        frame is kept if ``trace_file`` is given.
+
+        Only what the start screen and the first round need is loaded here.
+        Sound effects are decoded on a worker thread and background images
+        when the settings screen first needs them.
+        """
+        self.started = time.perf_counter()
+        self.time_to_first_frame = None
         pygame.init()
         pygame.mixer.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.background_images = [
-            pygame.image.load('Graphics/background1.png').convert(),
-            pygame.image.load('Graphics/background2.jpg').convert(),
-            pygame.image.load('Graphics/background3.jpg').convert()
-        ]
+        assets.prefetch(sounds=[EAT_SOUND, BONUS_SOUND, POOF_SOUND, GAME_OVER_SOUND])
+        assets.preload(images=[FOOD_IMAGE, BONUS_IMAGE])
         self.current_bg = 0
         self.use_default_background = True
-        self.bg_image = self.background_images[self.current_bg]
+        self.bg_image = None
+        self.eat_sound_path = EAT_SOUND
         self.clock = pygame.time.Clock()
-        self.snake = Snake()
-        self.food = Food()
-        self.obstacles = [Obstacle(self) for _ in range(10)]  # Create obstacles
-        for obstacle in self.obstacles:
-            obstacle.randomize()
-        self.food.randomize(self.snake.body, self.obstacles)
-        self.play_with_obstacles = True
-        self.score_font = pygame.font.Font(None, 42)
-        self.high_scores = load_high_scores()
-        self.game_over_sound = pygame.mixer.Sound("screamer.mp3")
-        self.eat_sound = pygame.mixer.Sound("crunch.wav")
-        self.poof_sound = pygame.mixer.Sound("poof.mp3")
-        self.game_over = False
-        self.score = 0
-        self.direction_changed = False
-        self.timer_event = pygame.USEREVENT + 1
-        pygame.time.set_timer(self.timer_event, 150)
-        self.last_eaten_time = pygame.time.get_ticks()
-        self.time_limit_without_food = 10000
-        self.game_start_time = 0
+        obstacle_count = round(OBSTACLE_COUNT * cell_number ** 2 / CELL_NUMBER ** 2)
+        self.sim = Simulation(cell_number, obstacle_count=obstacle_count, snake_factory=Snake,
+                              food_factory=self.make_food, obstacle_factory=lambda: Obstacle(self), start=False)
+        reset_fonts()
+        self.score_font = get_font(SCORE_FONT_SIZE)
+        self.scores = ScoreStore(legacy_file=LEGACY_FILE)
+        self.inputs = InputQueue()
+        self.sprites = SpriteBatch()
+        self.obstacle_key = None
+        self.obstacle_ids = []
+        self.tick_interval = self.sim.interval
+        self.accumulator = 0.0
+        self.loop_stats = LoopStats()
+        self.profiler = FrameProfiler()
+        self.trace_file = trace_file
+        self.profiler.set_tracing(trace_file is not None)
+        self.replay = None
+        self.autopilot = None
+        self.levels = None
+        if os.path.exists(LEVEL_PACK):
+            levels = LevelPack.load(LEVEL_PACK)
+            if levels.cell_number == cell_number:
+                self.levels = levels
+        self.resume_file = None
+        self.scene = None
+        self.attract_after = ATTRACT_AFTER_MS
+        # nothing follows the mouse, so moving it should not wake the idle screens
+        pygame.event.set_blocked(MOUSEMOTION)
         self.load_music_tracks()
         self.current_track_index = 0
-        pygame.mixer.music.load(self.tracks[self.current_track_index])
-        pygame.mixer.music.play(-1)
+        self.music = MusicPlayer(self.tracks)
+        self.music.play(self.current_track_index)
+        if cell_number > CELL_NUMBER:
+            self.dirty_rendering = True
+            self.renderer = ViewportRenderer(self)
+        else:
+            self.dirty_rendering = dirty_rendering
+            self.renderer = DirtyRenderer(self)
+        self.init_time = (time.perf_counter() - self.started) * 1000
+
+    @property
+    def eat_sound(self):
+        """Sound of eating the food currently on the board"""
+        return assets.sound(self.eat_sound_path)
+
+    @property
+    def poof_sound(self):
+        """Sound of a bonus apple running out"""
+        return assets.sound(POOF_SOUND)
+
+    @property
+    def game_over_sound(self):
+        """Sound of losing"""
+        return assets.sound(GAME_OVER_SOUND)
+
+    @property
+    def snake(self):
+        """Snake of the current round"""
+        return self.sim.snake
+
+    @snake.setter
+    def snake(self, snake):
+        self.sim.snake = snake
+
+    @property
+    def food(self):
+        """Food on the board"""
+        return self.sim.food
+
+    @food.setter
+    def food(self, food):
+        self.sim.food = food
+
+    @property
+    def obstacles(self):
+        """Obstacles on the board"""
+        return self.sim.obstacles
+
+    @obstacles.setter
+    def obstacles(self, obstacles):
+        self.sim.obstacles = obstacles
+
+    @property
+    def score(self):
+        """Score of the current round"""
+        return self.sim.score
+
+    @score.setter
+    def score(self, score):
+        self.sim.score = score
+
+    @property
+    def game_over(self):
+        """Whether the round has ended"""
+        return self.sim.game_over
+
+    @game_over.setter
+    def game_over(self, game_over):
+        self.sim.game_over = game_over
+
+    @property
+    def high_scores(self):
+        """Best scores for the current difficulty and board size"""
+        return self.scores.leaderboard(self.play_with_obstacles, self.sim.cell_number)
+
+    @property
+    def play_with_obstacles(self):
+        """Whether obstacles and starvation are enabled"""
+        return self.sim.play_with_obstacles
+
+    @play_with_obstacles.setter
+    def play_with_obstacles(self, value):
+        self.sim.play_with_obstacles = value
+
+    def make_food(self, cell=(0, 0), points=1, duration=None, spawn_time=0):
+        """Create the food entity for a cell chosen by the simulation"""
+        if points == BONUS_POINTS:
+            food = Point5Apple(*cell)
+            food.spawn_time = spawn_time
+            self.eat_sound_path = BONUS_SOUND
+        else:
+            food = Food(cell, points, duration, spawn_time)
+            self.eat_sound_path = EAT_SOUND
+        return food
 
     def show_start_screen(self):
-        """Show start screen"""
+        """Start screen scene, return the next scene or None to quit
+
+        The screen sleeps on the event queue and is drawn again only when
+        something on it changed. After ``attract_after`` milliseconds
+        without a key or button press the attract mode takes over.
+        """
         toggle_obstacle_button = Button(self.screen, (0, 120, 15), 250, 300, 200, 50, 'Level',
                                         (0, 0, 0))
-        start_active = True
-        while start_active:
-            for event in pygame.event.get():
+        redraw = True
+        idle_since = time.perf_counter()
+        while True:
+            if redraw:
+                self.draw_start_screen(toggle_obstacle_button)
+                redraw = False
+            timeout = IDLE_WAIT_MS
+            if self.attract_after is not None:
+                timeout = min(timeout, self.attract_after - (time.perf_counter() - idle_since) * 1000)
+            event = pygame.event.wait(max(int(timeout), 1))
+            if event.type == NOEVENT:
+                if self.attract_after is not None and \
+                        (time.perf_counter() - idle_since) * 1000 >= self.attract_after:
+                    return ATTRACT
+                continue
+            if event.type == QUIT:
+                return None
+            if event.type in (KEYDOWN, MOUSEBUTTONDOWN):
+                idle_since = time.perf_counter()
+            if event.type == KEYDOWN:
+                if event.key == K_s:
+                    return PLAY
+                if event.key == K_q:
+                    return None
+                if event.key == K_c:
+                    return SETTINGS
+            elif toggle_obstacle_button.is_clicked(event):
+                self.play_with_obstacles = not self.play_with_obstacles
+                toggle_obstacle_button.text = f'{"Medium" if self.play_with_obstacles else "Easy"}'
+                redraw = True
+            elif event.type in EXPOSE_EVENTS:
+                redraw = True
+
+    def draw_start_screen(self, toggle_obstacle_button):
+        """Draw the start screen"""
+        self.screen.fill((175, 215, 70))
+        start_text = "Press 'S' to Start, 'C' for menu, 'Q' to Quit"
+        start_surface = render_text(start_text, SCORE_FONT_SIZE, (255, 0, 0))
+        start_rect = start_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        pygame.draw.rect(self.screen, (255, 255, 255), start_rect, border_radius=10)
+        self.screen.blit(start_surface, start_rect)
+        toggle_obstacle_button.draw()
+        pygame.display.update()
+        if self.time_to_first_frame is None:
+            self.time_to_first_frame = (time.perf_counter() - self.started) * 1000
+            logger.info("first frame %.1f ms after start (Game.__init__ %.1f ms)",
+                        self.time_to_first_frame, self.init_time)
+
+    def show_attract_mode(self):
+        """Attract mode scene, the autopilot plays a demo until a key or button is pressed
+
+        Between ticks the loop sleeps on the event queue and each tick
+        updates only the cells that changed. The key that ends the demo is
+        put back on the queue, so pressing 'S' starts a round at once.
+        """
+        with AttractMode(self) as attract:
+            pygame.display.update(attract.draw())
+            interval = attract.tick_ms / 1000
+            next_tick = time.perf_counter() + interval
+            while True:
+                event = pygame.event.wait(max(int((next_tick - time.perf_counter()) * 1000), 1))
                 if event.type == QUIT:
-                    pygame.quit()
-                    return False
-                if event.type == KEYDOWN:
-                    if event.key == K_s:
-                        start_active = False
-                    elif event.key == K_q:
-                        pygame.quit()
-                        return False
-                    elif event.key == K_c:
-                        self.show_settings_screen()
-                elif toggle_obstacle_button.is_clicked(event):
-                    self.play_with_obstacles = not self.play_with_obstacles
-                    toggle_obstacle_button.text = f'{"Medium" if self.play_with_obstacles else "Easy"}'
-
-            self.screen.fill((175, 215, 70))
-            start_text = "Press 'S' to Start, 'C' for menu, 'Q' to Quit"
-            start_surface = self.score_font.render(start_text, True, (255, 0, 0))
-            start_rect = start_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-            pygame.draw.rect(self.screen, (255, 255, 255), start_rect, border_radius=10)
-            self.screen.blit(start_surface, start_rect)
-            toggle_obstacle_button.draw()
-            pygame.display.update()
-
-        return True
+                    return None
+                if event.type in (KEYDOWN, MOUSEBUTTONDOWN):
+                    logger.info("attract mode: %d ticks, %d rounds", attract.sim.ticks, attract.rounds)
+                    if event.type == KEYDOWN:
+                        pygame.event.post(event)
+                    return START
+                now = time.perf_counter()
+                if now >= next_tick:
+                    pygame.display.update(attract.step())
+                    next_tick = max(next_tick + interval, now)
+                elif event.type in EXPOSE_EVENTS:
+                    self.renderer.invalidate()
+                    pygame.display.update(attract.draw())
 
     def run(self):
-        """Start the game"""
-        if not self.show_start_screen():
-            return
-        self.game_start_time = pygame.time.get_ticks()
+        """Run the scenes one after another until the player quits
+
+        Every scene returns the name of the next one, or None to quit. The
+        loop stays flat however many rounds are played: a finished scene
+        has returned, so nothing of it is left on the stack, and each round
+        starts from a reset Simulation.
+        """
+        scenes = {
+            START: self.show_start_screen,
+            ATTRACT: self.show_attract_mode,
+            SETTINGS: self.show_settings_screen,
+            PLAY: self.play_round,
+            GAME_OVER: self.handle_game_over,
+        }
+        scene = START
+        while scene is not None:
+            self.scene = scene
+            scene = scenes[scene]()
+        self.scene = None
+        self.quit()
+
+    def play_round(self):
+        """Play scene, one round from a fresh board; return the next scene or None to quit"""
+        resumed = False
+        if self.resume_file is not None:
+            try:
+                snapshot.load(self.resume_file, self.sim)
+                resumed = True
+            except (OSError, ValueError) as error:
+                logger.error("could not resume %s: %s", self.resume_file, error)
+            self.resume_file = None
+        if not resumed:
+            self.sim.level = self.levels.choose() if self.levels is not None else None
+            self.sim.reset()
+        self.replay = Replay.for_simulation(self.sim, resumed)
+        self.inputs.clear()
+        self.renderer.invalidate()
+        self.adjust_timer()
+        self.accumulator = 0.0
+        redraw = True
+        last_time = time.perf_counter()
 
         while not self.game_over:
-            if self.play_with_obstacles:
-                if not hasattr(self, 'obstacles') or not self.obstacles:
-                    self.obstacles = [Obstacle(self) for _ in range(10)]
-                    for obstacle in self.obstacles:
-                        obstacle.randomize()
-            else:
-                self.obstacles = []
+            self.profiler.begin_frame()
+            self.profiler.start('events')
             for event in pygame.event.get():
                 if event.type == QUIT:
-                    pygame.quit()
-                    return
-                if event.type == self.timer_event:
-                    self.update()
-                elif event.type == KEYDOWN:
+                    self.save_trace()
+                    self.replay = None
+                    return None
+                if event.type == KEYDOWN:
                     self.handle_keys(event.key)
-
-            if self.play_with_obstacles:
-                background_color = (220, 20, 60)
-                self.snake.color = (245, 222, 179)
-            else:
-                background_color = (170, 215, 70)
-            self.screen.fill(background_color)
-            self.draw_palette()
-            self.draw_elements()
-            pygame.display.update()
-            self.clock.tick(60)
-        self.handle_game_over()
+            self.profiler.stop()
+
+            now = time.perf_counter()
+            elapsed = (now - last_time) * 1000
+            last_time = now
+            self.loop_stats.elapsed += elapsed
+            if self.advance(elapsed):
+                redraw = True
+
+            if redraw:
+                frame_start = time.perf_counter()
+                if self.play_with_obstacles:
+                    self.snake.color = (245, 222, 179)
+                if self.dirty_rendering:
+                    self.profiler.start('render')
+                    rects = self.renderer.draw()
+                    self.profiler.stop()
+                else:
+                    self.screen.fill(self.background_color())
+                    self.draw_palette()
+                    self.draw_elements()
+                    rects = None
+                if self.profiler.overlay:
+                    overlay_rect = self.profiler.draw(self.screen)
+                    self.renderer.expose(overlay_rect)
+                    if rects is not None:
+                        rects.append(overlay_rect)
+                self.profiler.start('display_update')
+                pygame.display.update(rects)
+                self.profiler.stop()
+                self.inputs.presented()
+                self.loop_stats.record_frame((time.perf_counter() - frame_start) * 1000)
+                self.profiler.end_frame()
+                redraw = False
+            pygame.time.wait(int(min(max(self.tick_interval - self.accumulator, 0), MAX_FRAME_WAIT)))
+        self.replay.finish(self.sim)
+        self.replay.save(REPLAY_FILE)
+        self.replay = None
+        self.save_trace()
+        if self.autopilot is not None:
+            logger.info("autopilot decisions: %s", self.autopilot.summary())
+        logger.info("input: %s", self.inputs.summary())
+        return GAME_OVER
+
+    def advance(self, elapsed):
+        """Run the ticks that fell due in ``elapsed`` milliseconds, return how many ran
+
+        Ticks are paced by the speed curve, not by the render rate. Falling
+        behind by more than a few ticks drops the backlog instead of letting
+        the snake sprint to catch up.
+        """
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= self.tick_interval and not self.game_over:
+            if ticks == MAX_CATCH_UP_TICKS:
+                self.loop_stats.dropped_ticks += int(self.accumulator // self.tick_interval)
+                self.accumulator %= self.tick_interval
+                break
+            self.accumulator -= self.tick_interval
+            tick_start = time.perf_counter()
+            if self.autopilot is not None:
+                self.steer()
+            self.profiler.start('update')
+            self.update()
+            self.profiler.stop()
+            self.loop_stats.record_tick((time.perf_counter() - tick_start) * 1000)
+            ticks += 1
+        return ticks
+
+    def steer(self):
+        """Let the autopilot turn the snake for the next tick
+
+        The turn skips the input queue, so the bot's moves do not show up
+        in the player's input latency and rejected turn counts.
+        """
+        self.profiler.start('autopilot')
+        direction = self.autopilot(self.sim)
+        self.profiler.stop()
+        self.turn(direction)
+
+    def turn(self, direction):
+        """Turn the snake for the next tick and record the turn in the replay"""
+        if direction is not None and self.snake.turn(direction) and self.replay is not None:
+            self.replay.record(self.sim.ticks + 1, direction)
 
     def update(self):
         """Update game stats"""
-        if self.snake.next_direction:
-            self.snake.direction = self.snake.next_direction
-        self.snake.move_snake()
-        self.direction_changed = False
-        self.check_collision()
-        self.check_fail()
+        eat_sound = self.eat_sound
+        self.turn(self.inputs.pop())
+        events = self.sim.step()
+        if events.eaten is not None:
+            eat_sound.play()
+            self.update_music_track()
+        if events.death_cause in RECORDED_CAUSES:
+            self.update_score(self.score)
         self.adjust_timer()
-        if not self.game_over:
-            current_time = pygame.time.get_ticks() - self.game_start_time
-            time_since_last_food = current_time - self.last_eaten_time
-            if self.play_with_obstacles and time_since_last_food > self.time_limit_without_food:
-                self.game_over = True
-        current_time = pygame.time.get_ticks()
-        if isinstance(self.food, Point5Apple):
-            if (current_time - self.food.spawn_time) > self.food.duration:
-                self.poof_sound.play()
-                self.spawn_food()
+        if events.expired:
+            self.poof_sound.play()
 
     def draw_elements(self):
-        """Draw elements"""
-        self.snake.draw_snake(self.screen, self.snake.color)
-        self.food.draw_food(self.screen)
-        for obstacle in self.obstacles:
-            obstacle.draw_obstacle(self.screen)
+        """Draw elements, one batched blit call per layer"""
+        self.profiler.start('draw_elements')
+        world = self.sim.world
+        sprites = self.sprites
+        sprites.draw_cells(self.screen, sprites.color_tile(self.snake.color), self.snake.iter_ids(), world.stride)
+        self.draw_food()
+        key = (id(world), world.generation, world.obstacle_version)
+        if key != self.obstacle_key:
+            self.obstacle_key = key
+            self.obstacle_ids = [world.cell_id(cell) for obstacle in self.obstacles for cell in obstacle.cells]
+        sprites.draw_cells(self.screen, sprites.color_tile(OBSTACLE_COLOR), self.obstacle_ids, world.stride)
         self.score_draw()
+        self.profiler.stop()
+
+    def food_image(self):
+        """Image of the food on the board, or None for food without one"""
+        return getattr(self.food, 'food_image', None) or getattr(self.food, 'image', None)
+
+    def draw_food(self, positions=None):
+        """Draw the food image from the atlas, by default on the food's cell"""
+        image = self.food_image()
+        if image is not None:
+            if positions is None:
+                positions = [(self.food.cell[0] * CELL_SIZE, self.food.cell[1] * CELL_SIZE)]
+            self.sprites.draw_at(self.screen, self.sprites.image_tile(image), positions)
 
     def load_music_tracks(self):
         """Load music"""
@@ -164,113 +470,93 @@ class Game:
 
         if self.current_track_index != new_track_index:
             self.current_track_index = new_track_index
-            pygame.mixer.music.load(self.tracks[self.current_track_index])
-            pygame.mixer.music.play(-1)
+            self.music.play(self.current_track_index)
 
     def spawn_food(self):
         """Spawn food on the field"""
-        if random.randint(0, 20) == 0:
-            x = random.randint(0, CELL_NUMBER - 1)
-            y = random.randint(0, CELL_NUMBER - 1)
-            self.food = Point5Apple(x, y)
-            self.eat_sound = pygame.mixer.Sound("magic.mp3")
-        else:
-            self.food = Food()
-            self.food.randomize(self.snake.body, self.obstacles)
-            self.eat_sound = pygame.mixer.Sound("crunch.wav")
-        self.last_eaten_time = pygame.time.get_ticks() - self.game_start_time
+        self.sim.spawn_food()
 
     def change_background(self, index):
         """Change background if needed"""
-        if 0 <= index < len(self.background_images):
+        if 0 <= index < len(BACKGROUND_IMAGES):
             self.current_bg = index
-            if self.background_images[index] is not None:
-                scaled_image = pygame.transform.scale(self.background_images[index], (SCREEN_WIDTH, SCREEN_HEIGHT))
-                self.bg_image = scaled_image
-            else:
-                self.bg_image = None
+            image = assets.image(BACKGROUND_IMAGES[index], alpha=False)
+            self.bg_image = pygame.transform.scale(image, (SCREEN_WIDTH, SCREEN_HEIGHT))
             self.use_default_background = index == 0
 
-    def draw_palette(self):
+    def background_color(self):
+        """Colour behind the board for the current level"""
+        return (220, 20, 60) if self.play_with_obstacles else (170, 215, 70)
+
+    def draw_palette(self, surface=None):
         """Draw palette if default background is used"""
+        surface = surface or self.screen
+        self.profiler.start('draw_palette')
         if self.use_default_background:
             if self.play_with_obstacles:
                 grass_color = (165, 42, 42)
             else:
                 grass_color = (160, 210, 60)
-            for row in range(CELL_NUMBER):
-                for col in range(CELL_NUMBER):
-                    if (row % 2 == 0 and col % 2 == 0) or (row % 2 != 0 and col % 2 != 0):
-                        background_rect = pygame.Rect(col * CELL_SIZE, row * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                        pygame.draw.rect(self.screen, grass_color, background_rect)
+            self.sprites.draw_checkerboard(surface, grass_color, CELL_NUMBER)
         else:
-            self.screen.blit(self.bg_image, (0, 0))
+            surface.blit(self.bg_image, (0, 0))
+        self.profiler.stop()
 
     def check_collision(self):
         """Check collision with objects"""
-        if self.food.pos == self.snake.body[0]:
-            self.eat_sound.play()
-            self.snake.add_block()
-            self.score += self.food.get_points()
-            self.spawn_food()
-            self.last_eaten_time = pygame.time.get_ticks() - self.game_start_time
+        eat_sound = self.eat_sound
+        if self.sim.check_collision() is not None:
+            eat_sound.play()
             self.update_music_track()
 
     def check_fail(self):
         """Check for player fail"""
-        head = self.snake.body[0]
-        if not 0 <= head.x < CELL_NUMBER or not 0 <= head.y < CELL_NUMBER or head in self.snake.body[1:]:
+        if self.sim.check_fail() is not None:
             self.update_score(self.score)
-            self.game_over = True
-        if self.play_with_obstacles:
-            for obstacle in self.obstacles:
-                if head in obstacle.positions:
-                    self.update_score(self.score)
-                    self.game_over = True
 
     def handle_keys(self, key):
         """Handle keys"""
-        direction = self.snake.direction
-        if not self.direction_changed:
-            if key == K_UP and direction.y != 1:
-                self.snake.next_direction = Vector2(0, -1)
-                self.direction_changed = True
-            elif key == K_DOWN and direction.y != -1:
-                self.snake.next_direction = Vector2(0, 1)
-                self.direction_changed = True
-            elif key == K_LEFT and direction.x != 1:
-                self.snake.next_direction = Vector2(-1, 0)
-                self.direction_changed = True
-            elif key == K_RIGHT and direction.x != -1:
-                self.snake.next_direction = Vector2(1, 0)
-                self.direction_changed = True
+        if key == K_F3:
+            self.profiler.set_overlay(not self.profiler.overlay)
+            self.renderer.invalidate()
+        if key == K_F5 and self.replay is not None:
+            snapshot.save(self.sim, SAVE_FILE)
+        if key in KEY_DIRECTIONS:
+            self.inputs.push(KEY_DIRECTIONS[key], self.snake.direction)
 
     def update_score(self, new_score):
-        """Update user's score and save high scores to file"""
-        self.high_scores.append(new_score)
-        self.high_scores = sorted(self.high_scores, reverse=True)[:5]  # Keep only top 5 scores
-        save_high_scores(self.high_scores)
+        """Record user's score in the leaderboard of the current mode"""
+        self.scores.add(new_score, self.play_with_obstacles, self.sim.cell_number)
 
     def score_draw(self):
         """Draw score"""
+        self.profiler.start('score_draw')
         score = self.score
         score_text = f"Score: {score}"
-        score_surface = self.score_font.render(score_text, True, (255, 255, 255))
+        score_surface = render_text(score_text, SCORE_FONT_SIZE, (255, 255, 255))
         score_rect = score_surface.get_rect(topright=(SCREEN_WIDTH - 10, 10))
         self.screen.blit(score_surface, score_rect)
+        self.profiler.stop()
+
+    def save_trace(self):
+        """Write the frame trace of the session so far, if one was requested"""
+        if self.trace_file is not None:
+            self.profiler.save_trace(self.trace_file)
+
+    def score_rect(self):
+        """Screen area covered by the score text"""
+        score_rect = pygame.Rect((0, 0), self.score_font.size(f"Score: {self.score}"))
+        score_rect.topright = (SCREEN_WIDTH - 10, 10)
+        return score_rect
 
     def adjust_timer(self):
         """Adjust the snake speed"""
-        interval = 100 - self.score * 2
-        interval = max(interval, 50)
-        pygame.time.set_timer(self.timer_event, int(interval))
+        self.tick_interval = self.sim.interval
 
-    def handle_game_over(self):
-        """Handle game over"""
-        pygame.mixer.music.stop()
-        self.game_over_sound.play()
+    def draw_game_over(self):
+        """Draw the final score and high scores over the last frame"""
         game_over_text = "Game Over! Your final score: " + str(self.score)
-        game_over_surface = self.score_font.render(game_over_text, True, (255, 0, 0))
+        game_over_surface = render_text(game_over_text, SCORE_FONT_SIZE, (255, 0, 0))
         game_over_rect = game_over_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
         pygame.draw.rect(self.screen, (255, 255, 255), game_over_rect, border_radius=10)
         self.screen.blit(game_over_surface, game_over_rect)
@@ -278,7 +564,7 @@ class Game:
         # High scores display
         high_score_text = "High Scores:"
         high_score_y = game_over_rect.bottom + 30
-        high_score_surface = self.score_font.render(high_score_text, True, (255, 0, 0))
+        high_score_surface = render_text(high_score_text, SCORE_FONT_SIZE, (255, 0, 0))
         high_score_rect = high_score_surface.get_rect(midtop=(game_over_rect.centerx, high_score_y))
         pygame.draw.rect(self.screen, (255, 255, 255), high_score_rect, border_radius=5)
         self.screen.blit(high_score_surface, high_score_rect)
@@ -289,51 +575,57 @@ class Game:
         high_score_y += 40
         for i, score in enumerate(sorted_high_scores):
             high_score_text = f"{i + 1}. {score}"
-            high_score_surface = self.score_font.render(high_score_text, True, (255, 0, 0))
+            high_score_surface = render_text(high_score_text, SCORE_FONT_SIZE, (255, 0, 0))
             high_score_rect = high_score_surface.get_rect(midtop=(high_score_rect.centerx, high_score_y))
             pygame.draw.rect(self.screen, (255, 255, 255), high_score_rect, border_radius=5)
             self.screen.blit(high_score_surface, high_score_rect)
             high_score_y += 30
 
-        restart_surface = self.score_font.render("Press 'R' to Restart or 'Q' to Quit.", True, (255, 255, 255))
+        restart_surface = render_text("Press 'R' to Restart or 'Q' to Quit.", SCORE_FONT_SIZE, (255, 255, 255))
         restart_rect = restart_surface.get_rect(center=(SCREEN_WIDTH // 2, high_score_rect.bottom + 30))
         pygame.draw.rect(self.screen, (255, 0, 0), restart_rect, border_radius=10)
         self.screen.blit(restart_surface, restart_rect)
 
         pygame.display.update()
 
-        waiting_for_input = True
-        while waiting_for_input:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    return
-                if event.type == KEYDOWN:
-                    if event.key == K_r:
-                        self.restart_game()
-                        waiting_for_input = False
-                    elif event.key == K_q:
-                        pygame.quit()
-                        return
+    def handle_game_over(self):
+        """Game over scene, wait on the event queue for a restart or quit; return the next scene"""
+        self.music.stop()
+        self.game_over_sound.play()
+        self.draw_game_over()
+        while True:
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            if event.type == QUIT:
+                return None
+            if event.type == KEYDOWN:
+                if event.key == K_r:
+                    self.restart_game()
+                    return PLAY
+                if event.key == K_q:
+                    return None
+            elif event.type in EXPOSE_EVENTS:
+                self.draw_game_over()
+
+    def quit(self):
+        """Shut pygame down once the music loader is done with the mixer, once"""
+        if not pygame.get_init():
+            return
+        self.music.stop()
+        self.music.wait()
+        assets.wait()
+        pygame.quit()
 
     def restart_game(self):
-        """Restart the game after fail"""
-        self.snake = Snake()
-        self.food = Food()
-        self.spawn_food()
-        self.game_start_time = 0
-        self.last_eaten_time = self.game_start_time
-        self.score = 0
-        self.game_over = False
+        """Start the music over for the next round"""
         self.current_track_index = 0
-        pygame.mixer.music.load(self.tracks[self.current_track_index])
-        pygame.mixer.music.play(-1)
-        self.obstacles = []
-        self.run()
+        self.music.play(self.current_track_index)
 
     def show_settings_screen(self):
-        """Settings screen"""
-        running = True
+        """Settings scene, return the next scene or None to quit
+
+        The screen is drawn again only after a key or button changed it.
+        """
+        assets.prefetch(images=BACKGROUND_IMAGES)
         btn_scores = Button(self.screen, (0, 0, 128), 250, 225, 200, 50, 'Scores', (255, 255, 255))
         btn_quit = Button(self.screen, (128, 128, 0), 250, 375, 200, 50, 'Quit', (255, 255, 255))
         lbl_title = Label(self.screen, 'Snake Game', 100, 50, 500, 50, (255, 255, 255))
@@ -343,45 +635,45 @@ class Game:
         instructions_label = Label(self.screen, bg_instructions, 30, 100, 700, 50, (255, 255, 255))
         instructions_label1 = Label(self.screen, bg_instructions1, 30, 150, 700, 50, (255, 255, 255))
 
-        high_scores_display = []
-
-        while running:
-            self.screen.fill((175, 215, 70) if self.use_default_background else (0, 0, 0))
-            if not self.use_default_background:
-                self.screen.blit(self.bg_image, (0, 0))
-            lbl_title.draw()
-            btn_scores.draw()
-            btn_quit.draw()
-            instructions_label.draw()
-            instructions_label1.draw()
-
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    return
-                if event.type == KEYDOWN:
-                    if event.key == K_0:
-                        self.use_default_background = True
-                    elif event.key == K_1:
-                        self.change_background(0)
-                        self.use_default_background = False
-                    elif event.key == K_2:
-                        self.change_background(1)
-                        self.use_default_background = False
-                    elif event.key == K_3:
-                        self.change_background(2)
-                        self.use_default_background = False
-                elif btn_scores.is_clicked(event):
-                    high_scores_display = self.high_scores
-                elif btn_quit.is_clicked(event):
-                    running = False
-
-            if high_scores_display:
-                y_offset = 450
-                for score in high_scores_display:
-                    score_label = Label(self.screen, str(score), 250, y_offset, 200, 50, (255, 255, 255))
+        score_labels = []
+        redraw = True
+
+        while True:
+            if redraw:
+                self.screen.fill((175, 215, 70) if self.use_default_background else (0, 0, 0))
+                if not self.use_default_background:
+                    self.screen.blit(self.bg_image, (0, 0))
+                lbl_title.draw()
+                btn_scores.draw()
+                btn_quit.draw()
+                instructions_label.draw()
+                instructions_label1.draw()
+                for score_label in score_labels:
                     score_label.draw()
-                    y_offset += 30
-
-            pygame.display.flip()
-            self.clock.tick(60)
+                pygame.display.flip()
+                redraw = False
+
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            if event.type == QUIT:
+                return None
+            if event.type == KEYDOWN:
+                if event.key == K_0:
+                    self.use_default_background = True
+                elif event.key == K_1:
+                    self.change_background(0)
+                    self.use_default_background = False
+                elif event.key == K_2:
+                    self.change_background(1)
+                    self.use_default_background = False
+                elif event.key == K_3:
+                    self.change_background(2)
+                    self.use_default_background = False
+                redraw = True
+            elif btn_scores.is_clicked(event):
+                score_labels = [Label(self.screen, str(score), 250, 450 + 30 * i, 200, 50, (255, 255, 255))
+                                for i, score in enumerate(self.high_scores)]
+                redraw = True
+            elif btn_quit.is_clicked(event):
+                return START
+            elif event.type in EXPOSE_EVENTS:
+                redraw = True
@@ -0,0 +1,171 @@
+"""Module with board bookkeeping structures"""
+from array import array
+
+
+class FreeCells:
+    """Set of cell ids with constant time add, remove and uniform sampling
+
+    Ids are kept in a dense array; a position map from id to array slot lets
+    removal swap the last id into the hole instead of shifting the array.
+    """
+    def __init__(self, size):
+        """Initialize an empty set for ids below ``size``"""
+        self.position = array('i', [-1]) * size
+        self.cells = array('i')
+
+    def __len__(self):
+        """Number of free cells"""
+        return len(self.cells)
+
+    def __contains__(self, cell_id):
+        """Check if a cell is free"""
+        return self.position[cell_id] >= 0
+
+    def add(self, cell_id):
+        """Mark a cell as free"""
+        if self.position[cell_id] < 0:
+            self.position[cell_id] = len(self.cells)
+            self.cells.append(cell_id)
+
+    def add_range(self, start, stop):
+        """Mark a run of consecutive cells, none of them free yet, as free"""
+        offset = len(self.cells)
+        self.cells.extend(range(start, stop))
+        self.position[start:stop] = array('i', range(offset, offset + stop - start))
+
+    def copy(self):
+        """Return an independent copy of the set"""
+        other = FreeCells(0)
+        other.position = array('i', self.position)
+        other.cells = array('i', self.cells)
+        return other
+
+    def load(self, cells, position):
+        """Take over arrays of ids and of their positions, as kept by another set"""
+        self.cells = cells
+        self.position = position
+
+    def remove(self, cell_id):
+        """Mark a cell as taken, ignoring cells that are not free"""
+        index = self.position[cell_id]
+        if index < 0:
+            return
+        last = self.cells.pop()
+        if last != cell_id:
+            self.cells[index] = last
+            self.position[last] = index
+        self.position[cell_id] = -1
+
+    def sample(self, rng):
+        """Return a uniformly random free cell or None when there is none"""
+        if not self.cells:
+            return None
+        return self.cells[rng.randrange(len(self.cells))]
+
+
+EMPTY = 0
+WALL = 1
+SNAKE = 2
+OBSTACLE = 3
+FOOD = 4
+
+
+class World:
+    """Occupancy of every board cell, shared by the snake, food and obstacles
+
+    Cells are integer ids on a board padded with one cell of wall on every
+    side. Each occupant type keeps a count per cell, so overlapping occupants
+    (a dying snake on an obstacle) are released correctly, and ``free_cells``
+    always holds exactly the board cells with no occupant at all. Setting
+    ``dirty`` to a set makes the world collect ids of cells that changed.
+    ``generation`` counts clears and ``obstacle_version`` obstacle changes,
+    so layers drawn from the obstacles can be cached between them.
+    """
+    def __init__(self, cell_number):
+        """Initialize an empty board"""
+        self.cell_number = cell_number
+        self.stride = cell_number + 2
+        size = self.stride * self.stride
+        self.board = bytearray(size)
+        self.board_cells = FreeCells(size)
+        for y in range(cell_number):
+            start = self.cell_id((0, y))
+            self.board[start:start + cell_number] = b'\x01' * cell_number
+            self.board_cells.add_range(start, start + cell_number)
+        self.snakes = bytearray(size)
+        self.obstacles = bytearray(size)
+        self.food = bytearray(size)
+        self.free_cells = self.board_cells.copy()
+        self.dirty = None
+        self.generation = 0
+        self.obstacle_version = 0
+
+    def clear(self):
+        """Remove every occupant"""
+        self.generation += 1
+        size = len(self.board)
+        self.snakes = bytearray(size)
+        self.obstacles = bytearray(size)
+        self.food = bytearray(size)
+        self.free_cells = self.board_cells.copy()
+
+    def cell_id(self, cell):
+        """Padded board index of an (x, y) cell"""
+        return (cell[1] + 1) * self.stride + cell[0] + 1
+
+    def cell_at(self, cell_id):
+        """(x, y) cell of a padded board index"""
+        y, x = divmod(cell_id, self.stride)
+        return x - 1, y - 1
+
+    def in_bounds(self, cell):
+        """Check if a cell lies on the board"""
+        return 0 <= cell[0] < self.cell_number and 0 <= cell[1] < self.cell_number
+
+    def at(self, cell):
+        """Return what occupies an (x, y) cell"""
+        if not self.in_bounds(cell):
+            return WALL
+        return self.at_id(self.cell_id(cell))
+
+    def at_id(self, cell_id):
+        """Return what occupies a padded board index"""
+        if not self.board[cell_id]:
+            return WALL
+        if self.obstacles[cell_id]:
+            return OBSTACLE
+        if self.snakes[cell_id]:
+            return SNAKE
+        if self.food[cell_id]:
+            return FOOD
+        return EMPTY
+
+    def add(self, layer, cell_id):
+        """Put one occupant of a layer on a cell"""
+        layer[cell_id] += 1
+        self.free_cells.remove(cell_id)
+        if self.dirty is not None:
+            self.dirty.add(cell_id)
+
+    def discard(self, layer, cell_id):
+        """Take one occupant of a layer off a cell"""
+        if not layer[cell_id]:
+            return
+        layer[cell_id] -= 1
+        if self.dirty is not None:
+            self.dirty.add(cell_id)
+        if (self.board[cell_id] and not self.snakes[cell_id] and not self.obstacles[cell_id]
+                and not self.food[cell_id]):
+            self.free_cells.add(cell_id)
+
+    def add_cells(self, layer, cells):
+        """Put occupants on (x, y) cells, ignoring cells outside the padded board"""
+        for cell in cells:
+            if -1 <= cell[0] <= self.cell_number and -1 <= cell[1] <= self.cell_number:
+                self.add(layer, self.cell_id(cell))
+
+    def discard_cells(self, layer, cells):
+        """Take occupants off (x, y) cells"""
+        for cell in cells:
+            if -1 <= cell[0] <= self.cell_number and -1 <= cell[1] <= self.cell_number:
+                self.discard(layer, self.cell_id(cell))
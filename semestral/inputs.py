@@ -0,0 +1,74 @@
+"""Module with the buffered player input queue"""
+import time
+from collections import deque
+from timing import percentile, SAMPLE_WINDOW
+
+INPUT_QUEUE_SIZE = 3
+
+
+class InputQueue:
+    """Turns the player pressed, applied one per tick
+
+    Each turn is checked when it is pushed against the heading the snake
+    will have after the turns already queued, so a reversal or a repeat of
+    the same heading is rejected at once and a quick up-then-left inside
+    one tick becomes two turns on two ticks. The time of the key press is
+    kept with every turn; once a frame showing the turn is presented, the
+    delay from the press is recorded.
+    """
+    def __init__(self, size=INPUT_QUEUE_SIZE, window=SAMPLE_WINDOW):
+        """Initialize an empty queue"""
+        self.turns = deque()
+        self.size = size
+        self.shown = []
+        self.latencies = deque(maxlen=window)
+        self.rejected = 0
+        self.dropped = 0
+
+    def __len__(self):
+        """Number of queued turns"""
+        return len(self.turns)
+
+    def clear(self):
+        """Forget queued turns, for a new round"""
+        self.turns.clear()
+        self.shown.clear()
+
+    def push(self, direction, heading, pressed=None):
+        """Queue a turn unless it reverses or repeats ``heading`` or the last queued turn"""
+        if self.turns:
+            heading = self.turns[-1][0]
+        if direction == heading or (direction[0] == -heading[0] and direction[1] == -heading[1]):
+            self.rejected += 1
+            return False
+        if len(self.turns) == self.size:
+            self.dropped += 1
+            return False
+        self.turns.append((direction, time.perf_counter() if pressed is None else pressed))
+        return True
+
+    def pop(self):
+        """Take the oldest turn, return its direction or None when there is none"""
+        if not self.turns:
+            return None
+        direction, pressed = self.turns.popleft()
+        self.shown.append(pressed)
+        return direction
+
+    def presented(self, now=None):
+        """Record the delay of the turns applied since the last presented frame"""
+        if not self.shown:
+            return
+        now = time.perf_counter() if now is None else now
+        self.latencies.extend((now - pressed) * 1000 for pressed in self.shown)
+        self.shown.clear()
+
+    def summary(self):
+        """Return input latency percentiles and counts of turns not taken"""
+        return {
+            'input_ms_p50': percentile(self.latencies, 0.5),
+            'input_ms_p95': percentile(self.latencies, 0.95),
+            'input_ms_p99': percentile(self.latencies, 0.99),
+            'rejected_turns': self.rejected,
+            'dropped_turns': self.dropped,
+        }
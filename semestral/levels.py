@@ -0,0 +1,237 @@
+"""Procedural obstacle layouts and the level packs they are stored in
+
+A level is a set of obstacles placed on an empty board up to a target
+density. Obstacles are short bars and L shapes. One is kept only if the
+free cells around it stay connected among themselves, so no obstacle can
+cut the board in two: every free cell, and any food spawned on one, stays
+reachable from the snake's start. A finished layout is checked once more
+with a flood fill. ``generate`` gives the same layout for the same size,
+density and seed.
+
+Generating a dense large board takes a while, so layouts are built ahead
+of time with ``python levels.py --cells 30 --levels 100 --output
+levels.pack``. A pack stores each obstacle as its origin cell and a shape
+code (5 bytes) behind a small index; loading a pack reads the index only,
+and a level is decoded with two array copies when it is played.
+"""
+import argparse
+import random
+import struct
+import sys
+from array import array
+from constants import CELL_NUMBER
+from simulation import SnakeBody
+
+MAGIC = b'SNKL'
+VERSION = 1
+HEADER = struct.Struct('<4sBHdI')
+ENTRY = struct.Struct('<QII')
+DENSITY = 0.06
+START_CLEARANCE = 9
+ATTEMPTS_PER_CELL = 4
+SHAPES = (
+    ((0, 0), (1, 0)),
+    ((0, 0), (0, 1)),
+    ((0, 0), (1, 0), (2, 0)),
+    ((0, 0), (0, 1), (0, 2)),
+    ((0, 0), (1, 0), (2, 0), (3, 0)),
+    ((0, 0), (0, 1), (0, 2), (0, 3)),
+    ((0, 0), (1, 0), (0, 1)),
+    ((0, 0), (1, 0), (1, 1)),
+    ((0, 0), (0, 1), (1, 1)),
+    ((1, 0), (0, 1), (1, 1)),
+)
+SPANS = [(max(dx for dx, _ in shape), max(dy for _, dy in shape)) for shape in SHAPES]
+
+
+class Level:
+    """Obstacle layout of one board, reproducible from its density and seed"""
+    def __init__(self, cell_number, density, seed, origins, shapes):
+        """Initialize the level from obstacle origins (padded cell ids) and shape codes"""
+        self.cell_number = cell_number
+        self.density = density
+        self.seed = seed
+        self.origins = origins
+        self.shapes = shapes
+
+    def __len__(self):
+        """Number of obstacles"""
+        return len(self.origins)
+
+    def obstacles(self):
+        """Cells of every obstacle, one list per obstacle"""
+        stride = self.cell_number + 2
+        obstacles = []
+        for origin, shape in zip(self.origins, self.shapes):
+            y, x = divmod(origin, stride)
+            obstacles.append([(x - 1 + dx, y - 1 + dy) for dx, dy in SHAPES[shape]])
+        return obstacles
+
+
+def start_area(cell_number):
+    """Padded ids of the cells kept free around where the snake starts"""
+    stride = cell_number + 2
+    head_x, head_y = SnakeBody(cell_number).head()
+    reach = int(START_CLEARANCE ** 0.5)
+    return {(y + 1) * stride + x + 1
+            for y in range(max(head_y - reach, 0), min(head_y + reach + 1, cell_number))
+            for x in range(max(head_x - reach, 0), min(head_x + reach + 1, cell_number))
+            if (x - head_x) ** 2 + (y - head_y) ** 2 <= START_CLEARANCE}
+
+
+def keeps_connected(blocked, stride, cells):
+    """Check that the free cells around ``cells`` stay connected without passing through them
+
+    Any path through the new obstacle enters and leaves it through these
+    neighbours, so if they reach each other around it, blocking it
+    disconnects nothing.
+    """
+    ring = set()
+    for cell_id in cells:
+        for offset in (-stride - 1, -stride, -stride + 1, -1, 1, stride - 1, stride, stride + 1):
+            neighbour = cell_id + offset
+            if not blocked[neighbour] and neighbour not in cells:
+                ring.add(neighbour)
+    if not ring:
+        return True
+    start = next(iter(ring))
+    seen = {start}
+    stack = [start]
+    while stack:
+        cell_id = stack.pop()
+        for neighbour in (cell_id - stride, cell_id + stride, cell_id - 1, cell_id + 1):
+            if neighbour in ring and neighbour not in seen:
+                seen.add(neighbour)
+                stack.append(neighbour)
+    return len(seen) == len(ring)
+
+
+def is_connected(blocked, stride, start):
+    """Flood fill from ``start``, check that it reaches every cell not blocked"""
+    seen = bytearray(blocked)
+    seen[start] = 1
+    stack = [start]
+    reached = 1
+    while stack:
+        cell_id = stack.pop()
+        for neighbour in (cell_id - stride, cell_id + stride, cell_id - 1, cell_id + 1):
+            if not seen[neighbour]:
+                seen[neighbour] = 1
+                reached += 1
+                stack.append(neighbour)
+    return reached == len(blocked) - sum(blocked)
+
+
+def generate(cell_number=CELL_NUMBER, density=DENSITY, seed=0):
+    """Place obstacles on an empty board until ``density`` of its cells are covered, return the Level"""
+    rng = random.Random(seed)
+    stride = cell_number + 2
+    blocked = bytearray([1]) * (stride * stride)
+    for y in range(cell_number):
+        start = (y + 1) * stride + 1
+        blocked[start:start + cell_number] = bytes(cell_number)
+    reserved = start_area(cell_number)
+    for cell_id in SnakeBody(cell_number).iter_ids():
+        reserved.add(cell_id)
+    target = round(density * cell_number * cell_number)
+    origins = array('I')
+    shapes = bytearray()
+    covered = 0
+    for _ in range(target * ATTEMPTS_PER_CELL):
+        if covered >= target:
+            break
+        x, y = rng.randrange(cell_number), rng.randrange(cell_number)
+        shape = rng.randrange(len(SHAPES))
+        if x + SPANS[shape][0] >= cell_number or y + SPANS[shape][1] >= cell_number:
+            continue
+        origin = (y + 1) * stride + x + 1
+        cells = {origin + dy * stride + dx for dx, dy in SHAPES[shape]}
+        if any(blocked[cell_id] or cell_id in reserved for cell_id in cells):
+            continue
+        if not keeps_connected(blocked, stride, cells):
+            continue
+        for cell_id in cells:
+            blocked[cell_id] = 1
+        origins.append(origin)
+        shapes.append(shape)
+        covered += len(cells)
+    if not is_connected(blocked, stride, next(iter(reserved))):
+        raise RuntimeError(f"level {seed} split the board")
+    return Level(cell_number, density, seed, origins, bytes(shapes))
+
+
+class LevelPack:
+    """Levels of one board size and density, stored back to back behind an index"""
+    def __init__(self, cell_number, density, data=b''):
+        """Initialize a pack, reading the index of serialized ``data`` if given"""
+        self.cell_number = cell_number
+        self.density = density
+        self.data = data
+        self.entries = []
+        if data:
+            magic, version, cell_number, density, count = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a level pack")
+            self.cell_number = cell_number
+            self.density = density
+            self.entries = [ENTRY.unpack_from(data, HEADER.size + index * ENTRY.size) for index in range(count)]
+
+    def __len__(self):
+        """Number of levels"""
+        return len(self.entries)
+
+    def level(self, index):
+        """Decode one level"""
+        seed, count, offset = self.entries[index]
+        origins = array('I')
+        origins.frombytes(self.data[offset:offset + count * origins.itemsize])
+        offset += count * origins.itemsize
+        return Level(self.cell_number, self.density, seed, origins, self.data[offset:offset + count])
+
+    def choose(self, rng=random):
+        """A random level of the pack"""
+        return self.level(rng.randrange(len(self)))
+
+    @classmethod
+    def build(cls, levels):
+        """Pack generated levels, all of the same size and density"""
+        first = levels[0]
+        out = bytearray(HEADER.pack(MAGIC, VERSION, first.cell_number, first.density, len(levels)))
+        offset = HEADER.size + len(levels) * ENTRY.size
+        for level in levels:
+            out += ENTRY.pack(level.seed, len(level), offset)
+            offset += len(level) * 5
+        for level in levels:
+            out += array('I', level.origins).tobytes()
+            out += level.shapes
+        return cls(first.cell_number, first.density, bytes(out))
+
+    def save(self, filename):
+        """Write the pack to a file"""
+        with open(filename, 'wb') as file:
+            file.write(self.data)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a pack from a file"""
+        with open(filename, 'rb') as file:
+            return cls(0, 0.0, file.read())
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Generate a pack of obstacle layouts")
+    parser.add_argument('--cells', type=int, default=CELL_NUMBER, help='board size in cells')
+    parser.add_argument('--levels', type=int, default=100, help='number of levels')
+    parser.add_argument('--density', type=float, default=DENSITY, help='share of the board covered by obstacles')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first level')
+    parser.add_argument('--output', default='levels.pack', help='pack file to write')
+    args = parser.parse_args(argv)
+    pack = LevelPack.build([generate(args.cells, args.density, args.seed + index) for index in range(args.levels)])
+    pack.save(args.output)
+    print(f"{len(pack)} levels of {args.cells}x{args.cells} cells in {len(pack.data)} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,46 @@
 """This module defines main of the game"""
+import argparse
+import logging
+from constants import CELL_NUMBER
+from autopilot import Autopilot
 from game import Game
+from levels import LevelPack
+import snapshot
 
 
-def main():
+def main(argv=None):
     """Main function"""
-    game = Game()
+    parser = argparse.ArgumentParser(description="Snake game")
+    parser.add_argument('--cells', type=int, default=CELL_NUMBER,
+                        help='board size in cells, larger boards scroll with the snake')
+    parser.add_argument('--profile', action='store_true', help='show the frame profiler overlay (toggle with F3)')
+    parser.add_argument('--trace', metavar='FILE', help='write a Chrome trace of every frame to FILE')
+    parser.add_argument('--resume', metavar='FILE', help='continue a game saved with F5')
+    parser.add_argument('--levels', metavar='FILE', help='play the obstacle layouts of a level pack')
+    parser.add_argument('--autopilot', action='store_true', help='let the built-in bot play')
+    parser.add_argument('--verbose', action='store_true', help='log music switches and other timings')
+    args = parser.parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format='%(name)s: %(message)s')
+    if args.resume:
+        try:
+            saved = snapshot.load(args.resume)
+        except (OSError, ValueError) as error:
+            parser.error(f"cannot resume {args.resume}: {error}")
+        if saved.cell_number != args.cells:
+            parser.error(f"{args.resume} is a game on {saved.cell_number} cells, the board has {args.cells}")
+    levels = None
+    if args.levels:
+        levels = LevelPack.load(args.levels)
+        if levels.cell_number != args.cells:
+            parser.error(f"{args.levels} has levels for {levels.cell_number} cells, the board has {args.cells}")
+    game = Game(trace_file=args.trace, cell_number=args.cells)
+    game.profiler.set_overlay(args.profile)
+    game.resume_file = args.resume
+    if levels is not None:
+        game.levels = levels
+    if args.autopilot:
+        game.autopilot = Autopilot()
     game.run()
 
 
@@ -0,0 +1,45 @@
+"""Module with the policies that play the headless Simulation
+
+A policy is a callable that takes the Simulation and returns a direction,
+or None to keep going straight. A policy factory is called with the seed of
+a game and returns the policy for that game.
+"""
+import random
+from autopilot import Autopilot
+from simulation import DIRECTIONS, UP, DOWN, LEFT, RIGHT
+
+
+def greedy(sim):
+    """Head for the food, taking any safe turn when the direct way is blocked"""
+    head_x, head_y = sim.snake.head()
+    food_x, food_y = sim.food.cell
+    preferred = [direction for direction, wanted in ((RIGHT, food_x > head_x), (LEFT, food_x < head_x),
+                                                     (DOWN, food_y > head_y), (UP, food_y < head_y)) if wanted]
+    for direction in preferred + [UP, DOWN, LEFT, RIGHT]:
+        if direction[0] == -sim.snake.direction[0] and direction[1] == -sim.snake.direction[1]:
+            continue
+        if not sim.is_blocked((head_x + direction[0], head_y + direction[1])):
+            return direction
+    return None
+
+
+def random_policy(seed):
+    """Turn at random"""
+    rng = random.Random(seed)
+
+    def policy(sim):
+        return rng.choice(DIRECTIONS)
+    return policy
+
+
+def greedy_policy(seed):
+    """Head for the food, dodging whatever is directly ahead"""
+    return greedy
+
+
+def autopilot_policy(seed):
+    """Plan safe paths with the built-in autopilot"""
+    return Autopilot()
+
+
+POLICIES = {'random': random_policy, 'greedy': greedy_policy, 'autopilot': autopilot_policy}
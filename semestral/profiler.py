@@ -0,0 +1,146 @@
+"""Module with the frame profiler, its overlay and trace export"""
+import json
+import time
+from collections import deque
+import pygame
+from timing import percentile, SAMPLE_WINDOW
+from ui import get_font
+
+OVERLAY_FONT_SIZE = 22
+OVERLAY_REFRESH = 0.25
+OVERLAY_MARGIN = 6
+MAX_TRACE_EVENTS = 200000
+
+
+class FrameProfiler:
+    """Time the phases of each frame
+
+    Phases are bracketed with ``start(name)`` and ``stop()`` and may nest.
+    While neither the overlay nor tracing is on, both calls return at once,
+    so the instrumentation can stay in the game loop. With tracing on, every
+    phase is also kept as a Chrome trace event (open the exported file in
+    chrome://tracing or Perfetto).
+    """
+    def __init__(self, window=SAMPLE_WINDOW):
+        """Initialize a disabled profiler"""
+        self.window = window
+        self.overlay = False
+        self.tracing = False
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.stack = []
+        self.frame_start = None
+        self.frame_times = deque(maxlen=window)
+        self.phase_times = {}
+        self.tick_times = deque(maxlen=window)
+        self.events = []
+        self.dropped_events = 0
+        self.lines = []
+        self.refreshed = 0.0
+
+    def set_overlay(self, overlay):
+        """Show or hide the on-screen statistics"""
+        self.overlay = overlay
+        self.enabled = self.overlay or self.tracing
+
+    def set_tracing(self, tracing):
+        """Start or stop keeping trace events"""
+        self.tracing = tracing
+        self.enabled = self.overlay or self.tracing
+
+    def begin_frame(self):
+        """Mark the start of a loop iteration"""
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """Mark the end of a loop iteration that presented a frame"""
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frame_times.append((end - self.frame_start) * 1000)
+        self.trace('frame', self.frame_start, end)
+        self.frame_start = None
+
+    def start(self, name):
+        """Enter a phase"""
+        if self.enabled:
+            self.stack.append((name, time.perf_counter()))
+
+    def stop(self):
+        """Leave the innermost phase"""
+        if not self.enabled or not self.stack:
+            return
+        end = time.perf_counter()
+        name, begin = self.stack.pop()
+        if name not in self.phase_times:
+            self.phase_times[name] = deque(maxlen=self.window)
+        self.phase_times[name].append((end - begin) * 1000)
+        if name == 'update':
+            self.tick_times.append(end)
+        self.trace(name, begin, end)
+
+    def trace(self, name, begin, end):
+        """Keep a complete trace event while tracing"""
+        if not self.tracing:
+            return
+        if len(self.events) >= MAX_TRACE_EVENTS:
+            self.dropped_events += 1
+            return
+        self.events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                            'ts': (begin - self.origin) * 1e6, 'dur': (end - begin) * 1e6})
+
+    def ticks_per_second(self):
+        """Number of ticks in the last second"""
+        now = time.perf_counter()
+        return sum(1 for tick in self.tick_times if now - tick <= 1)
+
+    def slowest_phase(self):
+        """Name and mean duration of the phase taking the most time per call"""
+        means = {name: sum(samples) / len(samples)
+                 for name, samples in self.phase_times.items() if samples}
+        if not means:
+            return None, 0.0
+        name = max(means, key=means.get)
+        return name, means[name]
+
+    def summary(self):
+        """Return the statistics as a dictionary"""
+        name, duration = self.slowest_phase()
+        return {
+            'frame_ms_p50': percentile(self.frame_times, 0.5),
+            'frame_ms_p95': percentile(self.frame_times, 0.95),
+            'frame_ms_p99': percentile(self.frame_times, 0.99),
+            'ticks_per_second': self.ticks_per_second(),
+            'slowest_phase': name,
+            'slowest_phase_ms': duration,
+        }
+
+    def draw(self, screen):
+        """Draw the overlay in the top left corner and return the area it covers"""
+        now = time.perf_counter()
+        if now - self.refreshed >= OVERLAY_REFRESH:
+            self.refreshed = now
+            stats = self.summary()
+            text = [f"frame p50 {stats['frame_ms_p50']:.2f} p95 {stats['frame_ms_p95']:.2f} "
+                    f"p99 {stats['frame_ms_p99']:.2f} ms",
+                    f"ticks/s {stats['ticks_per_second']}"]
+            if stats['slowest_phase'] is not None:
+                text.append(f"slowest {stats['slowest_phase']} {stats['slowest_phase_ms']:.2f} ms")
+            font = get_font(OVERLAY_FONT_SIZE)
+            self.lines = [font.render(line, True, (255, 255, 255)) for line in text]
+        width = max((line.get_width() for line in self.lines), default=0) + 2 * OVERLAY_MARGIN
+        height = sum(line.get_height() for line in self.lines) + 2 * OVERLAY_MARGIN
+        rect = pygame.Rect(0, 0, width, height)
+        screen.fill((0, 0, 0), rect)
+        y = OVERLAY_MARGIN
+        for line in self.lines:
+            screen.blit(line, (OVERLAY_MARGIN, y))
+            y += line.get_height()
+        return rect
+
+    def save_trace(self, filename):
+        """Write the trace events in Chrome's trace-event JSON format"""
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': self.dropped_events}}, file)
@@ -0,0 +1,254 @@
+"""Module with the dirty-rectangle board renderer"""
+from collections import OrderedDict
+import pygame
+from constants import CELL_SIZE
+from entities import OBSTACLE_COLOR
+from camera import Camera
+
+CHUNK_SIZE = 16
+MAX_CHUNKS = 36
+
+
+def footprint(rect):
+    """Return the set of cells a pixel rectangle overlaps"""
+    cells = set()
+    for col in range(max(rect.left, 0) // CELL_SIZE, (rect.right - 1) // CELL_SIZE + 1):
+        for row in range(max(rect.top, 0) // CELL_SIZE, (rect.bottom - 1) // CELL_SIZE + 1):
+            cells.add((col, row))
+    return cells
+
+
+class DirtyRenderer:
+    """Draw the board by repainting only the cells that changed
+
+    Backgrounds are rendered once per palette choice and cached. The World
+    reports which cells changed occupant since the last frame; those cells are
+    restored from the cached background and redrawn, together with the food
+    and score whose images spill over neighbouring cells.
+    """
+    def __init__(self, game):
+        """Initialize the renderer"""
+        self.game = game
+        self.backgrounds = {}
+        self.state = None
+        self.food_cells = set()
+        self.score_cells = set()
+        self.score_text = None
+
+    def background(self):
+        """Return the cached background for the current palette"""
+        game = self.game
+        key = (game.play_with_obstacles, game.use_default_background, game.current_bg)
+        if key not in self.backgrounds:
+            surface = pygame.Surface(game.screen.get_size()).convert()
+            surface.fill(game.background_color())
+            game.draw_palette(surface)
+            self.backgrounds[key] = surface
+        return self.backgrounds[key]
+
+    def invalidate(self):
+        """Force a full redraw on the next frame"""
+        self.state = None
+
+    def expose(self, rect):
+        """Repaint the board under a screen rectangle on the next frame"""
+        world = self.game.sim.world
+        if world.dirty is not None:
+            world.dirty.update(world.cell_id(cell) for cell in footprint(rect) if world.in_bounds(cell))
+
+    def draw(self):
+        """Draw the frame and return the screen rectangles that changed"""
+        game = self.game
+        world = game.sim.world
+        background = self.background()
+        state = (id(background), game.snake.color, id(world), world.generation, id(game.snake))
+        score_text = f"Score: {game.score}"
+        if world.dirty is None or state != self.state:
+            world.dirty = set()
+            self.state = state
+            game.screen.blit(background, (0, 0))
+            game.draw_elements()
+            self.food_cells = footprint(self.food_rect())
+            self.score_cells = footprint(game.score_rect())
+            self.score_text = score_text
+            return [game.screen.get_rect()]
+
+        dirty = {world.cell_at(cell_id) for cell_id in world.dirty}
+        world.dirty.clear()
+        food_cells = footprint(self.food_rect())
+        if food_cells != self.food_cells:
+            dirty |= food_cells | self.food_cells
+            self.food_cells = food_cells
+        if score_text != self.score_text:
+            score_cells = footprint(game.score_rect())
+            dirty |= score_cells | self.score_cells
+            self.score_cells = score_cells
+            self.score_text = score_text
+        # a food or score image that is redrawn repaints every cell under it,
+        # which can reach the other image, so grow the set until it stops changing
+        overlays = (food_cells, self.score_cells)
+        grown = True
+        while grown:
+            grown = False
+            for cells in overlays:
+                if dirty & cells and not cells <= dirty:
+                    dirty |= cells
+                    grown = True
+        dirty = {cell for cell in dirty if world.in_bounds(cell)}
+        if not dirty:
+            return []
+
+        sprites = game.sprites
+        cell_rects = sprites.cell_rects(world.stride)
+        ids = [world.cell_id(cell) for cell in dirty]
+        rects = [cell_rects[cell_id] for cell_id in ids]
+        game.screen.blits([(background, rect, rect) for rect in rects], False)
+        snakes, obstacles = world.snakes, world.obstacles
+        sprites.draw_cells(game.screen, sprites.color_tile(game.snake.color),
+                           [cell_id for cell_id in ids if snakes[cell_id]], world.stride)
+        if dirty & food_cells:
+            game.draw_food()
+        sprites.draw_cells(game.screen, sprites.color_tile(OBSTACLE_COLOR),
+                           [cell_id for cell_id in ids if obstacles[cell_id]], world.stride)
+        if dirty & self.score_cells:
+            game.score_draw()
+        return rects
+
+    def food_rect(self):
+        """Screen area covered by the food image"""
+        food = self.game.food
+        image = self.game.food_image()
+        width, height = image.get_size() if image is not None else (CELL_SIZE, CELL_SIZE)
+        return pygame.Rect(food.cell[0] * CELL_SIZE, food.cell[1] * CELL_SIZE, width, height)
+
+
+class ViewportRenderer:
+    """Draw the part of a large board that the camera sees
+
+    The palette and obstacles are rendered into surfaces of CHUNK_SIZE cells
+    square that are kept in a small LRU cache; a chunk is rendered again only
+    when the obstacle cells it covers change. Snake and food cells are found
+    by scanning the visible rows of the World's occupancy layers, so the cost
+    of a frame depends on the window size and not on the size of the board.
+    """
+    def __init__(self, game):
+        """Initialize the renderer"""
+        self.game = game
+        width, height = game.screen.get_size()
+        self.camera = Camera(min(width, height) // CELL_SIZE, game.sim.cell_number)
+        self.chunks = OrderedDict()
+        self.palette = None
+        self.palette_surface = None
+
+    def invalidate(self):
+        """Drop cached chunks so they are rendered again"""
+        self.chunks.clear()
+        self.palette_surface = None
+
+    def expose(self, rect):
+        """Nothing to do, every frame repaints the whole window"""
+
+    def obstacle_rows(self, x_start, x_stop, y_start, y_stop):
+        """Obstacle layer of a cell range, one bytes row per board row"""
+        world = self.game.sim.world
+        rows = []
+        for y in range(y_start, y_stop):
+            start = world.cell_id((x_start, y))
+            rows.append(bytes(world.obstacles[start:start + x_stop - x_start]))
+        return rows
+
+    def chunk(self, chunk_x, chunk_y):
+        """Return the surface of one chunk, rendering it if needed"""
+        game = self.game
+        cell_number = game.sim.cell_number
+        x_start, y_start = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        x_stop, y_stop = min(x_start + CHUNK_SIZE, cell_number), min(y_start + CHUNK_SIZE, cell_number)
+        rows = self.obstacle_rows(x_start, x_stop, y_start, y_stop)
+        key = (chunk_x, chunk_y)
+        cached = self.chunks.get(key)
+        if cached is not None and cached[0] == rows:
+            self.chunks.move_to_end(key)
+            return cached[1]
+
+        surface = pygame.Surface(((x_stop - x_start) * CELL_SIZE, (y_stop - y_start) * CELL_SIZE)).convert()
+        if game.use_default_background:
+            surface.blit(self.palette_chunk(), (0, 0))
+        else:
+            tile_width, tile_height = game.bg_image.get_size()
+            left, top = x_start * CELL_SIZE, y_start * CELL_SIZE
+            for tile_x in range(left - left % tile_width, left + surface.get_width(), tile_width):
+                for tile_y in range(top - top % tile_height, top + surface.get_height(), tile_height):
+                    surface.blit(game.bg_image, (tile_x - left, tile_y - top))
+        game.sprites.draw_at(surface, game.sprites.color_tile(OBSTACLE_COLOR),
+                             [(x * CELL_SIZE, y * CELL_SIZE) for y, row in enumerate(rows)
+                              for x, count in enumerate(row) if count])
+        self.chunks[key] = (rows, surface)
+        if len(self.chunks) > MAX_CHUNKS:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def palette_chunk(self):
+        """Checkerboard of a full chunk, the same for every chunk since CHUNK_SIZE is even"""
+        if self.palette_surface is None:
+            game = self.game
+            surface = pygame.Surface((CHUNK_SIZE * CELL_SIZE, CHUNK_SIZE * CELL_SIZE)).convert()
+            surface.fill(game.background_color())
+            grass_color = (165, 42, 42) if game.play_with_obstacles else (160, 210, 60)
+            for y in range(CHUNK_SIZE):
+                for x in range(y % 2, CHUNK_SIZE, 2):
+                    pygame.draw.rect(surface, grass_color, (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+            self.palette_surface = surface
+        return self.palette_surface
+
+    def draw(self):
+        """Draw the visible part of the board and return the changed screen rectangle"""
+        game = self.game
+        world = game.sim.world
+        screen = game.screen
+        palette = (game.play_with_obstacles, game.use_default_background, game.current_bg)
+        if palette != self.palette:
+            self.palette = palette
+            self.invalidate()
+        camera = self.camera
+        camera.follow(game.snake.head())
+        x_start, x_stop, y_start, y_stop = camera.visible()
+        left, top = camera.x * CELL_SIZE, camera.y * CELL_SIZE
+        if min(x_stop - x_start, y_stop - y_start) < camera.view_cells:
+            screen.fill(game.background_color())
+
+        for chunk_y in range(y_start // CHUNK_SIZE, (y_stop - 1) // CHUNK_SIZE + 1):
+            for chunk_x in range(x_start // CHUNK_SIZE, (x_stop - 1) // CHUNK_SIZE + 1):
+                position = (chunk_x * CHUNK_SIZE * CELL_SIZE - left, chunk_y * CHUNK_SIZE * CELL_SIZE - top)
+                screen.blit(self.chunk(chunk_x, chunk_y), position)
+
+        width = x_stop - x_start
+        covered = []
+        for y in range(y_start, y_stop):
+            start = world.cell_id((x_start, y))
+            snakes = world.snakes[start:start + width]
+            if snakes.count(0) != width:
+                covered.extend((x + x_start, y) for x, count in enumerate(snakes) if count)
+        sprites = game.sprites
+        sprites.draw_at(screen, sprites.color_tile(game.snake.color),
+                        [(x * CELL_SIZE - left, y * CELL_SIZE - top) for x, y in covered])
+        # food images are larger than a cell, so food just above or left of the view may show
+        food_cells = []
+        food_x = max(x_start - 1, 0)
+        for y in range(max(y_start - 1, 0), y_stop):
+            start = world.cell_id((food_x, y))
+            food = world.food[start:start + x_stop - food_x]
+            if food.count(0) != len(food):
+                food_cells.extend((x + food_x, y) for x, count in enumerate(food) if count)
+        image = game.food_image()
+        if image is not None and food_cells:
+            game.draw_food([(x * CELL_SIZE - left, y * CELL_SIZE - top) for x, y in food_cells])
+            for x, y in food_cells:
+                area = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, *image.get_size())
+                covered.extend(cell for cell in footprint(area)
+                               if x_start <= cell[0] < x_stop and y_start <= cell[1] < y_stop)
+        obstacles = world.obstacles
+        sprites.draw_at(screen, sprites.color_tile(OBSTACLE_COLOR),
+                        [(x * CELL_SIZE - left, y * CELL_SIZE - top) for x, y in covered
+                         if obstacles[world.cell_id((x, y))]])
+        game.score_draw()
+        return [screen.get_rect()]
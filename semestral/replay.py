@@ -0,0 +1,165 @@
+"""Module with compact game replays and headless verification"""
+import struct
+import sys
+from constants import CELL_NUMBER
+from simulation import Simulation, DIRECTIONS, OBSTACLE_COUNT
+from levels import generate
+import snapshot
+
+MAGIC = b'SNKR'
+VERSION = 3
+HEADER = struct.Struct('<4sBBHIQIIIdQ')
+HEADERS = {1: struct.Struct('<4sBBHHQIII'), 2: struct.Struct('<4sBBHHQIIIdQ'), VERSION: HEADER}
+FLAG_OBSTACLES = 1
+FLAG_LEVEL = 2
+FLAG_SNAPSHOT = 4
+
+
+def encode_varint(value, out):
+    """Append an unsigned integer as LEB128 bytes"""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, offset):
+    """Read a LEB128 integer, return it and the next offset"""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class Replay:
+    """Seed, settings and direction changes of one round
+
+    Turns are stored as (tick, direction index) where ``tick`` is the
+    simulation tick the turn applies to. On disk every turn takes one or two
+    bytes: the tick delta and direction are packed into a single varint.
+    A round played on a generated level keeps the level's density and seed,
+    from which the layout is generated again. A round resumed from a saved
+    game carries the snapshot it started from after the turns.
+    """
+    def __init__(self, seed, cell_number=CELL_NUMBER, play_with_obstacles=True, obstacle_count=OBSTACLE_COUNT,
+                 level=None, start=None):
+        """Initialize an empty replay
+
+        ``level`` is the (density, seed) of a generated level and ``start``
+        the snapshot of a resumed round.
+        """
+        self.seed = seed
+        self.cell_number = cell_number
+        self.play_with_obstacles = play_with_obstacles
+        self.obstacle_count = obstacle_count
+        self.level = level
+        self.start = start
+        self.turns = []
+        self.score = 0
+        self.ticks = 0
+
+    @classmethod
+    def for_simulation(cls, sim, resumed=False):
+        """Start recording the current round of a simulation, from its current state if ``resumed``"""
+        level = (sim.level.density, sim.level.seed) if sim.level is not None and not resumed else None
+        return cls(sim.seed, sim.cell_number, sim.play_with_obstacles, sim.obstacle_count, level,
+                   snapshot.dump(sim) if resumed else None)
+
+    def record(self, tick, direction):
+        """Remember a turn applied before ``tick``"""
+        self.turns.append((tick, DIRECTIONS.index(tuple(direction))))
+
+    def finish(self, sim):
+        """Store the final score and length of the round"""
+        self.score = sim.score
+        self.ticks = sim.ticks
+
+    def to_bytes(self):
+        """Serialize the replay"""
+        flags = ((FLAG_OBSTACLES if self.play_with_obstacles else 0) | (FLAG_LEVEL if self.level is not None else 0)
+                 | (FLAG_SNAPSHOT if self.start is not None else 0))
+        density, level_seed = self.level if self.level is not None else (0.0, 0)
+        out = bytearray(HEADER.pack(MAGIC, VERSION, flags, self.cell_number, self.obstacle_count,
+                                    self.seed, self.score, self.ticks, len(self.turns), density, level_seed))
+        previous = 0
+        for tick, direction in self.turns:
+            encode_varint((tick - previous) << 2 | direction, out)
+            previous = tick
+        if self.start is not None:
+            out += self.start
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserialize a replay"""
+        header = HEADERS.get(data[4])
+        if data[:4] != MAGIC or header is None:
+            raise ValueError("not a replay file")
+        _, _, flags, cell_number, obstacle_count, seed, score, ticks, count, *level = header.unpack_from(data)
+        replay = cls(seed, cell_number, bool(flags & FLAG_OBSTACLES), obstacle_count,
+                     tuple(level) if flags & FLAG_LEVEL else None)
+        replay.score = score
+        replay.ticks = ticks
+        offset = header.size
+        tick = 0
+        for _ in range(count):
+            value, offset = decode_varint(data, offset)
+            tick += value >> 2
+            replay.turns.append((tick, value & 3))
+        if flags & FLAG_SNAPSHOT:
+            replay.start = bytes(data[offset:])
+        return replay
+
+    def save(self, filename):
+        """Write the replay to a file"""
+        with open(filename, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename):
+        """Read a replay from a file"""
+        with open(filename, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+def play(replay):
+    """Re-simulate a replay headless and return the finished simulation"""
+    level = generate(replay.cell_number, *replay.level) if replay.level is not None else None
+    sim = Simulation(replay.cell_number, replay.play_with_obstacles, replay.obstacle_count, seed=replay.seed,
+                     level=level)
+    if replay.start is not None:
+        snapshot.restore(sim, replay.start)
+    turns = iter(replay.turns)
+    turn = next(turns, None)
+    while not sim.game_over and sim.ticks < replay.ticks:
+        action = None
+        if turn is not None and turn[0] == sim.ticks + 1:
+            action = DIRECTIONS[turn[1]]
+            turn = next(turns, None)
+        sim.step(action)
+    return sim
+
+
+def verify(replay):
+    """Check that a replay reproduces its claimed score and length"""
+    sim = play(replay)
+    return sim.score == replay.score and sim.ticks == replay.ticks
+
+
+def main(filenames):
+    """Verify replay files given on the command line"""
+    failed = 0
+    for filename in filenames:
+        replay = Replay.load(filename)
+        ok = verify(replay)
+        failed += not ok
+        print(f"{filename}: score {replay.score} {'ok' if ok else 'MISMATCH'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
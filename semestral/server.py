@@ -0,0 +1,181 @@
+"""Authoritative multiplayer server hosting many arenas in one process
+
+Run ``python server.py --arenas 1000`` and connect with ``python client.py``.
+Clients talk TCP: the server sends length-prefixed frames (a keyframe with
+the whole board on joining, then one delta per tick with the cells that
+changed) and a client sends one byte per turn, the index of the direction
+in ``simulation.DIRECTIONS``.
+"""
+import argparse
+import asyncio
+import logging
+import struct
+import sys
+import time
+from collections import deque
+from arena import Arena, MAX_PLAYERS
+from constants import CELL_NUMBER
+from timing import percentile, SAMPLE_WINDOW
+
+TICK_MS = 100
+PORT = 5555
+MAX_BUFFER = 64 * 1024
+MAX_CATCH_UP_TICKS = 5
+STATS_EVERY = 100
+LENGTH = struct.Struct('<I')
+WELCOME = struct.Struct('<IB')
+
+logger = logging.getLogger(__name__)
+
+
+class Connection:
+    """One connected player"""
+    def __init__(self, writer, arena_index, slot):
+        """Initialize the connection"""
+        self.writer = writer
+        self.arena_index = arena_index
+        self.slot = slot
+        self.stale = False
+
+    def send(self, payload):
+        """Queue a frame without waiting for the socket"""
+        self.writer.write(LENGTH.pack(len(payload)) + payload)
+
+
+class ArenaServer:
+    """Step every arena with players on one shared tick and stream their deltas
+
+    Arenas without players are not stepped. Each arena's delta is encoded
+    once per tick and written to all of its players. A player whose socket
+    falls behind by more than MAX_BUFFER bytes skips deltas and gets a
+    keyframe once it has caught up, so a slow client never delays the tick.
+    """
+    def __init__(self, arenas=1, cell_number=CELL_NUMBER, max_players=MAX_PLAYERS, tick_ms=TICK_MS,
+                 seed=None, window=SAMPLE_WINDOW):
+        """Initialize the arenas"""
+        self.arenas = [Arena(cell_number, max_players, seed=None if seed is None else seed + index)
+                       for index in range(arenas)]
+        self.connections = [[] for _ in range(arenas)]
+        self.tick_ms = tick_ms
+        self.ticks = 0
+        self.late_ticks = 0
+        self.tick_times = deque(maxlen=window)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=PORT):
+        """Listen for players, return the asyncio server"""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    def join(self, writer):
+        """Seat a new player in the first arena with a free slot"""
+        for arena_index, arena in enumerate(self.arenas):
+            slot = arena.join()
+            if slot is not None:
+                connection = Connection(writer, arena_index, slot)
+                self.connections[arena_index].append(connection)
+                return connection
+        return None
+
+    async def handle(self, reader, writer):
+        """Serve one player until it disconnects"""
+        connection = self.join(writer)
+        if connection is None:
+            writer.close()
+            return
+        arena = self.arenas[connection.arena_index]
+        connection.send(WELCOME.pack(connection.arena_index, connection.slot))
+        connection.send(arena.keyframe())
+        try:
+            while True:
+                data = await reader.read(64)
+                if not data:
+                    break
+                for direction_index in data:
+                    arena.turn(connection.slot, direction_index)
+        except ConnectionError:
+            pass
+        finally:
+            arena.leave(connection.slot)
+            self.connections[connection.arena_index].remove(connection)
+            writer.close()
+
+    def tick(self):
+        """Step the arenas with players and send their deltas"""
+        start = time.perf_counter()
+        self.ticks += 1
+        for arena, connections in zip(self.arenas, self.connections):
+            if not connections:
+                continue
+            arena.step()
+            delta = arena.delta()
+            for connection in connections:
+                if connection.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                    connection.stale = True
+                elif connection.stale:
+                    connection.stale = False
+                    connection.send(arena.keyframe())
+                else:
+                    connection.send(delta)
+        self.tick_times.append((time.perf_counter() - start) * 1000)
+
+    async def run(self, ticks=None):
+        """Tick at a fixed rate, forever or for a number of ticks"""
+        loop = asyncio.get_running_loop()
+        interval = self.tick_ms / 1000
+        next_tick = loop.time()
+        count = 0
+        while ticks is None or count < ticks:
+            self.tick()
+            count += 1
+            if self.ticks % STATS_EVERY == 0:
+                logger.info("tick stats: %s", self.summary())
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < -MAX_CATCH_UP_TICKS * interval:
+                self.late_ticks += 1
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def summary(self):
+        """Return tick statistics as a dictionary"""
+        return {
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'active_arenas': sum(1 for connections in self.connections if connections),
+            'players': sum(len(connections) for connections in self.connections),
+            'tick_ms_p50': percentile(self.tick_times, 0.5),
+            'tick_ms_p95': percentile(self.tick_times, 0.95),
+            'tick_ms_max': max(self.tick_times, default=0.0),
+        }
+
+
+async def serve(args):
+    """Run the server until it is interrupted"""
+    server = ArenaServer(args.arenas, args.cells, args.players, args.tick, args.seed)
+    await server.start(args.host, args.port)
+    logger.info("serving %d arenas on %s:%d", args.arenas, args.host, args.port)
+    await server.run()
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='TCP port')
+    parser.add_argument('--arenas', type=int, default=100, help='number of arenas')
+    parser.add_argument('--players', type=int, default=MAX_PLAYERS, help='snakes per arena')
+    parser.add_argument('--cells', type=int, default=CELL_NUMBER, help='board size of every arena')
+    parser.add_argument('--tick', type=int, default=TICK_MS, help='milliseconds per tick')
+    parser.add_argument('--seed', type=int, help='seed of the first arena')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(name)s: %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
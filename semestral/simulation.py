@@ -0,0 +1,520 @@
+"""Headless game rules without display, audio or wall clock"""
+import random
+from constants import CELL_NUMBER
+from grid import World
+
+UP = (0, -1)
+DOWN = (0, 1)
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+
+BONUS_CHANCE = 20
+BONUS_POINTS = 5
+BONUS_DURATION = 5000
+TIME_LIMIT_WITHOUT_FOOD = 10000
+OBSTACLE_COUNT = 10
+SPEED_CURVE = (100, 2, 50)
+
+
+def tick_interval(score, curve=SPEED_CURVE):
+    """Return tick length in milliseconds for the given score
+
+    ``curve`` is the starting tick length, how much each point shortens it
+    and the shortest tick.
+    """
+    start, step, shortest = curve
+    return max(start - score * step, shortest)
+
+
+class SnakeBody:
+    """Snake cells and heading
+
+    Segments live in a ring buffer of integer cell ids on a board padded with
+    one cell of wall on every side, so a head that just left the board is still
+    representable. An occupancy count per cell makes moving, growing and the
+    self collision check constant time regardless of the snake length, and
+    the move on which the head entered each cell tells how soon it is left
+    again (see ``moves_until_free``). While attached to a World, cells the
+    snake enters or leaves are kept in sync.
+    """
+    def __init__(self, cell_number=CELL_NUMBER, cells=None):
+        """Initialize the snake body"""
+        self.cell_number = cell_number
+        self.stride = cell_number + 2
+        self.occupancy = bytearray(self.stride * self.stride)
+        self.world = None
+        self.length = 0
+        if cells is None:
+            head_x, head_y = min(7, cell_number - 1), min(10, cell_number // 2)
+            cells = [(head_x - offset, head_y) for offset in range(min(3, head_x + 1))]
+        self.cells = cells
+        self.direction = RIGHT
+        self.next_direction = self.direction
+        self.grow = False
+
+    def cell_id(self, cell):
+        """Padded board index of an (x, y) cell"""
+        return (cell[1] + 1) * self.stride + cell[0] + 1
+
+    def cell_at(self, cell_id):
+        """(x, y) cell of a padded board index"""
+        y, x = divmod(cell_id, self.stride)
+        return x - 1, y - 1
+
+    @property
+    def cells(self):
+        """Snake cells from head to tail"""
+        return [self.cell_at(cell_id) for cell_id in self.iter_ids()]
+
+    @cells.setter
+    def cells(self, cells):
+        if self.world is not None:
+            for cell_id in self.iter_ids():
+                self.world.discard(self.world.snakes, cell_id)
+        self.occupancy = bytearray(len(self.occupancy))
+        self.ring = [0] * max(16, 2 * len(cells))
+        self.length = len(cells)
+        self.head_index = self.length - 1
+        self.moves = self.length
+        self.entered = {}
+        for index, cell in enumerate(reversed(cells)):
+            if not -1 <= cell[0] <= self.cell_number or not -1 <= cell[1] <= self.cell_number:
+                raise ValueError(f"cell {cell} is outside the board")
+            cell_id = self.cell_id(cell)
+            self.ring[index] = cell_id
+            self.occupancy[cell_id] += 1
+            self.entered[cell_id] = index + 1
+            if self.world is not None:
+                self.world.add(self.world.snakes, cell_id)
+
+    def __len__(self):
+        """Number of segments"""
+        return self.length
+
+    def iter_ids(self):
+        """Yield cell ids from head to tail"""
+        ring = self.ring
+        capacity = len(ring)
+        for offset in range(self.length):
+            yield ring[(self.head_index - offset) % capacity]
+
+    def head(self):
+        """Return the head cell"""
+        return self.cell_at(self.ring[self.head_index])
+
+    def tail(self):
+        """Return the tail cell"""
+        return self.cell_at(self.ring[(self.head_index - self.length + 1) % len(self.ring)])
+
+    def occupies(self, cell):
+        """Check if any segment covers the cell"""
+        if not 0 <= cell[0] < self.cell_number or not 0 <= cell[1] < self.cell_number:
+            return False
+        return self.occupancy[self.cell_id(cell)] > 0
+
+    def turn(self, direction):
+        """Queue a new heading unless it reverses the snake"""
+        if direction[0] == -self.direction[0] and direction[1] == -self.direction[1]:
+            return False
+        self.next_direction = direction
+        return True
+
+    def move(self):
+        """Move one cell in the current direction"""
+        ring = self.ring
+        capacity = len(ring)
+        new_head = ring[self.head_index] + self.direction[0] + self.direction[1] * self.stride
+        if self.grow:
+            self.grow = False
+            if self.length == capacity:
+                tail_index = (self.head_index + 1) % capacity
+                ring[:] = ring[tail_index:] + ring[:tail_index] + [0] * capacity
+                self.head_index = capacity - 1
+                capacity *= 2
+            self.length += 1
+        else:
+            tail = ring[(self.head_index - self.length + 1) % capacity]
+            self.occupancy[tail] -= 1
+            if not self.occupancy[tail]:
+                del self.entered[tail]
+            if self.world is not None:
+                self.world.discard(self.world.snakes, tail)
+        self.head_index = (self.head_index + 1) % capacity
+        ring[self.head_index] = new_head
+        self.occupancy[new_head] += 1
+        self.moves += 1
+        self.entered[new_head] = self.moves
+        if self.world is not None:
+            self.world.add(self.world.snakes, new_head)
+
+    def moves_until_free(self, cell_id):
+        """Number of moves until the body leaves a cell, 0 for cells it does not cover"""
+        if not self.occupancy[cell_id]:
+            return 0
+        return self.length - self.moves + self.entered[cell_id] + self.grow
+
+    def hits_itself(self):
+        """Check if the head overlaps the rest of the body"""
+        return self.occupancy[self.ring[self.head_index]] > 1
+
+    def attach(self, world):
+        """Register the body in a world"""
+        self.world = world
+        for cell_id in self.iter_ids():
+            world.add(world.snakes, cell_id)
+
+    def detach(self):
+        """Remove the body from its world"""
+        if self.world is not None:
+            for cell_id in self.iter_ids():
+                self.world.discard(self.world.snakes, cell_id)
+            self.world = None
+
+
+class FoodItem:
+    """Food lying on a cell"""
+    def __init__(self, cell=(0, 0), points=1, duration=None, spawn_time=0):
+        """Initialize the food"""
+        self.world = None
+        self._cell = cell
+        self.points = points
+        self.duration = duration
+        self.spawn_time = spawn_time
+
+    @property
+    def cell(self):
+        """Cell the food lies on"""
+        return self._cell
+
+    @cell.setter
+    def cell(self, cell):
+        if self.world is not None:
+            self.world.discard_cells(self.world.food, [self._cell])
+            self.world.add_cells(self.world.food, [cell])
+        self._cell = cell
+
+    def attach(self, world):
+        """Register the food in a world"""
+        self.world = world
+        world.add_cells(world.food, [self._cell])
+
+    def detach(self):
+        """Remove the food from its world"""
+        if self.world is not None:
+            self.world.discard_cells(self.world.food, [self._cell])
+            self.world = None
+
+    def expired(self, now):
+        """Check if a timed food has run out"""
+        return self.duration is not None and now - self.spawn_time > self.duration
+
+
+class ObstacleCells:
+    """Cells blocked by one obstacle"""
+    def __init__(self):
+        """Initialize the obstacle"""
+        self.world = None
+        self._cells = []
+
+    @property
+    def cells(self):
+        """Cells covered by the obstacle"""
+        return self._cells
+
+    @cells.setter
+    def cells(self, cells):
+        if self.world is not None:
+            self.world.discard_cells(self.world.obstacles, self._cells)
+            self.world.add_cells(self.world.obstacles, cells)
+            self.world.obstacle_version += 1
+        self._cells = cells
+
+    def attach(self, world):
+        """Register the obstacle in a world"""
+        self.world = world
+        world.add_cells(world.obstacles, self._cells)
+        world.obstacle_version += 1
+
+    def detach(self):
+        """Remove the obstacle from its world"""
+        if self.world is not None:
+            self.world.discard_cells(self.world.obstacles, self._cells)
+            self.world.obstacle_version += 1
+            self.world = None
+
+
+class Simulation:
+    """Game rules stepped by an explicit simulated clock
+
+    The snake, food and obstacles are registered in one World, which answers
+    what occupies a cell and which cells are free in constant time.
+    """
+    def __init__(self, cell_number=CELL_NUMBER, play_with_obstacles=True, obstacle_count=OBSTACLE_COUNT,
+                 snake_factory=SnakeBody, food_factory=None, obstacle_factory=ObstacleCells, seed=None, level=None,
+                 bonus_chance=BONUS_CHANCE, speed_curve=SPEED_CURVE, start=True):
+        """Initialize the simulation, with the obstacles of a generated ``level`` if given
+
+        With ``start`` false the board is left empty apart from the snake and
+        unplaced food until the first ``reset``.
+        """
+        self.cell_number = cell_number
+        self.level = level
+        self.bonus_chance = bonus_chance
+        self.speed_curve = speed_curve
+        self.play_with_obstacles = play_with_obstacles
+        self.obstacle_count = obstacle_count
+        self.snake_factory = snake_factory
+        self.food_factory = food_factory or FoodItem
+        self.obstacle_factory = obstacle_factory
+        self.rng = random.Random()
+        self.seed = None
+        self.world = World(cell_number)
+        self._snake = None
+        self._food = None
+        self._obstacles = []
+        if start:
+            self.reset(seed)
+        else:
+            self.clear(seed)
+
+    def reset(self, seed=None):
+        """Start a new round, reproducible from ``seed`` (a fresh random one by default)"""
+        self.clear(seed)
+        if self.play_with_obstacles:
+            if self.level is not None:
+                self.load_level(self.level)
+            else:
+                self.generate_obstacles()
+        self.spawn_food()
+
+    def clear(self, seed=None):
+        """Empty the board for a round, with a new snake and food not yet placed"""
+        self.seed = seed if seed is not None else random.getrandbits(63)
+        self.rng.seed(self.seed)
+        self.ticks = 0
+        self.world.clear()
+        self._snake = self._food = None
+        self._obstacles = []
+        self.snake = self.snake_factory(self.cell_number)
+        self.food = self.food_factory()
+        self.score = 0
+        self.time = 0
+        self.last_eaten_time = 0
+        self.game_over = False
+        self.death_cause = None
+
+    @property
+    def snake(self):
+        """Snake of the current round"""
+        return self._snake
+
+    @snake.setter
+    def snake(self, snake):
+        if self._snake is not None:
+            self._snake.detach()
+        self._snake = snake
+        snake.attach(self.world)
+
+    @property
+    def food(self):
+        """Food on the board"""
+        return self._food
+
+    @food.setter
+    def food(self, food):
+        if self._food is not None:
+            self._food.detach()
+        self._food = food
+        food.attach(self.world)
+
+    @property
+    def obstacles(self):
+        """Obstacles on the board"""
+        return self._obstacles
+
+    @obstacles.setter
+    def obstacles(self, obstacles):
+        for obstacle in self._obstacles:
+            obstacle.detach()
+        self._obstacles = obstacles
+        for obstacle in obstacles:
+            obstacle.attach(self.world)
+
+    @property
+    def free_cells(self):
+        """Index of cells with no occupant"""
+        return self.world.free_cells
+
+    def cell_id(self, cell):
+        """Padded board index of an (x, y) cell"""
+        return self.world.cell_id(cell)
+
+    def cell_at(self, cell_id):
+        """(x, y) cell of a padded board index"""
+        return self.world.cell_at(cell_id)
+
+    @property
+    def interval(self):
+        """Milliseconds until the next tick"""
+        return tick_interval(self.score, self.speed_curve)
+
+    def in_bounds(self, cell):
+        """Check if a cell lies on the board"""
+        return self.world.in_bounds(cell)
+
+    def is_blocked(self, cell):
+        """Check if a cell is taken by the snake or an obstacle"""
+        if not self.in_bounds(cell):
+            return True
+        cell_id = self.world.cell_id(cell)
+        return bool(self.world.snakes[cell_id] or self.world.obstacles[cell_id])
+
+    def spawn_food(self):
+        """Place new food on a free cell, sometimes a timed bonus
+
+        A board without free cells ends the round as a win.
+        """
+        bonus = self.rng.randint(0, self.bonus_chance) == 0
+        self._food.detach()
+        cell_id = self.free_cells.sample(self.rng)
+        if cell_id is None:
+            self._food.attach(self.world)
+            self.game_over = True
+            self.death_cause = 'win'
+            return
+        if bonus:
+            self.food = self.food_factory(self.cell_at(cell_id), BONUS_POINTS, BONUS_DURATION, self.time)
+        else:
+            self.food = self.food_factory(self.cell_at(cell_id), 1, None, self.time)
+        self.last_eaten_time = self.time
+
+    def is_valid_obstacle_cell(self, cell, obstacle=None):
+        """Check if an obstacle may cover the cell"""
+        if not self.in_bounds(cell):
+            return False
+        cell_id = self.world.cell_id(cell)
+        if self.world.snakes[cell_id] or self.world.food[cell_id]:
+            return False
+        start_x, start_y = self.snake.head()
+        if (cell[0] - start_x) ** 2 + (cell[1] - start_y) ** 2 <= 9:
+            return False
+        own = obstacle is not None and obstacle.world is self.world and cell in obstacle.cells
+        return self.world.obstacles[cell_id] <= own
+
+    def place_obstacle(self, obstacle, attempts=100):
+        """Fill the obstacle with a random 2 or 3 cell bar, return False if no room was found"""
+        obstacle.cells = []
+        for _ in range(attempts):
+            start = self.free_cells.sample(self.rng)
+            if start is None:
+                return False
+            cells = [self.cell_at(start)]
+            if not self.is_valid_obstacle_cell(cells[0], obstacle):
+                continue
+            length = self.rng.choice([2, 3])
+            steps = [RIGHT, DOWN]
+            self.rng.shuffle(steps)
+            for step in steps:
+                cells = cells[:1]
+                while len(cells) < length:
+                    new_cell = (cells[-1][0] + step[0], cells[-1][1] + step[1])
+                    if not self.is_valid_obstacle_cell(new_cell, obstacle):
+                        break
+                    cells.append(new_cell)
+                if len(cells) == length:
+                    obstacle.cells = cells
+                    return True
+        return False
+
+    def generate_obstacles(self):
+        """Replace the obstacles with a fresh random set"""
+        self.obstacles = [self.obstacle_factory() for _ in range(self.obstacle_count)]
+        for obstacle in self.obstacles:
+            self.place_obstacle(obstacle)
+
+    def load_level(self, level):
+        """Replace the obstacles with the layout of a generated level"""
+        obstacles = []
+        for cells in level.obstacles():
+            obstacle = self.obstacle_factory()
+            obstacle.cells = cells
+            obstacles.append(obstacle)
+        self.obstacles = obstacles
+
+    def check_collision(self):
+        """Eat food under the head, return the eaten food or None"""
+        if self._food.cell != self.snake.head():
+            return None
+        eaten = self._food
+        self.snake.grow = True
+        self.score += eaten.points
+        self.spawn_food()
+        return eaten
+
+    def check_fail(self):
+        """Detect a crash, return its cause or None"""
+        head = self.snake.head()
+        cause = None
+        if not self.in_bounds(head):
+            cause = 'wall'
+        elif self.snake.hits_itself():
+            cause = 'self'
+        elif self.play_with_obstacles and self.world.obstacles[self.world.cell_id(head)]:
+            cause = 'obstacle'
+        if cause is not None:
+            self.game_over = True
+            self.death_cause = cause
+        return cause
+
+    def check_starvation(self):
+        """End the round if the snake went too long without food"""
+        if self.play_with_obstacles and self.time - self.last_eaten_time > TIME_LIMIT_WITHOUT_FOOD:
+            self.game_over = True
+            self.death_cause = 'starvation'
+            return True
+        return False
+
+    def check_expiry(self):
+        """Replace a timed food that ran out, return True if it did"""
+        if self._food.expired(self.time):
+            self.spawn_food()
+            return True
+        return False
+
+    def step(self, action=None):
+        """Advance one tick and return the events that happened"""
+        events = StepEvents()
+        if self.game_over:
+            return events
+        if action is not None:
+            self.snake.turn(action)
+        self.ticks += 1
+        self.time += self.interval
+        self.snake.direction = self.snake.next_direction
+        self.snake.move()
+        events.eaten = self.check_collision()
+        if not self.game_over:
+            self.check_fail()
+        if not self.game_over:
+            self.check_starvation()
+        events.expired = self.check_expiry()
+        events.death_cause = self.death_cause
+        return events
+
+    def run(self, policy=None, max_ticks=None):
+        """Step until the round ends, return the number of ticks"""
+        ticks = 0
+        while not self.game_over and (max_ticks is None or ticks < max_ticks):
+            self.step(policy(self) if policy is not None else None)
+            ticks += 1
+        return ticks
+
+
+class StepEvents:
+    """What happened during one tick"""
+    def __init__(self):
+        """Initialize empty events"""
+        self.eaten = None
+        self.death_cause = None
+        self.expired = False
@@ -0,0 +1,189 @@
+"""Module with compact binary snapshots of a Simulation
+
+A snapshot holds everything needed to continue a round exactly where it
+was: a fixed header with the score, clocks and food, the state of the
+random generator, the snake as its head cell and two bits per segment, the
+order of the free cell index and the cells of every obstacle. Spawns sample
+the free cell index by position, so its order is part of what makes the
+round reproducible. Early in a round it is mostly runs of consecutive ids
+and is stored as (first id, length) pairs; once moves have shuffled it,
+the ids are stored one by one, whichever is smaller. Ids take two bytes on
+boards up to 254×254. A 30×30 round takes 3 to 5 kB, half of it the random
+generator. Restoring rebuilds the World from these, so ``restore``
+into a scratch Simulation is the cheap way to roll a position out many
+times.
+"""
+import struct
+from array import array
+from simulation import Simulation, DIRECTIONS
+
+MAGIC = b'SNKS'
+VERSION = 3
+HEADER = struct.Struct('<4sBBHIQIIqqqHIBBBIIIII')
+RNG_WORDS = 625
+FLAG_OBSTACLES = 1
+FLAG_GAME_OVER = 2
+FLAG_GROW = 4
+FLAG_TIMED_FOOD = 8
+FLAG_FREE_RUNS = 16
+CAUSES = (None, 'wall', 'self', 'obstacle', 'starvation', 'win')
+
+
+def id_code(world):
+    """Array type code wide enough for the cell ids of a world"""
+    return 'H' if len(world.board) <= 0x10000 else 'I'
+
+
+def runs(cells, code):
+    """Split ids into runs of consecutive ids, return the (first id, length) pairs flattened"""
+    pairs = array(code)
+    start = previous = None
+    for cell_id in cells:
+        if start is not None and cell_id == previous + 1:
+            previous = cell_id
+            continue
+        if start is not None:
+            pairs.extend((start, previous - start + 1))
+        start = previous = cell_id
+    if start is not None:
+        pairs.extend((start, previous - start + 1))
+    return pairs
+
+
+def dump(sim):
+    """Serialize the current state of a simulation"""
+    world = sim.world
+    snake = sim.snake
+    food = sim.food
+    flags = ((FLAG_OBSTACLES if sim.play_with_obstacles else 0) | (FLAG_GAME_OVER if sim.game_over else 0)
+             | (FLAG_GROW if snake.grow else 0) | (FLAG_TIMED_FOOD if food.duration is not None else 0))
+    ids = list(snake.iter_ids())
+    code = id_code(world)
+    free = runs(world.free_cells.cells, code)
+    if len(free) < len(world.free_cells):
+        flags |= FLAG_FREE_RUNS
+    else:
+        free = array(code, world.free_cells.cells)
+    obstacle_ids = array(code, (world.cell_id(cell) for obstacle in sim.obstacles for cell in obstacle.cells))
+    out = bytearray(HEADER.pack(
+        MAGIC, VERSION, flags, sim.cell_number, sim.obstacle_count, sim.seed, sim.score, sim.ticks,
+        sim.time, sim.last_eaten_time, food.spawn_time, food.points, food.duration or 0,
+        DIRECTIONS.index(tuple(snake.direction)), DIRECTIONS.index(tuple(snake.next_direction)),
+        CAUSES.index(sim.death_cause), world.cell_id(food.cell), ids[0], len(ids), len(free), len(sim.obstacles)))
+    version, words, gauss = sim.rng.getstate()
+    out += array('I', words).tobytes()
+    out += struct.pack('<d', float('nan') if gauss is None else gauss)
+    offsets = {1: 0, -1: 1, world.stride: 2, -world.stride: 3}
+    body = bytearray((len(ids) + 2) // 4)
+    for index in range(1, len(ids)):
+        body[(index - 1) >> 2] |= offsets[ids[index] - ids[index - 1]] << ((index - 1) & 3) * 2
+    out += body
+    out += free.tobytes()
+    out += bytes(len(obstacle.cells) for obstacle in sim.obstacles)
+    out += obstacle_ids.tobytes()
+    return bytes(out)
+
+
+def restore(sim, data):
+    """Replace the state of ``sim`` with a snapshot, keeping its entity factories"""
+    (magic, version, flags, cell_number, obstacle_count, seed, score, ticks, now, last_eaten_time, food_spawn_time,
+     food_points, food_duration, direction, next_direction, cause, food_id, head_id, length,
+     free_words, obstacle_count_stored) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a snapshot")
+    if cell_number != sim.cell_number:
+        raise ValueError(f"snapshot of a {cell_number} cell board, simulation has {sim.cell_number}")
+    offset = HEADER.size
+    words = array('I')
+    words.frombytes(data[offset:offset + RNG_WORDS * 4])
+    offset += RNG_WORDS * 4
+    gauss, = struct.unpack_from('<d', data, offset)
+    offset += 8
+    sim.rng.setstate((3, tuple(words), None if gauss != gauss else gauss))
+
+    world = sim.world
+    stride = world.stride
+    steps = (1, -1, stride, -stride)
+    ids = [head_id]
+    for index in range(1, length):
+        code = data[offset + ((index - 1) >> 2)] >> ((index - 1) & 3) * 2 & 3
+        ids.append(ids[-1] + steps[code])
+    offset += (length + 2) // 4
+    code = id_code(world)
+    words = array(code)
+    words.frombytes(data[offset:offset + free_words * words.itemsize])
+    offset += free_words * words.itemsize
+    position = array('i', [-1]) * len(world.board)
+    if flags & FLAG_FREE_RUNS:
+        free = array('i')
+        for start, count in zip(words[::2], words[1::2]):
+            position[start:start + count] = array('i', range(len(free), len(free) + count))
+            free.extend(range(start, start + count))
+    else:
+        free = array('i', words)
+        for index, cell_id in enumerate(free):
+            position[cell_id] = index
+    sizes = data[offset:offset + obstacle_count_stored]
+    offset += obstacle_count_stored
+    obstacle_ids = array(code)
+    obstacle_ids.frombytes(data[offset:offset + sum(sizes) * obstacle_ids.itemsize])
+
+    world.clear()
+    world.free_cells.load(free, position)
+    sim.snake.detach()
+    sim.food.detach()
+    for obstacle in sim.obstacles:
+        obstacle.detach()
+    sim._obstacles = []
+    snake = sim.snake_factory(cell_number)
+    snake.cells = [world.cell_at(cell_id) for cell_id in ids]
+    snake.direction = DIRECTIONS[direction]
+    snake.next_direction = DIRECTIONS[next_direction]
+    snake.grow = bool(flags & FLAG_GROW)
+    sim._snake = None
+    sim.snake = snake
+    obstacles = []
+    start = 0
+    for size in sizes:
+        obstacle = sim.obstacle_factory()
+        obstacle.cells = [world.cell_at(cell_id) for cell_id in obstacle_ids[start:start + size]]
+        obstacles.append(obstacle)
+        start += size
+    sim.obstacles = obstacles
+    sim._food = None
+    sim.food = sim.food_factory(world.cell_at(food_id), food_points,
+                                food_duration if flags & FLAG_TIMED_FOOD else None, food_spawn_time)
+
+    sim.play_with_obstacles = bool(flags & FLAG_OBSTACLES)
+    sim.level = None
+    sim.obstacle_count = obstacle_count
+    sim.seed = seed
+    sim.score = score
+    sim.ticks = ticks
+    sim.time = now
+    sim.last_eaten_time = last_eaten_time
+    sim.game_over = bool(flags & FLAG_GAME_OVER)
+    sim.death_cause = CAUSES[cause]
+    return sim
+
+
+def clone(sim):
+    """Return an independent headless copy of a simulation"""
+    copy = Simulation(sim.cell_number, play_with_obstacles=False, seed=0)
+    return restore(copy, dump(sim))
+
+
+def save(sim, filename):
+    """Write a snapshot of a simulation to a file"""
+    with open(filename, 'wb') as file:
+        file.write(dump(sim))
+
+
+def load(filename, sim=None):
+    """Read a snapshot into ``sim``, or into a new headless Simulation"""
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if sim is None:
+        cell_number = HEADER.unpack_from(data)[3]
+        sim = Simulation(cell_number, play_with_obstacles=False, seed=0)
+    return restore(sim, data)
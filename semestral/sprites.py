@@ -0,0 +1,115 @@
+"""Module with the tile atlas and batched drawing of board layers"""
+import pygame
+from constants import CELL_SIZE
+
+
+class TileAtlas:
+    """Tiles pre-rendered side by side on one surface
+
+    A tile is added once by key and handed out as a subsurface of the atlas,
+    so every blit of it reads from the same surface. Adding a tile renders
+    the atlas again, which only happens the first time a colour or image is
+    used.
+    """
+    def __init__(self, alpha=False):
+        """Initialize an empty atlas"""
+        self.alpha = alpha
+        self.images = {}
+        self.tiles = {}
+        self.surface = None
+
+    def tile(self, key, render):
+        """Return the tile for ``key``, adding ``render()`` to the atlas if it is new"""
+        tile = self.tiles.get(key)
+        if tile is None:
+            self.images[key] = render()
+            self.build()
+            tile = self.tiles[key]
+        return tile
+
+    def build(self):
+        """Lay out every tile on a new atlas surface"""
+        width = sum(image.get_width() for image in self.images.values())
+        height = max(image.get_height() for image in self.images.values())
+        flags = pygame.SRCALPHA if self.alpha else 0
+        surface = pygame.Surface((width, height), flags)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha() if self.alpha else surface.convert()
+        if self.alpha:
+            surface.fill((0, 0, 0, 0))
+        self.tiles = {}
+        x = 0
+        for key, image in self.images.items():
+            # with alpha, copy the pixels as they are instead of blending them onto the empty atlas
+            surface.blit(image, (x, 0), special_flags=pygame.BLEND_RGBA_MAX if self.alpha else 0)
+            self.tiles[key] = surface.subsurface((x, 0, image.get_width(), image.get_height()))
+            x += image.get_width()
+        self.surface = surface
+
+
+class SpriteBatch:
+    """Draw whole layers of cells with one blit call each
+
+    Opaque cell colours (snake, obstacles) and food images live in two
+    atlases. Pixel positions of the cells of a board are computed once per
+    board stride and reused, so drawing a layer builds one list of
+    (tile, position) pairs and hands it to ``Surface.fblits`` (pygame-ce)
+    or ``Surface.blits`` in a single call, instead of one ``draw.rect`` and
+    one ``Rect`` per cell.
+    """
+    def __init__(self):
+        """Initialize empty atlases"""
+        self.colors = TileAtlas()
+        self.images = TileAtlas(alpha=True)
+        self.stride = None
+        self.positions = []
+        self.rects = []
+
+    def color_tile(self, color):
+        """Cell-sized tile filled with a colour"""
+        def render():
+            surface = pygame.Surface((CELL_SIZE, CELL_SIZE))
+            surface.fill(color)
+            return surface
+        return self.colors.tile(tuple(color), render)
+
+    def image_tile(self, image):
+        """Tile with a copy of an image, such as the food"""
+        return self.images.tile(image, lambda: image)
+
+    def cell_positions(self, stride):
+        """Top left pixel of every padded cell id of a board with ``stride``"""
+        if stride != self.stride:
+            self.stride = stride
+            self.rects = []
+            self.positions = [((cell_id % stride - 1) * CELL_SIZE, (cell_id // stride - 1) * CELL_SIZE)
+                              for cell_id in range(stride * stride)]
+        return self.positions
+
+    def cell_rects(self, stride):
+        """Screen rectangle of every padded cell id, reused for display updates"""
+        positions = self.cell_positions(stride)
+        if len(self.rects) != len(positions):
+            self.rects = [pygame.Rect(position, (CELL_SIZE, CELL_SIZE)) for position in positions]
+        return self.rects
+
+    def draw_checkerboard(self, screen, color, cell_number):
+        """Fill every other cell of a board with a colour, starting at the top left one"""
+        positions = [(col * CELL_SIZE, row * CELL_SIZE)
+                     for row in range(cell_number) for col in range(row % 2, cell_number, 2)]
+        self.draw_at(screen, self.color_tile(color), positions)
+
+    def draw_cells(self, screen, tile, cell_ids, stride):
+        """Draw a tile on every cell id with one call"""
+        positions = self.cell_positions(stride)
+        self.draw_at(screen, tile, [positions[cell_id] for cell_id in cell_ids])
+
+    def draw_at(self, screen, tile, positions):
+        """Draw a tile at every pixel position with one call"""
+        if not positions:
+            return
+        fblits = getattr(screen, 'fblits', None)
+        if fblits is not None:
+            fblits([(tile, position) for position in positions])
+        else:
+            screen.blits([(tile, position) for position in positions], False)
@@ -1,12 +1,43 @@
 """Test file"""
 import random
 import os
+import sys
+import tracemalloc
+import tempfile
+import threading
+import asyncio
 import unittest
+from unittest import mock
 import pygame
 from pygame import Vector2
+from pygame.locals import QUIT, KEYDOWN, K_UP, K_DOWN, K_LEFT, K_RIGHT, K_F3, K_q, K_r, K_s
 from game import Game
-from utilities import load_high_scores, save_high_scores
-from entities import Snake, Food, Obstacle
+from main import main
+from replay import Replay, HEADERS, play, verify
+from benchmark import compare
+from tournament import Histogram, run as run_tournament
+from utilities import load_high_scores, ScoreStore
+from entities import Snake, Food, Obstacle, OBSTACLE_COLOR
+from grid import EMPTY, WALL, SNAKE, OBSTACLE, FOOD
+from ui import Label
+from camera import Camera
+from inputs import InputQueue
+from arena import Arena, ArenaView, EMPTY_CELL, OBSTACLE_CELL, SNAKE_CELL
+from server import ArenaServer
+from client import ArenaClient, ArenaRenderer, SNAKE_COLORS
+from autopilot import Autopilot
+from levels import LevelPack, generate, is_connected
+from attract import AttractMode
+import snapshot
+from constants import CELL_SIZE, BACKGROUND_IMAGES
+from assets import assets
+from renderer import ViewportRenderer
+from simulation import Simulation, ObstacleCells, SnakeBody, FoodItem, UP, DOWN, RIGHT, DIRECTIONS
+try:
+    import numpy as np
+    from batch import BatchSimulation, DEATH_CAUSES
+except ImportError:
+    np = None
 
 
 class TestSnakeGame(unittest.TestCase):
@@ -21,16 +52,11 @@ class TestSnakeGame(unittest.TestCase):
 
     def tearDown(self):
         """Tear down game"""
-        pygame.quit()
-        if os.path.exists('high_scores.txt'):
-            os.remove('high_scores.txt')
-
-    def update_score(self, new_score):
-        """Update score function we will check"""
-        high_scores = load_high_scores()
-        high_scores.append(new_score)
-        high_scores = sorted(high_scores, reverse=True)[:5]
-        save_high_scores(high_scores)
+        self.game.quit()
+        for filename in ('high_scores.txt', 'leaderboard.txt', 'leaderboard.log', 'leaderboard.history',
+                         'leaderboard.lock'):
+            if os.path.exists(filename):
+                os.remove(filename)
 
     def test_check_collision_with_food(self):
         """Check collision with food"""
@@ -60,7 +86,7 @@ class TestSnakeGame(unittest.TestCase):
     def test_food_randomize(self):
         """Ensure food does not spawn on the snake"""
         self.game.snake.body = [Vector2(x, 10) for x in range(10)]
-        self.game.food.randomize(self.game.snake.body, [])
+        self.game.sim.spawn_food()
         self.assertNotIn(self.game.food.pos, self.game.snake.body)
 
     def test_food_randomize_with_obstacles(self):
@@ -69,33 +95,899 @@ class TestSnakeGame(unittest.TestCase):
         obstacles = [Obstacle(self.game) for _ in range(10)]
         for obstacle in obstacles:
             obstacle.positions = [Vector2(random.randint(0, 19), random.randint(0, 19))]
-        self.game.food.randomize(self.game.snake.body, obstacles)
+        self.game.obstacles = obstacles
+        self.game.sim.spawn_food()
         for obstacle in obstacles:
             self.assertNotIn(self.game.food.pos, obstacle.positions)
 
+    def test_food_spawns_from_round_seed(self):
+        """The game's food and bonus apples are placed by the round's seed alone"""
+        def spawned(global_seed):
+            random.seed(global_seed)
+            self.game.sim.reset(5)
+            foods = []
+            for _ in range(30):
+                random.random()
+                self.game.sim.spawn_food()
+                foods.append((type(self.game.food).__name__, self.game.food.cell))
+            return foods
+        foods = spawned(1)
+        self.assertIn('Point5Apple', {name for name, _ in foods})
+        self.assertEqual(foods, spawned(2))
+
+    def test_dirty_rendering_matches_full_redraw(self):
+        """Repainting changed cells gives the same frame as a full redraw"""
+        self.game.obstacles = []
+        self.game.renderer.draw()
+        self.game.food.pos = Vector2(9, 10)
+        for _ in range(4):
+            self.game.update()
+            self.assertTrue(self.game.renderer.draw())
+        dirty_frame = pygame.image.tobytes(self.game.screen, 'RGB')
+        self.game.screen.fill(self.game.background_color())
+        self.game.draw_palette()
+        self.game.draw_elements()
+        self.assertEqual(dirty_frame, pygame.image.tobytes(self.game.screen, 'RGB'))
+        self.assertEqual(self.game.score, 1)
+
+    def test_dirty_rendering_repaints_overlapping_images(self):
+        """A change under the score repaints the food image the score overlaps"""
+        self.game.obstacles = []
+        self.game.food.pos = Vector2(27, 1)
+        self.game.renderer.draw()
+        obstacle = Obstacle(self.game)
+        obstacle.cells = [(25, 0)]
+        self.game.obstacles = [obstacle]
+        self.game.renderer.draw()
+        dirty_frame = pygame.image.tobytes(self.game.screen, 'RGB')
+        self.game.screen.fill(self.game.background_color())
+        self.game.draw_palette()
+        self.game.draw_elements()
+        self.assertEqual(dirty_frame, pygame.image.tobytes(self.game.screen, 'RGB'))
+
+    def test_viewport_rendering_matches_full_redraw(self):
+        """The chunked viewport draws a window-sized board like a full redraw"""
+        renderer = ViewportRenderer(self.game)
+        self.game.sim.reset(7)
+        self.game.snake.color = (245, 222, 179)
+        for _ in range(3):
+            self.game.update()
+        renderer.draw()
+        viewport_frame = pygame.image.tobytes(self.game.screen, 'RGB')
+        self.game.screen.fill(self.game.background_color())
+        self.game.draw_palette()
+        self.game.draw_elements()
+        self.assertEqual(viewport_frame, pygame.image.tobytes(self.game.screen, 'RGB'))
+
+    def test_large_board_camera(self):
+        """On a board larger than the window the camera keeps the head in view"""
+        game = Game(cell_number=120)
+        self.assertIsInstance(game.renderer, ViewportRenderer)
+        self.assertEqual(game.obstacles, [])
+        game.sim.reset()
+        self.assertEqual(len(game.obstacles), 160)
+        game.obstacles = []
+        game.snake.cells = [(60, 70), (59, 70), (58, 70)]
+        game.renderer.draw()
+        camera = game.renderer.camera
+        self.assertEqual((camera.x, camera.y), (45, 55))
+        center = ((60 - camera.x) * CELL_SIZE + 1, (70 - camera.y) * CELL_SIZE + 1)
+        self.assertEqual(game.screen.get_at(center)[:3], game.snake.color)
+        self.assertLessEqual(len(game.renderer.chunks), 9)
+        game.music.wait()
+
+    def test_music_switch_does_not_block(self):
+        """Crossing a score tier never decodes music on the game thread"""
+        self.game.music.wait()
+        self.assertEqual(self.game.music.current, 0)
+        self.assertIn(1, self.game.music.sounds)
+        self.game.score = 10
+        threads = []
+        sound = pygame.mixer.Sound
+
+        def load(path):
+            threads.append(threading.current_thread())
+            return sound(path)
+        with mock.patch('pygame.mixer.Sound', side_effect=load), mock.patch('pygame.mixer.music.load') as load_music:
+            self.game.update_music_track()
+            self.assertEqual(self.game.music.current, 1)
+            self.game.music.wait()
+        load_music.assert_not_called()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+        self.assertIn(2, self.game.music.sounds)
+        self.assertEqual([index for index, _ in self.game.music.switches], [0, 1])
+        self.game.music.stop()
+        self.assertFalse(self.game.music.channels[0].get_busy() or self.game.music.channels[1].get_busy())
+
+    def test_spawn_food_uses_cached_assets(self):
+        """Spawning food never loads images or sounds from disk"""
+        assets.wait()
+        self.game.music.wait()
+        with mock.patch('pygame.image.load') as load_image, mock.patch('pygame.mixer.Sound') as load_sound:
+            for _ in range(50):
+                self.game.spawn_food()
+                self.assertIsNotNone(self.game.eat_sound)
+        load_image.assert_not_called()
+        load_sound.assert_not_called()
+        self.assertIs(Food().food_image, Food().food_image)
+
+    def test_staged_startup(self):
+        """Backgrounds are only decoded when needed and the first frame is timed"""
+        self.game.quit()
+        assets.clear()
+        self.game = Game()
+        self.assertFalse(any(key[0] in BACKGROUND_IMAGES for key in assets.images))
+        pygame.event.post(pygame.event.Event(KEYDOWN, key=K_s))
+        self.assertTrue(self.game.show_start_screen())
+        self.assertGreaterEqual(self.game.time_to_first_frame, self.game.init_time)
+        assets.prefetch(images=BACKGROUND_IMAGES)
+        self.game.change_background(1)
+        self.assertEqual(self.game.bg_image.get_size(), self.game.screen.get_size())
+        assets.wait()
+        self.assertIn(BACKGROUND_IMAGES[2], assets.decoded)
+
+    def test_idle_start_screen_plays_attract_mode(self):
+        """An idle start screen sleeps into the attract mode and the key that ends it starts the round"""
+        self.game.attract_after = 50
+        player = self.game.sim
+        quit_event = pygame.event.Event(QUIT)
+        # if the key were lost the window is closed instead of blocking forever
+        pygame.time.set_timer(quit_event, 5000, 1)
+        pygame.time.set_timer(pygame.event.Event(KEYDOWN, key=K_s), 400, 1)
+        try:
+            with mock.patch.object(self.game, 'show_attract_mode', wraps=self.game.show_attract_mode) as attract, \
+                    mock.patch.object(self.game, 'play_round', return_value=None) as play_round:
+                self.game.run()
+        finally:
+            if pygame.get_init():
+                pygame.time.set_timer(quit_event, 0)
+        attract.assert_called_once()
+        play_round.assert_called_once()
+        self.assertIs(self.game.sim, player)
+
+    def test_restarts_keep_stack_and_memory_flat(self):
+        """Thousands of restarts run in the flat scene loop without the stack or memory growing
+
+        Memory is compared once the bounded sample windows (music switches,
+        frame times) are full, so what is left is what a round leaks.
+        """
+        rounds = 2500
+        played = [0]
+        depths = set()
+        sizes = []
+        game = self.game
+
+        def advance(elapsed):
+            """Play the whole round at once, then restart or quit from the game over screen"""
+            game.sim.run()
+            frame, depth = sys._getframe(), 0
+            while frame is not None:
+                frame, depth = frame.f_back, depth + 1
+            depths.add(depth)
+            played[0] += 1
+            if played[0] in (rounds // 2, rounds):
+                sizes.append(tracemalloc.get_traced_memory()[0])
+            pygame.event.post(pygame.event.Event(KEYDOWN, key=K_r if played[0] < rounds else K_q))
+            game.accumulator = game.tick_interval  # no frame wait after the last tick
+            return 1
+
+        tracemalloc.start()
+        try:
+            with mock.patch.object(game, 'advance', advance):
+                pygame.event.post(pygame.event.Event(KEYDOWN, key=K_s))
+                game.run()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(played[0], rounds)
+        self.assertEqual(len(depths), 1)
+        self.assertLess(sizes[1] - sizes[0], 16 * 1024)
+
+    def test_attract_mode_repaints_changed_cells(self):
+        """The demo is drawn by the game's renderer, cell by cell, and matches a full redraw"""
+        player = self.game.sim
+        with AttractMode(self.game, seed=4) as attract:
+            self.assertIs(self.game.sim, attract.sim)
+            attract.draw()
+            for _ in range(300):
+                rects = attract.step()
+                if attract.sim.ticks > 1:
+                    self.assertLess(len(rects), 40)
+            frame = self.game.screen.copy()
+            self.game.renderer.invalidate()
+            attract.draw()
+            self.assertEqual(pygame.image.tobytes(frame, 'RGB'), pygame.image.tobytes(self.game.screen, 'RGB'))
+        self.assertIs(self.game.sim, player)
+
+    def test_autopilot_steers_game(self):
+        """Autopilot turns the snake without the player's input queue and times its decisions"""
+        self.game.obstacles = []
+        self.game.play_with_obstacles = False
+        self.game.food = FoodItem((10, 2))
+        self.game.autopilot = Autopilot()
+        for _ in range(20):
+            self.game.advance(self.game.tick_interval)
+        self.assertGreater(self.game.score, 0)
+        self.assertEqual(self.game.autopilot.summary()['decisions'], self.game.loop_stats.summary()['ticks'])
+        self.game.inputs.presented()
+        self.assertEqual((len(self.game.inputs.latencies), self.game.inputs.rejected), (0, 0))
+
+    def test_save_and_resume(self):
+        """F5 saves the round and loading it brings the game back with its own entities"""
+        self.game.replay = Replay.for_simulation(self.game.sim)
+        for _ in range(3):
+            self.game.sim.step()
+        cells, food, food_entity = self.game.snake.cells, self.game.food.cell, self.game.food
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'saved.snap')
+            with mock.patch('game.SAVE_FILE', filename):
+                self.game.handle_keys(pygame.K_F5)
+            saved = snapshot.dump(self.game.sim)
+            self.game.sim.reset()
+            snapshot.load(filename, self.game.sim)
+        self.assertEqual((self.game.snake.cells, self.game.food.cell), (cells, food))
+        self.assertIsInstance(self.game.snake, Snake)
+        self.assertIs(type(self.game.food), type(food_entity))
+        self.assertEqual(snapshot.dump(self.game.sim), saved)
+
+    def test_quick_turns_are_buffered(self):
+        """Up then left within one tick turns on two consecutive ticks"""
+        self.game.obstacles = []
+        self.game.play_with_obstacles = False
+        self.game.food = FoodItem((0, 0))
+        self.game.handle_keys(K_UP)
+        self.game.handle_keys(K_LEFT)
+        self.game.update()
+        self.assertEqual(self.game.snake.head(), (7, 9))
+        self.game.update()
+        self.assertEqual(self.game.snake.head(), (6, 9))
+        self.game.inputs.presented()
+        self.assertEqual(len(self.game.inputs.latencies), 2)
+
+    def test_layers_are_batched(self):
+        """A long snake and the obstacles are drawn with one blit call per layer"""
+        self.game.play_with_obstacles = True
+        self.game.sim.generate_obstacles()
+        self.game.snake.cells = [(x, y) for y in range(4, 10) for x in (range(30) if y % 2 else range(29, -1, -1))]
+        screen = mock.Mock(wraps=self.game.screen)
+        self.game.screen = screen
+        with mock.patch('pygame.draw.rect') as draw_rect:
+            self.game.draw_elements()
+        draw_rect.assert_not_called()
+        batch = screen.fblits if hasattr(pygame.Surface, 'fblits') else screen.blits
+        layers = [call.args[0] for call in batch.call_args_list]
+        self.assertEqual(len(layers), 3)
+        self.assertEqual(len(layers[0]), 180)
+
+    def test_obstacle_layer_is_cached(self):
+        """Obstacle cell ids are listed again only when an obstacle changes"""
+        self.game.play_with_obstacles = True
+        self.game.sim.generate_obstacles()
+        self.game.draw_elements()
+        obstacle_ids = self.game.obstacle_ids
+        self.game.sim.step()
+        self.game.draw_elements()
+        self.assertIs(self.game.obstacle_ids, obstacle_ids)
+        self.game.obstacles[0].cells = [(0, 29)]
+        self.game.draw_elements()
+        self.assertIsNot(self.game.obstacle_ids, obstacle_ids)
+        self.assertIn(self.game.sim.cell_id((0, 29)), self.game.obstacle_ids)
+
+    def test_fixed_timestep_advance(self):
+        """Ticks follow elapsed time and the speed curve, capping catch-up"""
+        self.game.obstacles = []
+        self.game.play_with_obstacles = False
+        self.assertEqual(self.game.advance(250), 2)
+        self.assertEqual(self.game.accumulator, 50)
+        self.assertEqual(self.game.snake.head(), (9, 10))
+        self.game.snake.direction = self.game.snake.next_direction = (0, 1)
+        self.assertEqual(self.game.advance(10000), 5)
+        self.assertGreater(self.game.loop_stats.dropped_ticks, 0)
+        self.assertLess(self.game.accumulator, self.game.tick_interval)
+        self.assertEqual(self.game.loop_stats.summary()['ticks'], 7)
+
+    def test_replay_reproduces_game(self):
+        """A recorded game re-simulates headless to the same score"""
+        self.game.sim.reset(1234)
+        self.game.replay = Replay.for_simulation(self.game.sim)
+        while not self.game.game_over and self.game.sim.ticks < 3000:
+            (head_x, head_y), (food_x, food_y) = self.game.snake.head(), self.game.food.cell
+            if food_x != head_x:
+                self.game.handle_keys(K_RIGHT if food_x > head_x else K_LEFT)
+            self.game.handle_keys(K_DOWN if food_y > head_y else K_UP)
+            self.game.update()
+        self.game.replay.finish(self.game.sim)
+        replay = Replay.from_bytes(self.game.replay.to_bytes())
+        self.assertEqual(replay.turns, self.game.replay.turns)
+        self.assertTrue(verify(replay))
+        self.assertEqual(play(replay).death_cause, self.game.sim.death_cause)
+        replay.score += 1
+        self.assertFalse(verify(replay))
+
+    def test_text_is_rendered_once(self):
+        """Unchanged score and labels reuse their rendered surfaces"""
+        label = Label(self.game.screen, 'Snake Game', 100, 50, 500, 50, (255, 255, 255))
+        label.draw()
+        surface = label.text_surf
+        label.draw()
+        self.assertIs(label.text_surf, surface)
+        label.text = 'Scores'
+        label.draw()
+        self.assertIsNot(label.text_surf, surface)
+        self.game.score_draw()
+        with mock.patch('ui.get_font') as get_font:
+            for _ in range(10):
+                self.game.score_draw()
+                label.draw()
+        get_font.assert_not_called()
+
+    def test_frame_profiler(self):
+        """Phases are only timed while the profiler is on and end up in the trace"""
+        self.game.obstacles = []
+        self.game.draw_elements()
+        self.assertEqual(self.game.profiler.phase_times, {})
+        self.game.handle_keys(K_F3)
+        self.game.profiler.set_tracing(True)
+        self.game.profiler.begin_frame()
+        self.game.advance(self.game.tick_interval)
+        self.game.renderer.draw()
+        self.game.profiler.end_frame()
+        rect = self.game.profiler.draw(self.game.screen)
+        self.game.renderer.expose(rect)
+        self.assertIn(self.game.sim.world.cell_id((0, 0)), self.game.sim.world.dirty)
+        summary = self.game.profiler.summary()
+        self.assertEqual(summary['ticks_per_second'], 1)
+        self.assertIn(summary['slowest_phase'], ('update', 'draw_palette', 'draw_elements', 'score_draw'))
+        names = {event['name'] for event in self.game.profiler.events}
+        self.assertTrue({'frame', 'update', 'draw_palette', 'draw_elements', 'score_draw'} <= names)
+        self.game.handle_keys(K_F3)
+        self.assertFalse(self.game.profiler.overlay)
+
     def test_load_high_scores_no_file(self):
         """Test loading high scores when the file does not exist"""
         if os.path.exists('high_scores.txt'):
             os.remove('high_scores.txt')
         self.assertEqual(load_high_scores(), [])
 
-    def test_save_high_scores(self):
-        """Test saving high scores to a file"""
-        high_scores = [300, 100, 200]
-        save_high_scores(high_scores)
-        self.assertEqual(load_high_scores(), [300, 200, 100])
-
-    def test_update_high_scores_new_high(self):
-        """Test updating high scores with a new high score"""
-        save_high_scores([100, 200])
-        self.update_score(300)
-        self.assertEqual(load_high_scores(), [300, 200, 100])
-
-    def test_update_high_scores_no_new_high(self):
-        """Test updating high scores without a new high score"""
-        save_high_scores([100, 200, 300])
-        self.update_score(150)
-        self.assertEqual(load_high_scores(), [300, 200, 150, 100])
+
+class TestSimulation(unittest.TestCase):
+    """Test headless simulation"""
+
+    def setUp(self):
+        """Set up simulation without obstacles"""
+        self.sim = Simulation(play_with_obstacles=False)
+
+    def test_step_eats_and_grows(self):
+        """Snake eats food in front of it and grows on the next tick"""
+        self.sim.food = FoodItem((8, 10))
+        events = self.sim.step(RIGHT)
+        self.assertEqual(events.eaten.cell, (8, 10))
+        self.assertEqual(self.sim.score, 1)
+        self.sim.step()
+        self.assertEqual(len(self.sim.snake.cells), 4)
+
+    def test_seed_reproduces_round(self):
+        """Rounds started from the same seed are identical"""
+        first = Simulation(seed=7)
+        second = Simulation(seed=7)
+        self.assertEqual([o.cells for o in first.obstacles], [o.cells for o in second.obstacles])
+        self.assertEqual(first.food.cell, second.food.cell)
+
+    def test_step_advances_clock_by_interval(self):
+        """Simulated clock follows the speed curve"""
+        self.sim.score = 30
+        self.sim.food = FoodItem((0, 0))
+        self.sim.step()
+        self.assertEqual(self.sim.time, 50)
+
+    def test_reverse_is_ignored(self):
+        """Turning back into the body is not allowed"""
+        self.sim.food = FoodItem((0, 0))
+        self.sim.step((-1, 0))
+        self.assertEqual(self.sim.snake.head(), (8, 10))
+
+    def test_snake_body_ring_buffer(self):
+        """Body keeps its order and occupancy while growing past the buffer"""
+        snake = SnakeBody(30)
+        expected = snake.cells
+        for step in range(40):
+            snake.direction = DOWN if step % 2 else RIGHT
+            snake.grow = step % 3 != 0
+            snake.move()
+            head = expected[0]
+            expected.insert(0, (head[0] + snake.direction[0], head[1] + snake.direction[1]))
+            if step % 3 == 0:
+                expected.pop()
+        self.assertEqual(snake.cells, expected)
+        self.assertEqual(len(snake), len(expected))
+        self.assertTrue(snake.occupies(expected[-1]))
+        self.assertFalse(snake.hits_itself())
+
+    def test_moves_until_free(self):
+        """Each body cell knows how many moves the tail needs to leave it"""
+        snake = SnakeBody(30, [(5, 5), (4, 5), (3, 5)])
+        self.assertEqual([snake.moves_until_free(snake.cell_id(cell)) for cell in snake.cells], [3, 2, 1])
+        snake.grow = True
+        snake.move()
+        self.assertEqual([snake.moves_until_free(snake.cell_id(cell)) for cell in snake.cells], [4, 3, 2, 1])
+        self.assertEqual(snake.moves_until_free(snake.cell_id((0, 0))), 0)
+
+    def test_snapshot_clone_continues_identically(self):
+        """A clone plays on exactly like the original, food spawns included"""
+        moves = random.Random(3)
+        sim = Simulation(seed=3)
+        for _ in range(30):
+            sim.step(moves.choice(DIRECTIONS))
+        data = snapshot.dump(sim)
+        self.assertLess(len(data), 6 * 1024)
+        self.assertLess(len(snapshot.dump(Simulation(500, obstacle_count=0, seed=3))), 12 * 1024)
+        copy = snapshot.clone(sim)
+        self.assertEqual(snapshot.dump(copy), data)
+        self.assertEqual([obstacle.cells for obstacle in copy.obstacles], [obstacle.cells for obstacle in sim.obstacles])
+        while not sim.game_over:
+            action = moves.choice(DIRECTIONS)
+            sim.step(action)
+            copy.step(action)
+            self.assertEqual((copy.snake.cells, copy.food.cell, copy.score), (sim.snake.cells, sim.food.cell, sim.score))
+        self.assertEqual(copy.death_cause, sim.death_cause)
+        snapshot.restore(copy, data)
+        self.assertEqual(snapshot.dump(copy), data)
+
+    def test_resumed_round_replays(self):
+        """A replay of a resumed round starts from its snapshot and verifies"""
+        sim = Simulation(seed=8)
+        for _ in range(5):
+            sim.step()
+        resumed = snapshot.clone(sim)
+        replay = Replay.for_simulation(resumed, resumed=True)
+        autopilot = Autopilot()
+        while not resumed.game_over and resumed.ticks < 400:
+            direction = autopilot(resumed)
+            if direction is not None and resumed.snake.turn(direction):
+                replay.record(resumed.ticks + 1, direction)
+            resumed.step()
+        replay.finish(resumed)
+        self.assertTrue(verify(Replay.from_bytes(replay.to_bytes())))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'saved.snap')
+            snapshot.save(sim, filename)
+            with mock.patch('sys.stderr'), self.assertRaises(SystemExit):
+                main(['--resume', filename, '--cells', '20'])
+
+    def test_large_obstacle_counts_are_stored(self):
+        """Obstacle counts of very large boards fit replays and snapshots, and older replays still load"""
+        replay = Replay(7, 2600, True, 75111)
+        self.assertEqual(Replay.from_bytes(replay.to_bytes()).obstacle_count, 75111)
+        old = HEADERS[1].pack(b'SNKR', 1, 1, 30, 10, 7, 3, 40, 0)
+        self.assertEqual((Replay.from_bytes(old).seed, Replay.from_bytes(old).level), (7, None))
+        sim = Simulation(seed=1)
+        sim.obstacle_count = 75111
+        self.assertEqual(snapshot.clone(sim).obstacle_count, 75111)
+
+    def test_free_cells_follow_snake(self):
+        """Free cell index excludes the snake and obstacles as they change"""
+        sim = Simulation(cell_number=10)
+        blocked = set(sim.snake.cells) | {sim.food.cell}
+        for obstacle in sim.obstacles:
+            blocked.update(obstacle.cells)
+        free = {sim.cell_at(cell_id) for cell_id in sim.free_cells.cells}
+        self.assertEqual(len(free), 100 - len(blocked))
+        self.assertFalse(free & blocked)
+        tail = sim.snake.tail()
+        sim.food = FoodItem((9, 9))
+        sim.step(DOWN)
+        self.assertIn(sim.cell_id(tail), sim.free_cells)
+        self.assertNotIn(sim.cell_id(sim.snake.head()), sim.free_cells)
+
+    def test_world_reports_occupants(self):
+        """World answers what is on a cell as entities move"""
+        obstacle = ObstacleCells()
+        obstacle.cells = [(12, 12), (13, 12)]
+        self.sim.obstacles = [obstacle]
+        self.sim.food = FoodItem((3, 3))
+        self.assertEqual(self.sim.world.at((12, 12)), OBSTACLE)
+        self.assertEqual(self.sim.world.at((7, 10)), SNAKE)
+        self.assertEqual(self.sim.world.at((3, 3)), FOOD)
+        self.assertEqual(self.sim.world.at((-1, 3)), WALL)
+        obstacle.cells = [(20, 20)]
+        self.assertEqual(self.sim.world.at((12, 12)), EMPTY)
+        self.assertIn(self.sim.cell_id((12, 12)), self.sim.free_cells)
+        self.sim.food.cell = (4, 4)
+        self.assertEqual(self.sim.world.at((3, 3)), EMPTY)
+
+    def test_many_obstacles(self):
+        """Hundreds of obstacles are placed without overlapping"""
+        sim = Simulation(cell_number=60, obstacle_count=300)
+        cells = [cell for obstacle in sim.obstacles for cell in obstacle.cells]
+        self.assertEqual(len(cells), len(set(cells)))
+        self.assertTrue(all(len(obstacle.cells) in (2, 3) for obstacle in sim.obstacles))
+
+    def test_full_board_is_a_win(self):
+        """Eating the last free cell ends the round as a win"""
+        sim = Simulation(cell_number=2, play_with_obstacles=False)
+        sim.snake.cells = [(0, 0), (0, 1), (1, 1)]
+        sim.snake.direction = sim.snake.next_direction = RIGHT
+        sim.snake.grow = True
+        sim.food = FoodItem((1, 0))
+        events = sim.step()
+        self.assertTrue(sim.game_over)
+        self.assertEqual(events.death_cause, 'win')
+        self.assertEqual(sim.score, 1)
+
+    def test_wall_ends_game(self):
+        """Leaving the board ends the round"""
+        self.sim.food = FoodItem((0, 0))
+        self.sim.step(UP)
+        self.sim.run()
+        self.assertTrue(self.sim.game_over)
+        self.assertEqual(self.sim.death_cause, 'wall')
+
+
+class TestInputQueue(unittest.TestCase):
+    """Test the buffered input queue"""
+
+    def test_rejects_reversals_when_queued(self):
+        """Turns are checked against the heading after the turns already queued"""
+        inputs = InputQueue(size=2)
+        self.assertFalse(inputs.push((-1, 0), RIGHT))
+        self.assertFalse(inputs.push(RIGHT, RIGHT))
+        self.assertTrue(inputs.push(UP, RIGHT))
+        self.assertFalse(inputs.push(DOWN, RIGHT))
+        self.assertTrue(inputs.push((-1, 0), RIGHT))
+        self.assertFalse(inputs.push(UP, RIGHT))
+        self.assertEqual(inputs.summary()['rejected_turns'], 3)
+        self.assertEqual(inputs.summary()['dropped_turns'], 1)
+        self.assertEqual([inputs.pop(), inputs.pop(), inputs.pop()], [UP, (-1, 0), None])
+
+    def test_latency_until_presented(self):
+        """Delay runs from the key press to the frame after the turn was applied"""
+        inputs = InputQueue()
+        inputs.push(UP, RIGHT, pressed=10.0)
+        inputs.presented(10.5)
+        self.assertEqual(len(inputs.latencies), 0)
+        inputs.pop()
+        inputs.presented(10.02)
+        self.assertAlmostEqual(inputs.summary()['input_ms_p50'], 20.0)
+
+
+class TestAutopilot(unittest.TestCase):
+    """Test the built-in bot"""
+
+    def test_plays_safely(self):
+        """Autopilot keeps eating on boards with obstacles"""
+        for seed in range(3):
+            sim = Simulation(20, seed=seed)
+            autopilot = Autopilot()
+            sim.run(autopilot, max_ticks=3000)
+            self.assertGreater(sim.score, 20)
+            self.assertLess(autopilot.summary()['decision_ms_p95'], 50)
+
+    def test_long_snake_on_large_board(self):
+        """Decisions stay fast with a snake covering most of a large board"""
+        sim = Simulation(200, play_with_obstacles=False, seed=0)
+        cells = []
+        for y in range(180):
+            xs = range(199, 0, -1) if y % 2 else range(1, 200)
+            cells.extend((x, y) for x in xs)
+        sim.snake.cells = cells[::-1]
+        sim.snake.direction = (-1, 0)
+        sim.food = FoodItem((0, 199))
+        autopilot = Autopilot()
+        sim.run(autopilot, max_ticks=200)
+        self.assertFalse(sim.game_over)
+        self.assertLess(autopilot.summary()['decision_ms_max'], 50)
+
+
+class TestArena(unittest.TestCase):
+    """Test multiplayer arenas and the server"""
+
+    def test_head_on_collision(self):
+        """Snakes meeting head on both die and respawn later"""
+        arena = Arena(20, max_players=2, obstacle_count=0, seed=0)
+        for _ in range(2):
+            arena.join()
+        arena.snakes = [SnakeBody(20, [(5, 5), (4, 5), (3, 5)]), SnakeBody(20, [(7, 5), (8, 5), (9, 5)])]
+        arena.snakes[1].direction = arena.snakes[1].next_direction = (-1, 0)
+        for snake in arena.snakes:
+            snake.attach(arena.world)
+        arena.step()
+        self.assertEqual(arena.snakes, [None, None])
+        self.assertFalse(any(arena.world.snakes))
+        for _ in range(20):
+            arena.step()
+        self.assertTrue(all(arena.snakes))
+
+    def test_loopback_clients_follow_server(self):
+        """Clients rebuild every arena from the keyframe and deltas"""
+        async def play():
+            server = ArenaServer(2, cell_number=20, max_players=2, tick_ms=5, seed=0)
+            listener = await server.start('127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            clients = [ArenaClient() for _ in range(3)]
+            for client in clients:
+                await client.connect('127.0.0.1', port)
+                await client.receive()
+                client.turn(1)
+            await server.run(ticks=10)
+            for client in clients:
+                while client.view.ticks < server.arenas[client.arena_index].ticks:
+                    await client.receive()
+            for client in clients:
+                expected = ArenaView()
+                expected.apply(server.arenas[client.arena_index].keyframe())
+                self.assertEqual(client.view.cells, expected.cells)
+            for client in clients:
+                await client.close()
+            listener.close()
+            return server, clients
+        server, clients = asyncio.run(play())
+        self.assertEqual([(client.arena_index, client.slot) for client in clients], [(0, 0), (0, 1), (1, 0)])
+        self.assertEqual(server.summary()['ticks'], 10)
+
+    def test_client_renderer(self):
+        """The client paints each cell of the view with its tile"""
+        arena = Arena(20, max_players=2, obstacle_count=5, seed=0)
+        arena.join()
+        arena.step()
+        view = ArenaView()
+        view.apply(arena.keyframe())
+        pygame.init()
+        screen = pygame.display.set_mode((20 * CELL_SIZE, 20 * CELL_SIZE))
+        renderer = ArenaRenderer(screen, 20)
+        rects = renderer.draw(view, range(len(view.cells)))
+        self.assertEqual(len(rects), 400)
+        colors = {code: screen.get_at(((index % 20) * CELL_SIZE + 12, (index // 20) * CELL_SIZE + 12))[:3]
+                  for index, code in enumerate(view.cells)}
+        self.assertEqual(colors[OBSTACLE_CELL], OBSTACLE_COLOR)
+        self.assertEqual(colors[SNAKE_CELL], SNAKE_COLORS[0])
+        self.assertIn(colors[EMPTY_CELL], [(170, 215, 70), (160, 210, 60)])
+
+
+class TestCamera(unittest.TestCase):
+    """Test the camera"""
+
+    def test_follow_stays_on_board(self):
+        """The view centers on the cell but never leaves the board"""
+        camera = Camera(30, 2000)
+        camera.follow((1000, 5))
+        self.assertEqual((camera.x, camera.y), (985, 0))
+        self.assertEqual(camera.visible(), (985, 1015, 0, 30))
+        self.assertEqual(camera.to_view((1000, 5)), (15, 5))
+        camera.follow((1999, 1999))
+        self.assertEqual((camera.x, camera.y), (1970, 1970))
+        small = Camera(30, 20)
+        small.follow((19, 19))
+        self.assertEqual(small.visible(), (0, 20, 0, 20))
+
+class TestScoreStore(unittest.TestCase):
+    """Test the leaderboard store"""
+
+    def setUp(self):
+        """Use a store in a temporary directory"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.name = os.path.join(self.directory.name, 'scores')
+
+    def tearDown(self):
+        """Remove the temporary directory"""
+        self.directory.cleanup()
+
+    def test_leaderboards_per_mode(self):
+        """Scores are kept per difficulty and board size, best first"""
+        store = ScoreStore(self.name, top_k=3)
+        for score in (4, 9, 1, 7):
+            store.add(score, True, 30)
+        store.add(12, False, 30)
+        store.add(3, True, 60)
+        self.assertEqual(store.leaderboard(True, 30), [9, 7, 4])
+        self.assertEqual(store.leaderboard(False, 30), [12])
+        self.assertEqual(store.leaderboard(True, 60), [3])
+
+    def test_compaction_and_other_writers(self):
+        """Compaction keeps the scores and writers see each other's results"""
+        first = ScoreStore(self.name, compact_every=4)
+        second = ScoreStore(self.name, compact_every=4)
+        for score in range(10):
+            (first if score % 2 else second).add(score)
+        self.assertEqual(first.leaderboard(), [9, 8, 7, 6, 5])
+        self.assertEqual(ScoreStore(self.name).leaderboard(), [9, 8, 7, 6, 5])
+        with open(self.name + '.history', encoding='utf-8') as history:
+            self.assertEqual(len(history.readlines()), 8)
+
+    def test_torn_log_line_is_ignored(self):
+        """A half-written line from a crash does not corrupt the store"""
+        store = ScoreStore(self.name)
+        store.add(5)
+        with open(self.name + '.log', 'ab') as log:
+            log.write(b'2 30 1 ')
+        store = ScoreStore(self.name)
+        store.add(6)
+        self.assertEqual(ScoreStore(self.name).leaderboard(), [6, 5])
+
+    def test_legacy_scores_are_imported_once(self):
+        """Scores of an old high_scores.txt move into a new store once"""
+        legacy = os.path.join(self.directory.name, 'high_scores.txt')
+        with open(legacy, 'w', encoding='utf-8') as file:
+            file.write('300\n200\n100\n')
+        store = ScoreStore(self.name, legacy_file=legacy)
+        self.assertEqual(store.leaderboard(True), [300, 200, 100])
+        self.assertEqual(store.leaderboard(False), [])
+        store.add(250)
+        self.assertEqual(ScoreStore(self.name, legacy_file=legacy).leaderboard(), [300, 250, 200, 100])
+
+    def test_interrupted_compaction_is_finished(self):
+        """A compaction cut off at any step is completed once, without duplicate history"""
+        store = ScoreStore(self.name, compact_every=1000)
+        for score in range(3):
+            store.add(score)
+        os.replace(self.name + '.log', self.name + '.fold')
+        store = ScoreStore(self.name)
+        self.assertEqual(store.leaderboard(), [2, 1, 0])
+        self.assertFalse(os.path.exists(self.name + '.fold'))
+        with open(self.name + '.history', 'rb') as history:
+            lines = history.read()
+        with open(self.name + '.fold', 'wb') as fold:
+            fold.write(lines)
+        store = ScoreStore(self.name)
+        store.add(7)
+        self.assertEqual(ScoreStore(self.name).leaderboard(), [7, 2, 1, 0])
+        with open(self.name + '.history', 'rb') as history:
+            self.assertEqual(history.read(), lines)
+
+    def test_leaderboard_locks_only_after_changes(self):
+        """Reading an unchanged store does not take the lock"""
+        store = ScoreStore(self.name)
+        store.add(5)
+        with mock.patch.object(store, 'locked') as locked:
+            self.assertEqual(store.leaderboard(), [5])
+            locked.assert_not_called()
+            ScoreStore(self.name).add(6)
+        self.assertEqual(store.leaderboard(), [6, 5])
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test the benchmark report comparison"""
+
+    def test_compare_flags_regressions(self):
+        """Slower durations and lower rates are reported, noise and new metrics are not"""
+        baseline = {'results': {'30': {'update': {'ticks_per_second': 1000.0},
+                                       'draw_palette': {'p50_us': 100.0, 'p95_us': 100.0},
+                                       'check_fail': {'p50_us': 1.0}}}}
+        report = {'results': {'30': {'update': {'ticks_per_second': 500.0},
+                                     'draw_palette': {'p50_us': 200.0, 'p95_us': 900.0},
+                                     'check_fail': {'p50_us': 2.0},
+                                     'dirty_frame': {'p50_us': 50.0}}}}
+        regressions = compare(report, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('30/update ticks_per_second'))
+        self.assertTrue(regressions[1].startswith('30/draw_palette p50_us'))
+        self.assertEqual(compare(baseline, baseline), [])
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestTournament(unittest.TestCase):
+    """Test the self-play tournament runner"""
+
+    def test_histogram(self):
+        """Values are binned and summarized"""
+        histogram = Histogram(10)
+        for value in (1, 5, 12, 19, 55):
+            histogram.add(value)
+        self.assertEqual(histogram.bins, {0: 2, 10: 2, 50: 1})
+        self.assertEqual(histogram.mean(), 18.4)
+        self.assertEqual(histogram.percentile(0.5), 10)
+
+    def test_workers_agree(self):
+        """Seeded games give the same histograms on any number of workers"""
+        options = {'policy': 'greedy', 'cell_number': 20, 'obstacles': True, 'obstacle_count': 10,
+                   'bonus_chance': None, 'max_ticks': 2000}
+        single = run_tournament(30, options, workers=1)
+        pooled = run_tournament(30, options, workers=2, chunk_size=7)
+        self.assertEqual(single['games'], 30)
+        for name in ('score', 'ticks', 'death_cause'):
+            self.assertEqual(single[name], pooled[name])
+
+    def test_tuning_options(self):
+        """The bonus odds and speed curve are set per simulation"""
+        options = {'policy': 'greedy', 'cell_number': 20, 'obstacles': False, 'obstacle_count': 0,
+                   'bonus_chance': 0, 'speed_curve': [80, 10, 30], 'max_ticks': 200}
+        report = run_tournament(3, options, workers=1)
+        self.assertEqual(report['games'], 3)
+        sim = Simulation(play_with_obstacles=False, bonus_chance=0, speed_curve=(80, 10, 30), seed=0)
+        self.assertEqual(sim.food.points, 5)
+        self.assertEqual(sim.interval, 80)
+        sim.score = 10
+        self.assertEqual(sim.interval, 30)
+
+
+class TestLevels(unittest.TestCase):
+    """Test the level generator and level packs"""
+
+    def test_levels_are_reproducible_and_connected(self):
+        """A level covers its target density, is the same for the same seed and keeps the board in one piece"""
+        level = generate(60, 0.25, seed=3)
+        self.assertEqual(list(level.origins), list(generate(60, 0.25, seed=3).origins))
+        self.assertNotEqual(list(level.origins), list(generate(60, 0.25, seed=4).origins))
+        sim = Simulation(60, level=level, seed=0)
+        world = sim.world
+        covered = sum(1 for cell_id in range(len(world.board)) if world.obstacles[cell_id])
+        self.assertAlmostEqual(covered / 60 ** 2, 0.25, delta=0.01)
+        self.assertEqual(len(sim.obstacles), len(level))
+        blocked = bytearray(1 - bit for bit in world.board)
+        for cell_id in range(len(world.board)):
+            blocked[cell_id] |= world.obstacles[cell_id]
+        self.assertTrue(is_connected(blocked, world.stride, world.cell_id(sim.snake.head())))
+
+    def test_pack_round_trip_and_replay(self):
+        """Packed levels load back unchanged, and a round on one replays from the level seed"""
+        pack = LevelPack.build([generate(30, 0.1, seed) for seed in range(5)])
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.pack')
+            pack.save(filename)
+            loaded = LevelPack.load(filename)
+        self.assertEqual((loaded.cell_number, loaded.density, len(loaded)), (30, 0.1, 5))
+        level = loaded.level(2)
+        self.assertEqual(level.obstacles(), generate(30, 0.1, 2).obstacles())
+        sim = Simulation(30, level=level, seed=11)
+        replay = Replay.for_simulation(sim)
+        sim.run()
+        replay.finish(sim)
+        replay = Replay.from_bytes(replay.to_bytes())
+        self.assertEqual(replay.level, (0.1, 2))
+        self.assertTrue(verify(replay))
+
+
+class TestBatchSimulation(unittest.TestCase):
+    """Test vectorized batch simulation"""
+
+    def test_matches_simulation(self):
+        """Batch games follow the same moves and deaths as Simulation"""
+        for seed in range(20):
+            sim = Simulation(seed=seed)
+            batch = BatchSimulation(1)
+            batch.load(0, sim)
+            moves = random.Random(seed)
+            while not sim.game_over:
+                action = moves.randrange(4)
+                events = sim.step(DIRECTIONS[action])
+                batch.step(np.array([action]))
+                self.assertEqual(batch.score[0], sim.score)
+                self.assertEqual(batch.done[0], sim.game_over)
+                if events.eaten is not None or events.expired:
+                    break
+            if sim.game_over:
+                self.assertEqual(DEATH_CAUSES[batch.death_cause[0]], sim.death_cause)
+
+    def test_bonus_and_growth(self):
+        """Eating a bonus scores five points and grows the snake"""
+        sim = Simulation(play_with_obstacles=False)
+        sim.food = FoodItem((8, 10), 5, 5000)
+        batch = BatchSimulation(2, play_with_obstacles=False)
+        batch.load(0, sim)
+        batch.load(1, sim)
+        score, done = batch.step(np.array([-1, 0]))
+        self.assertEqual(list(score), [5, 0])
+        self.assertFalse(done.any())
+        batch.step()
+        self.assertEqual(list(batch.lengths()), [4, 3])
+
+    def test_reset_masked_games(self):
+        """Reset restarts only the masked games on a pooled starting board"""
+        batch = BatchSimulation(40, cell_number=20, obstacle_count=10, seed=3, layouts=8)
+        self.assertEqual(len(batch.layouts), 8)
+        moves = np.random.default_rng(0)
+        while batch.done.sum() < 10:
+            batch.step(moves.integers(0, 4, batch.num_games))
+        done = batch.done.copy()
+        running = batch.grid[~done].copy()
+        batch.reset(done)
+        self.assertFalse(batch.done.any())
+        self.assertTrue((batch.grid[~done] == running).all())
+        games = np.flatnonzero(done)
+        self.assertTrue((batch.score[games] == 0).all())
+        self.assertTrue((batch.lengths()[games] == 3).all())
+        self.assertTrue((batch.grid[games, batch.food[games]] == 0).all())
+        obstacles = batch.grid[games] == 2
+        self.assertTrue(all(any((board == (layout == 2)).all() for layout in batch.layouts) for board in obstacles))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,49 @@
+"""Module with game loop timing statistics"""
+from collections import deque
+
+SAMPLE_WINDOW = 1000
+
+
+def percentile(samples, fraction):
+    """Return the value below which ``fraction`` of the samples fall"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class LoopStats:
+    """Durations of recent simulation ticks and rendered frames in milliseconds"""
+    def __init__(self, window=SAMPLE_WINDOW):
+        """Initialize empty statistics"""
+        self.tick_times = deque(maxlen=window)
+        self.frame_times = deque(maxlen=window)
+        self.ticks = 0
+        self.frames = 0
+        self.dropped_ticks = 0
+        self.elapsed = 0.0
+
+    def record_tick(self, duration):
+        """Remember how long one simulation tick took"""
+        self.tick_times.append(duration)
+        self.ticks += 1
+
+    def record_frame(self, duration):
+        """Remember how long drawing one frame took"""
+        self.frame_times.append(duration)
+        self.frames += 1
+
+    def summary(self):
+        """Return the statistics as a dictionary"""
+        seconds = self.elapsed / 1000 or 1
+        return {
+            'ticks': self.ticks,
+            'frames': self.frames,
+            'dropped_ticks': self.dropped_ticks,
+            'ticks_per_second': self.ticks / seconds,
+            'frames_per_second': self.frames / seconds,
+            'tick_ms_p50': percentile(self.tick_times, 0.5),
+            'tick_ms_p95': percentile(self.tick_times, 0.95),
+            'frame_ms_p50': percentile(self.frame_times, 0.5),
+            'frame_ms_p95': percentile(self.frame_times, 0.95),
+        }
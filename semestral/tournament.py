@@ -0,0 +1,206 @@
+"""Headless self-play tournaments spread over every core
+
+Run ``python tournament.py --games 100000`` to play seeded games of the
+headless ``Simulation`` under a policy in a process pool. Workers play
+chunks of consecutive seeds and send back one packed record per game;
+the parent folds them into histograms of the score, survival ticks and
+death cause as they arrive, so memory does not grow with the number of
+games. Any game can be watched again from its seed.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from constants import CELL_NUMBER
+from policies import POLICIES
+from simulation import BONUS_CHANCE, OBSTACLE_COUNT, SPEED_CURVE, Simulation
+
+RECORD = struct.Struct('<IIB')
+CAUSES = ('limit', 'wall', 'self', 'obstacle', 'starvation', 'win')
+CHUNK_SIZE = 200
+TICK_BIN = 50
+
+
+def load_policy(name):
+    """Return the factory of a registered policy or of ``module:function``
+
+    A factory is called with the seed of each game and returns a callable
+    that takes the Simulation and returns a direction or None.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, attribute = name.partition(':')
+    if not attribute:
+        raise ValueError(f"unknown policy {name!r}, use one of {sorted(POLICIES)} or module:function")
+    return getattr(importlib.import_module(module), attribute)
+
+
+class Histogram:
+    """Counts of values grouped into bins of equal width"""
+    def __init__(self, width=1):
+        """Initialize an empty histogram"""
+        self.width = width
+        self.bins = {}
+        self.count = 0
+        self.total = 0
+
+    def add(self, value, count=1):
+        """Count a value"""
+        low = value // self.width * self.width
+        self.bins[low] = self.bins.get(low, 0) + count
+        self.count += count
+        self.total += value * count
+
+    def mean(self):
+        """Mean of the counted values"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Lower edge of the bin holding the given fraction of the values"""
+        if not self.count:
+            return 0
+        seen = 0
+        for low in sorted(self.bins):
+            seen += self.bins[low]
+            if seen >= fraction * self.count:
+                return low
+        return max(self.bins)
+
+    def to_dict(self):
+        """Return the histogram as a JSON-friendly dictionary"""
+        return {'width': self.width, 'count': self.count, 'mean': self.mean(),
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95), 'p99': self.percentile(0.99),
+                'bins': {str(low): self.bins[low] for low in sorted(self.bins)}}
+
+
+class Results:
+    """Histograms aggregated from game records"""
+    def __init__(self, tick_bin=TICK_BIN):
+        """Initialize empty results"""
+        self.scores = Histogram()
+        self.ticks = Histogram(tick_bin)
+        self.causes = dict.fromkeys(CAUSES, 0)
+        self.games = 0
+        self.total_ticks = 0
+
+    def add_records(self, data):
+        """Fold a chunk of packed records into the histograms"""
+        for score, ticks, cause in RECORD.iter_unpack(data):
+            self.scores.add(score)
+            self.ticks.add(ticks)
+            self.causes[CAUSES[cause]] += 1
+            self.total_ticks += ticks
+        self.games += len(data) // RECORD.size
+
+    def to_dict(self):
+        """Return the results as a JSON-friendly dictionary"""
+        return {'games': self.games, 'score': self.scores.to_dict(), 'ticks': self.ticks.to_dict(),
+                'death_cause': self.causes}
+
+
+def play_chunk(task):
+    """Play the games of one chunk of seeds, return their packed records"""
+    first_seed, count, options = task
+    factory = load_policy(options['policy'])
+    bonus_chance = options.get('bonus_chance')
+    sim = Simulation(options['cell_number'], play_with_obstacles=options['obstacles'],
+                     obstacle_count=options['obstacle_count'], seed=first_seed,
+                     bonus_chance=BONUS_CHANCE if bonus_chance is None else bonus_chance,
+                     speed_curve=tuple(options.get('speed_curve') or SPEED_CURVE))
+    out = bytearray()
+    for seed in range(first_seed, first_seed + count):
+        sim.reset(seed)
+        sim.run(factory(seed), options['max_ticks'])
+        cause = CAUSES.index(sim.death_cause) if sim.death_cause is not None else 0
+        out += RECORD.pack(sim.score, sim.ticks, cause)
+    return bytes(out)
+
+
+def run(games, options, workers=None, first_seed=0, chunk_size=CHUNK_SIZE, tick_bin=TICK_BIN, progress=None):
+    """Play ``games`` seeded games on ``workers`` processes and aggregate the results"""
+    workers = workers or os.cpu_count() or 1
+    tasks = [(seed, min(chunk_size, first_seed + games - seed), options)
+             for seed in range(first_seed, first_seed + games, chunk_size)]
+    results = Results(tick_bin)
+    start = time.perf_counter()
+    if workers == 1:
+        chunks = map(play_chunk, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        chunks = pool.imap_unordered(play_chunk, tasks)
+    try:
+        for data in chunks:
+            results.add_records(data)
+            if progress is not None:
+                progress(results, time.perf_counter() - start)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    report = results.to_dict()
+    report['meta'] = dict(options, workers=workers, first_seed=first_seed, seconds=elapsed,
+                          games_per_second=results.games / elapsed if elapsed else 0.0,
+                          ticks_per_second=results.total_ticks / elapsed if elapsed else 0.0)
+    return report
+
+
+def speed_curve(text):
+    """Parse a speed curve given as three comma separated numbers"""
+    try:
+        start, step, shortest = (int(value) for value in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START,STEP,SHORTEST, got {text!r}") from None
+    if shortest <= 0 or start < shortest or step < 0:
+        raise argparse.ArgumentTypeError("ticks must be positive and get shorter as the score grows")
+    return start, step, shortest
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=10000, help='number of games to play')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes, all cores by default')
+    parser.add_argument('--policy', default='greedy',
+                        help=f"one of {', '.join(sorted(POLICIES))} or module:function")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--cells', type=int, default=CELL_NUMBER, help='board size in cells')
+    parser.add_argument('--no-obstacles', action='store_true', help='play the easy mode')
+    parser.add_argument('--obstacle-count', type=int, default=OBSTACLE_COUNT, help='obstacles per board')
+    parser.add_argument('--bonus-chance', type=int, help='a bonus apple spawns once in N+1 foods')
+    parser.add_argument('--speed', type=speed_curve, default=SPEED_CURVE, metavar='START,STEP,SHORTEST',
+                        help='tick length in ms at score 0, ms taken off per point and the shortest tick')
+    parser.add_argument('--max-ticks', type=int, default=20000, help='ticks before a game is cut off')
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='games per task sent to a worker')
+    parser.add_argument('--output', help='write the histograms as JSON')
+    args = parser.parse_args(argv)
+    load_policy(args.policy)
+    options = {'policy': args.policy, 'cell_number': args.cells, 'obstacles': not args.no_obstacles,
+               'obstacle_count': args.obstacle_count, 'bonus_chance': args.bonus_chance,
+               'speed_curve': list(args.speed), 'max_ticks': args.max_ticks}
+
+    def progress(results, elapsed):
+        print(f"\r{results.games}/{args.games} games, {results.games / elapsed:.0f} games/s",
+              end='', file=sys.stderr, flush=True)
+    report = run(args.games, options, args.workers, args.seed, args.chunk, progress=progress)
+    print(file=sys.stderr)
+    meta = report['meta']
+    print(f"{report['games']} games on {meta['workers']} workers in {meta['seconds']:.1f} s "
+          f"({meta['games_per_second']:.0f} games/s, {meta['ticks_per_second']:.0f} ticks/s)")
+    for name in ('score', 'ticks'):
+        stats = report[name]
+        print(f"{name}: mean {stats['mean']:.1f}, p50 {stats['p50']}, p95 {stats['p95']}, p99 {stats['p99']}")
+    print("death cause: " + ", ".join(f"{cause} {count}" for cause, count in report['death_cause'].items()))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,40 @@
 """This module defines user interface"""
+from collections import OrderedDict
 import pygame
 
+TEXT_CACHE_SIZE = 256
+
+_fonts = {}
+_text_cache = OrderedDict()
+
+
+def get_font(size, name=None):
+    """Return the shared font of the given name and size"""
+    key = (name, size)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.Font(name, size)
+    return _fonts[key]
+
+
+def render_text(text, size, color, name=None):
+    """Return a rendered text surface, reusing recently rendered ones"""
+    key = (text, name, size, tuple(color))
+    surface = _text_cache.get(key)
+    if surface is None:
+        surface = get_font(size, name).render(text, True, color)
+        _text_cache[key] = surface
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return surface
+
+
+def reset_fonts():
+    """Forget fonts and rendered text, needed after pygame is re-initialized"""
+    _fonts.clear()
+    _text_cache.clear()
+
 
 class Button:
     """This class defines button object"""
@@ -9,16 +43,28 @@ class Button:
         self.surface = surface
         self.rect = pygame.Rect(x, y, width, height)
         self.color = color
-        self.text = text
         self.text_color = text_color
-        self.font = pygame.font.Font(None, 36)
+        self.font_size = 36
+        self.font = get_font(self.font_size)
+        self.text = text
+
+    @property
+    def text(self):
+        """Text shown on the button"""
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
+        self.text_surf = None
 
     def draw(self):
         """Draws button"""
         pygame.draw.rect(self.surface, self.color, self.rect)
-        text_surf = self.font.render(self.text, True, self.text_color)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        self.surface.blit(text_surf, text_rect)
+        if self.text_surf is None:
+            self.text_surf = render_text(self.text, self.font_size, self.text_color)
+        text_rect = self.text_surf.get_rect(center=self.rect.center)
+        self.surface.blit(self.text_surf, text_rect)
 
     def is_clicked(self, event):
         """Checks if button was clicked"""
@@ -34,12 +80,24 @@ class Label:
         """Initialize the label object"""
         self.surface = surface
         self.rect = pygame.Rect(x, y, width, height)
-        self.text = text
         self.text_color = text_color
-        self.font = pygame.font.Font(None, 48)
+        self.font_size = 48
+        self.font = get_font(self.font_size)
+        self.text = text
+
+    @property
+    def text(self):
+        """Text shown by the label"""
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
+        self.text_surf = None
 
     def draw(self):
         """Draw the label"""
-        text_surf = self.font.render(self.text, True, self.text_color)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        self.surface.blit(text_surf, text_rect)
+        if self.text_surf is None:
+            self.text_surf = render_text(self.text, self.font_size, self.text_color)
+        text_rect = self.text_surf.get_rect(center=self.rect.center)
+        self.surface.blit(self.text_surf, text_rect)
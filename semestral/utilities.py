@@ -1,8 +1,18 @@
 """Module to work with scores"""
+import heapq
 import os
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+from constants import CELL_NUMBER
 
+LEGACY_FILE = "high_scores.txt"
 
-def load_high_scores(filename="high_scores.txt"):
+
+def load_high_scores(filename=LEGACY_FILE):
     """Load high scores from a file, returning a list of scores."""
     if os.path.exists(filename):
         with open(filename, "r", encoding="utf-8") as file:
@@ -11,8 +21,208 @@ def load_high_scores(filename="high_scores.txt"):
         return []
 
 
-def save_high_scores(high_scores, filename="high_scores.txt"):
-    """Save high scores to a file."""
-    with open(filename, "w", encoding="utf-8") as file:
-        for score in sorted(high_scores, reverse=True):
-            file.write(str(score) + "\n")
+def last_seq(filename):
+    """Sequence number of the last complete line of a score log, 0 if there is none"""
+    try:
+        with open(filename, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(file.tell() - 128, 0))
+            tail = file.read()
+    except FileNotFoundError:
+        return 0
+    try:
+        return int(tail[:tail.rfind(b"\n")].rsplit(b"\n", 1)[-1].split()[0])
+    except (IndexError, ValueError):
+        return 0
+
+
+class ScoreStore:
+    """Crash-safe leaderboards kept per difficulty and board size
+
+    New scores are appended to ``<name>.log`` as ``seq cells obstacles score``
+    lines. Every ``compact_every`` appends the log is folded into
+    ``<name>.txt``, which holds only the top scores of each board and the
+    last folded sequence number, and is replaced atomically. Folded log lines
+    move to ``<name>.history``, which keeps every score ever played but is
+    never read back, so start-up cost stays constant. All file access happens
+    under an exclusive lock on ``<name>.lock`` so several game processes can
+    share one store; reading a leaderboard takes the lock only when the files
+    changed since the last read. Given a ``legacy_file``, a new store imports
+    the scores of the old single-list ``high_scores.txt`` into the medium
+    board of the default size.
+    """
+    def __init__(self, name="leaderboard", top_k=5, compact_every=100, legacy_file=None):
+        """Initialize the store and load the current leaderboards"""
+        self.snapshot_file = name + ".txt"
+        self.log_file = name + ".log"
+        self.fold_file = name + ".fold"
+        self.history_file = name + ".history"
+        self.lock_file = name + ".lock"
+        self.top_k = top_k
+        self.compact_every = compact_every
+        self.boards = {}
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.snapshot_stamp = None
+        self.log_offset = 0
+        self.log_entries = 0
+        with self.locked():
+            self.refresh()
+            if legacy_file and self.seq == 0:
+                self.import_legacy(legacy_file)
+
+    @contextmanager
+    def locked(self):
+        """Hold the store lock"""
+        with open(self.lock_file, "a+b") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                else:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def push(self, key, score):
+        """Put a score into the top-k heap of a board"""
+        heap = self.boards.setdefault(key, [])
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, score)
+        elif score > heap[0]:
+            heapq.heapreplace(heap, score)
+
+    def stamp(self, filename):
+        """Identify a version of a file"""
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Pick up changes written by other processes, must hold the lock"""
+        stamp = self.stamp(self.snapshot_file)
+        if stamp != self.snapshot_stamp:
+            self.boards = {}
+            self.snapshot_seq = self.seq = 0
+            self.log_offset = self.log_entries = 0
+            if stamp is not None:
+                with open(self.snapshot_file, "r", encoding="utf-8") as file:
+                    self.snapshot_seq = self.seq = int(file.readline())
+                    for line in file:
+                        cells, obstacles, score = (int(value) for value in line.split())
+                        self.push((bool(obstacles), cells), score)
+            self.snapshot_stamp = stamp
+        if os.path.exists(self.fold_file):
+            self.read_log(self.fold_file, 0)
+            self.finish_compaction()
+        if os.path.exists(self.log_file):
+            self.log_offset, entries = self.read_log(self.log_file, self.log_offset)
+            self.log_entries += entries
+
+    def read_log(self, filename, offset):
+        """Push the complete log lines after ``offset``, return the new offset and the number of lines"""
+        entries = 0
+        with open(filename, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    seq, cells, obstacles, score = (int(value) for value in line.split())
+                except ValueError:
+                    continue
+                entries += 1
+                if seq > self.snapshot_seq:
+                    self.seq = max(self.seq, seq)
+                    self.push((bool(obstacles), cells), score)
+        return offset, entries
+
+    def changed(self):
+        """Check whether the files changed since the last refresh, without the lock"""
+        try:
+            log_size = os.stat(self.log_file).st_size
+        except FileNotFoundError:
+            log_size = 0
+        return log_size != self.log_offset or self.stamp(self.snapshot_file) != self.snapshot_stamp
+
+    def import_legacy(self, filename):
+        """Fold the scores of an old high_scores.txt into a new store, must hold the lock"""
+        scores = load_high_scores(filename)
+        if not scores:
+            return
+        with open(self.log_file, "ab") as file:
+            for score in scores:
+                self.seq += 1
+                file.write(f"{self.seq} {CELL_NUMBER} 1 {score}\n".encode())
+        self.refresh()
+        self.compact()
+
+    def add(self, score, play_with_obstacles=True, cell_number=CELL_NUMBER):
+        """Record a finished game"""
+        with self.locked():
+            self.refresh()
+            self.seq += 1
+            line = f"{self.seq} {cell_number} {int(play_with_obstacles)} {score}\n".encode()
+            with open(self.log_file, "ab") as file:
+                if file.tell() != self.log_offset:
+                    file.truncate(self.log_offset)
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+            self.log_offset += len(line)
+            self.log_entries += 1
+            self.push((bool(play_with_obstacles), cell_number), score)
+            if self.log_entries >= self.compact_every:
+                self.compact()
+
+    def compact(self):
+        """Fold the log into the snapshot, must hold the lock
+
+        The log is first renamed out of the way and the snapshot replaced
+        after it, so a crash at any point leaves files that the next refresh
+        folds again: a leftover renamed log is read and finished, and only its
+        lines newer than the end of the history are appended there.
+        """
+        if os.path.exists(self.log_file):
+            os.replace(self.log_file, self.fold_file)
+        self.log_offset = self.log_entries = 0
+        self.finish_compaction()
+
+    def finish_compaction(self):
+        """Replace the snapshot and move the renamed log to the history, must hold the lock"""
+        temp_file = self.snapshot_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            file.write(f"{self.seq}\n")
+            for (obstacles, cells), heap in sorted(self.boards.items()):
+                for score in sorted(heap, reverse=True):
+                    file.write(f"{cells} {int(obstacles)} {score}\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        self.snapshot_seq = self.seq
+        self.snapshot_stamp = self.stamp(self.snapshot_file)
+        if os.path.exists(self.fold_file):
+            folded = last_seq(self.history_file)
+            with open(self.fold_file, "rb") as log, open(self.history_file, "ab") as history:
+                for line in log:
+                    fields = line.split()
+                    if line.endswith(b"\n") and fields and fields[0].isdigit() and int(fields[0]) > folded:
+                        history.write(line)
+                history.flush()
+                os.fsync(history.fileno())
+            os.remove(self.fold_file)
+
+    def leaderboard(self, play_with_obstacles=True, cell_number=CELL_NUMBER):
+        """Return the best scores of a board, highest first"""
+        if self.changed():
+            with self.locked():
+                self.refresh()
+        return sorted(self.boards.get((bool(play_with_obstacles), cell_number), []), reverse=True)